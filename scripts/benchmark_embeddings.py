@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Compare the `onnx` embedding mode with the `huggingface` (torch) one.
+
+Embeds the text files of a folder, split in chunks like at ingestion, with both
+backends, and prints their throughput and how close their embeddings are: the
+cosine similarity of the embeddings of each chunk, and the overlap of the top-k
+chunks retrieved for the same queries.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.node_parser import SentenceSplitter
+
+from sonar_labs.components.embedding.custom.onnx import (
+    OnnxEmbedding,
+    export_onnx_model,
+    query_instruction_for_model,
+)
+from sonar_labs.paths import models_cache_path
+from sonar_labs.settings.settings import settings
+
+
+def load_chunks(folder: Path, limit: int) -> list[str]:
+    splitter = SentenceSplitter()
+    chunks: list[str] = []
+    for file_path in sorted(folder.rglob("*")):
+        if file_path.suffix not in (".txt", ".md"):
+            continue
+        chunks.extend(splitter.split_text(file_path.read_text(errors="ignore")))
+        if len(chunks) >= limit:
+            break
+    return chunks[:limit]
+
+
+def timed_embeddings(
+    model: BaseEmbedding, texts: list[str]
+) -> tuple[np.ndarray, float]:
+    # Warm up, the first batch pays the lazy initializations
+    model.get_text_embedding_batch(texts[: model.embed_batch_size])
+    start = time.perf_counter()
+    embeddings = model.get_text_embedding_batch(texts)
+    return np.asarray(embeddings, dtype=np.float32), time.perf_counter() - start
+
+
+def normalized(embeddings: np.ndarray) -> np.ndarray:
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def top_k_overlap(
+    reference: np.ndarray,
+    candidate: np.ndarray,
+    reference_queries: np.ndarray,
+    candidate_queries: np.ndarray,
+    k: int,
+) -> float:
+    reference_top = np.argsort(-reference_queries @ reference.T, axis=1)[:, :k]
+    candidate_top = np.argsort(-candidate_queries @ candidate.T, axis=1)[:, :k]
+    overlaps = [
+        len(set(ref) & set(cand)) / k
+        for ref, cand in zip(reference_top, candidate_top)
+    ]
+    return float(np.mean(overlaps))
+
+
+parser = argparse.ArgumentParser(prog="benchmark_embeddings.py")
+parser.add_argument("folder", help="Folder of .txt/.md files to embed")
+parser.add_argument(
+    "--limit", help="Maximum number of chunks to embed", type=int, default=2000
+)
+parser.add_argument(
+    "--queries", help="Number of chunks used as queries", type=int, default=100
+)
+parser.add_argument("--top-k", help="Chunks retrieved per query", type=int, default=10)
+parser.add_argument(
+    "--batch-size", help="Embedding batch size of both backends", type=int, default=32
+)
+
+args = parser.parse_args()
+
+if __name__ == "__main__":
+    try:
+        from llama_index.embeddings.huggingface import (  # type: ignore
+            HuggingFaceEmbedding,
+        )
+    except ImportError as e:
+        raise ImportError(
+            "Local dependencies not found, install with `poetry install --extras embeddings-huggingface`"
+        ) from e
+
+    root_path = Path(args.folder)
+    if not root_path.exists():
+        raise ValueError(f"Path {args.folder} does not exist")
+    chunks = load_chunks(root_path, args.limit)
+    if not chunks:
+        raise ValueError(f"No .txt/.md files found in {args.folder}")
+    queries = chunks[: args.queries]
+
+    hf_settings = settings().huggingface
+    model_name = hf_settings.embedding_hf_model_name
+    onnx_dir = models_cache_path / "onnx" / model_name.replace("/", "--")
+    models: dict[str, BaseEmbedding] = {
+        "torch": HuggingFaceEmbedding(
+            model_name=model_name,
+            cache_folder=str(models_cache_path),
+            embed_batch_size=args.batch_size,
+        ),
+    }
+    for name, quantize in (("onnx fp32", False), ("onnx int8", True)):
+        models[name] = OnnxEmbedding(
+            export_onnx_model(model_name, onnx_dir, quantize=quantize),
+            pooling=hf_settings.onnx_pooling,
+            query_instruction=query_instruction_for_model(model_name),
+            intra_op_threads=hf_settings.onnx_intra_op_threads,
+            model_name=model_name,
+            embed_batch_size=args.batch_size,
+        )
+
+    print(f"Embedding {len(chunks)} chunks with {model_name}")
+    results: dict[str, tuple[np.ndarray, np.ndarray, float]] = {}
+    for name, model in models.items():
+        embeddings, duration = timed_embeddings(model, chunks)
+        query_embeddings = np.asarray(
+            [model.get_query_embedding(query) for query in queries], dtype=np.float32
+        )
+        results[name] = (
+            normalized(embeddings),
+            normalized(query_embeddings),
+            duration,
+        )
+
+    reference, reference_queries, reference_duration = results["torch"]
+    print(f"{'backend':<10} {'chunks/s':>10} {'speedup':>8} {'cos mean':>9} "
+          f"{'cos min':>8} {f'top-{args.top_k}':>7}")
+    for name, (embeddings, query_embeddings, duration) in results.items():
+        similarities = (reference * embeddings).sum(axis=1)
+        overlap = top_k_overlap(
+            reference, embeddings, reference_queries, query_embeddings, args.top_k
+        )
+        print(
+            f"{name:<10} {len(chunks) / duration:>10.1f} "
+            f"{reference_duration / duration:>7.2f}x {similarities.mean():>9.4f} "
+            f"{similarities.min():>8.4f} {overlap:>7.1%}"
+        )
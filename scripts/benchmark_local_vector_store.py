@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Recall and latency of the HNSW index of the `local` vector store.
+
+Fills a flat (exact) store and an HNSW store with the same synthetic clustered
+vectors, then searches both with the same queries: unfiltered, and filtered on a
+single project. Prints the latency percentiles of each search, and the recall of
+the HNSW searches against the exact ones, for each `hnsw_ef_search`.
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import (
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+)
+
+from sonar_labs.components.vector_store.local_vector_store import LocalVectorStore
+
+BATCH_SIZE = 10000
+
+
+def clustered_vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    assignments = rng.integers(0, clusters, size=count)
+    return centers[assignments] + 0.5 * rng.normal(size=(count, dim)).astype(
+        np.float32
+    )
+
+
+def fill(store: LocalVectorStore, vectors: np.ndarray, projects: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(vectors), BATCH_SIZE):
+        store.add(
+            [
+                TextNode(
+                    id_=str(j),
+                    text="",
+                    embedding=vector.tolist(),
+                    metadata={"project_id": str(j % projects)},
+                    relationships={
+                        NodeRelationship.SOURCE: RelatedNodeInfo(node_id=str(j))
+                    },
+                )
+                for j, vector in enumerate(vectors[i : i + BATCH_SIZE], start=i)
+            ]
+        )
+    store.persist(persist_path="")
+    return time.perf_counter() - start
+
+
+def run(
+    store: LocalVectorStore, queries: list[VectorStoreQuery]
+) -> tuple[list[set[str]], np.ndarray]:
+    results = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(set(store.query(query).ids or []))
+        latencies.append(time.perf_counter() - start)
+    return results, np.asarray(latencies) * 1000
+
+
+def recall(reference: list[set[str]], results: list[set[str]]) -> float:
+    return float(
+        np.mean([len(ref & res) / max(len(ref), 1) for ref, res in zip(reference, results)])
+    )
+
+
+parser = argparse.ArgumentParser(prog="benchmark_local_vector_store.py")
+parser.add_argument("--count", help="Number of vectors", type=int, default=200000)
+parser.add_argument("--dim", help="Dimensions of the vectors", type=int, default=384)
+parser.add_argument("--queries", help="Number of queries", type=int, default=200)
+parser.add_argument("--top-k", help="Vectors retrieved per query", type=int, default=10)
+parser.add_argument(
+    "--projects", help="Number of projects the vectors are spread on", type=int, default=100
+)
+parser.add_argument("--hnsw-m", type=int, default=16)
+parser.add_argument("--hnsw-ef-construction", type=int, default=200)
+parser.add_argument(
+    "--ef-search", type=int, nargs="+", default=[16, 32, 64, 128, 256]
+)
+parser.add_argument(
+    "--exact-search-max-rows",
+    help="Filtered searches over fewer vectors are exact",
+    type=int,
+    default=50000,
+)
+
+args = parser.parse_args()
+
+if __name__ == "__main__":
+    vectors = clustered_vectors(args.count, args.dim, clusters=256, seed=0)
+    query_vectors = clustered_vectors(args.queries, args.dim, clusters=256, seed=1)
+    project = MetadataFilters(filters=[MetadataFilter(key="project_id", value="0")])
+    searches = {
+        "all": [
+            VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=args.top_k)
+            for q in query_vectors
+        ],
+        "1 project": [
+            VectorStoreQuery(
+                query_embedding=q.tolist(),
+                similarity_top_k=args.top_k,
+                filters=project,
+            )
+            for q in query_vectors
+        ],
+    }
+
+    with tempfile.TemporaryDirectory() as flat_dir, tempfile.TemporaryDirectory() as hnsw_dir:
+        flat = LocalVectorStore(persist_dir=flat_dir)
+        hnsw = LocalVectorStore(
+            persist_dir=hnsw_dir,
+            index="hnsw",
+            hnsw_m=args.hnsw_m,
+            hnsw_ef_construction=args.hnsw_ef_construction,
+            exact_search_max_rows=args.exact_search_max_rows,
+        )
+        print(f"Filling the flat store in {fill(flat, vectors, args.projects):.1f}s")
+        print(f"Filling the HNSW store in {fill(hnsw, vectors, args.projects):.1f}s")
+
+        print(f"{'search':<10} {'index':<10} {f'recall@{args.top_k}':>10} {'p50 ms':>8} {'p95 ms':>8}")
+        for name, queries in searches.items():
+            reference, latencies = run(flat, queries)
+            print(
+                f"{name:<10} {'flat':<10} {1:>10.1%} "
+                f"{np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f}"
+            )
+            for ef in args.ef_search:
+                hnsw.hnsw_ef_search = ef
+                results, latencies = run(hnsw, queries)
+                print(
+                    f"{name:<10} {f'ef={ef}':<10} {recall(reference, results):>10.1%} "
+                    f"{np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f}"
+                )
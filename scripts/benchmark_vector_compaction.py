@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Recall lost by the vector compaction (`vectorstore.truncate_dimensions` and
+`vectorstore.vector_precision`), against the memory it saves.
+
+Embeds the text files of a folder, split in chunks like at ingestion, with the
+configured embedding model, and compares the top-k chunks retrieved for the
+same queries with the full float32 embeddings and with each compaction: the
+embeddings truncated to fewer dimensions, stored in float16, or int8 scalar
+quantized (like qdrant does, with the 0.99 quantile, without rescoring).
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+from llama_index.core.node_parser import SentenceSplitter
+
+from sonar_labs.components.embedding.embedding_component import EmbeddingComponent
+from sonar_labs.components.vector_store.vector_compaction import truncate_embeddings
+from sonar_labs.settings.settings import settings
+
+PRECISION_BYTES = {"float32": 4, "float16": 2, "int8": 1}
+
+
+def load_chunks(folder: Path, limit: int) -> list[str]:
+    splitter = SentenceSplitter()
+    chunks: list[str] = []
+    for file_path in sorted(folder.rglob("*")):
+        if file_path.suffix not in (".txt", ".md"):
+            continue
+        chunks.extend(splitter.split_text(file_path.read_text(errors="ignore")))
+        if len(chunks) >= limit:
+            break
+    return chunks[:limit]
+
+
+def stored(embeddings: np.ndarray, precision: str) -> np.ndarray:
+    """The embeddings as the vector store scores them, in `precision`."""
+    if precision == "float16":
+        return embeddings.astype(np.float16).astype(np.float32)
+    if precision == "int8":
+        bound = np.quantile(np.abs(embeddings), 0.99)
+        scale = bound / 127
+        return np.clip(np.round(embeddings / scale), -127, 127) * scale
+    return embeddings
+
+
+def recall_at_k(
+    reference_top: np.ndarray, query_embeddings: np.ndarray, embeddings: np.ndarray
+) -> float:
+    k = reference_top.shape[1]
+    candidate_top = np.argsort(-query_embeddings @ embeddings.T, axis=1)[:, :k]
+    recalls = [
+        len(set(ref) & set(cand)) / k
+        for ref, cand in zip(reference_top, candidate_top)
+    ]
+    return float(np.mean(recalls))
+
+
+parser = argparse.ArgumentParser(prog="benchmark_vector_compaction.py")
+parser.add_argument("folder", help="Folder of .txt/.md files to embed")
+parser.add_argument(
+    "--limit", help="Maximum number of chunks to embed", type=int, default=5000
+)
+parser.add_argument(
+    "--queries", help="Number of chunks used as queries", type=int, default=200
+)
+parser.add_argument("--top-k", help="Chunks retrieved per query", type=int, default=10)
+parser.add_argument(
+    "--dimensions",
+    help="Dimensions the embeddings are truncated to",
+    type=int,
+    nargs="+",
+    default=[768, 512, 256, 128, 64],
+)
+
+args = parser.parse_args()
+
+if __name__ == "__main__":
+    root_path = Path(args.folder)
+    if not root_path.exists():
+        raise ValueError(f"Path {args.folder} does not exist")
+    chunks = load_chunks(root_path, args.limit)
+    if not chunks:
+        raise ValueError(f"No .txt/.md files found in {args.folder}")
+    queries = chunks[: args.queries]
+
+    embedding_model = EmbeddingComponent(settings()).embedding_model
+    print(f"Embedding {len(chunks)} chunks with {embedding_model.model_name}")
+    embeddings = np.asarray(
+        embedding_model.get_text_embedding_batch(chunks), dtype=np.float32
+    )
+    query_embeddings = np.asarray(
+        [embedding_model.get_query_embedding(query) for query in queries],
+        dtype=np.float32,
+    )
+    full_dimensions = embeddings.shape[1]
+    embeddings = truncate_embeddings(embeddings, full_dimensions)
+    query_embeddings = truncate_embeddings(query_embeddings, full_dimensions)
+    reference_top = np.argsort(-query_embeddings @ embeddings.T, axis=1)[
+        :, : args.top_k
+    ]
+
+    dimensions_list = [full_dimensions] + sorted(
+        (d for d in set(args.dimensions) if d < full_dimensions), reverse=True
+    )
+    full_bytes = full_dimensions * PRECISION_BYTES["float32"]
+    print(
+        f"{'dims':>5} {'precision':>9} {'bytes':>6} {'saved':>6} "
+        f"{f'recall@{args.top_k}':>10}"
+    )
+    for dimensions in dimensions_list:
+        truncated = truncate_embeddings(embeddings, dimensions)
+        truncated_queries = truncate_embeddings(query_embeddings, dimensions)
+        for precision, precision_bytes in PRECISION_BYTES.items():
+            recall = recall_at_k(
+                reference_top, truncated_queries, stored(truncated, precision)
+            )
+            vector_bytes = dimensions * precision_bytes
+            print(
+                f"{dimensions:>5} {precision:>9} {vector_bytes:>6} "
+                f"{1 - vector_bytes / full_bytes:>6.0%} {recall:>10.1%}"
+            )
@@ -52,10 +52,30 @@ class Postgres:
         self.schema = connection.pop("schema_name")
         self.conn = psycopg2.connect(**connection)
 
+    def _shard_tables(self, store_type: str) -> list[str]:
+        """Tables of the tenant shards of the vector store (`vectorstore.tenancy`)."""
+        if store_type != "vectorstore":
+            return []
+        cur = self.conn.cursor()
+        try:
+            cur.execute(
+                "SELECT table_name FROM information_schema.tables "
+                "WHERE table_schema = %s AND (table_name LIKE %s OR table_name LIKE %s)",
+                (
+                    self.schema,
+                    "data\\_embeddings\\_org\\_id\\_%",
+                    "data\\_embeddings\\_project\\_id\\_%",
+                ),
+            )
+            return [table for (table,) in cur.fetchall()]
+        finally:
+            cur.close()
+
     def wipe(self, storetype: str) -> None:
+        tables = self.tables[storetype] + self._shard_tables(storetype)
         cur = self.conn.cursor()
         try:
-            for table in self.tables[storetype]:
+            for table in tables:
                 sql = f"DROP TABLE IF EXISTS {self.schema}.{table}"
                 cur.execute(sql)
                 print(f"Table {self.schema}.{table} dropped.")
@@ -99,7 +119,13 @@ class Simple:
             DEFAULT_PERSIST_FNAME as INDEXSTORE,
         )
 
-        for store in (DOCSTORE, INDEXSTORE):
+        for store in (
+            DOCSTORE,
+            f"{DOCSTORE}.journal",
+            INDEXSTORE,
+            f"{INDEXSTORE}.journal",
+            "content_hashes.sqlite",
+        ):
             wipe_file(str((local_data_path / store).absolute()))
 
 
@@ -109,6 +135,15 @@ class Chroma:
         wipe_tree(str((local_data_path / "chroma_db").absolute()))
 
 
+class Local:
+    def wipe(self, store_type: str) -> None:
+        assert store_type == "vectorstore"
+        wipe_tree(str((local_data_path / "local_vector_store").absolute()))
+        shards_path = local_data_path / "local_vector_store_shards"
+        if shards_path.exists():
+            wipe_tree(str(shards_path.absolute()))
+
+
 class Qdrant:
     COLLECTION = (
         "sonar_labs"  # ?! see vector_store_component.py
@@ -119,15 +154,32 @@ class Qdrant:
             from qdrant_client import QdrantClient  # type: ignore
         except ImportError:
             raise ImportError("Qdrant dependencies not found") from None
-        self.client = QdrantClient(**settings().qdrant.model_dump(exclude_none=True))
+        from sonar_labs.components.vector_store.vector_store_component import (
+            qdrant_client_kwargs,
+        )
+
+        self.client = QdrantClient(**qdrant_client_kwargs(settings().qdrant))
 
     def wipe(self, store_type: str) -> None:
         assert store_type == "vectorstore"
-        try:
-            self.client.delete_collection(self.COLLECTION)
-            print("Collection dropped successfully.")
-        except Exception as e:
-            print("Error dropping collection:", e)
+        from sonar_labs.components.vector_store.vector_store_component import (
+            TENANT_FIELDS,
+        )
+
+        # The collections of the tenant shards too (`vectorstore.tenancy`)
+        shard_prefixes = tuple(
+            f"{self.COLLECTION}_{field}_" for field in TENANT_FIELDS.values()
+        )
+        for collection in self.client.get_collections().collections:
+            if collection.name != self.COLLECTION and not collection.name.startswith(
+                shard_prefixes
+            ):
+                continue
+            try:
+                self.client.delete_collection(collection.name)
+                print(f"Collection {collection.name} dropped successfully.")
+            except Exception as e:
+                print(f"Error dropping collection {collection.name}:", e)
 
     def stats(self, store_type: str) -> None:
         print(f"Storage for Qdrant {store_type}.")
@@ -151,6 +203,7 @@ class Command:
         "chroma": Chroma,  # vector store
         "postgres": Postgres,  # node, index and vector store
         "qdrant": Qdrant,  # vector store
+        "local": Local,  # vector store
     }
 
     def for_each_store(self, cmd: str):
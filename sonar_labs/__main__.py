@@ -2,9 +2,17 @@
 
 import uvicorn
 
-from sonar_labs.main import app
 from sonar_labs.settings.settings import settings
 
+if settings().embedding.sidecar:
+    from sonar_labs.components.inference.inference_sidecar import (
+        start_inference_sidecar,
+    )
+
+    # Started before the app and its workers, that call it instead of loading
+    # the models
+    start_inference_sidecar(settings())
+
 # Set log_config=None to do not use the uvicorn logging configuration, and
 # use ours instead. For reference, see below:
 # https://github.com/tiangolo/fastapi/discussions/7457#discussioncomment-5141108
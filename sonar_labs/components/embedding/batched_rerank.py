@@ -0,0 +1,53 @@
+from collections.abc import Callable
+from typing import Any
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+ScorePairs = Callable[[list[tuple[str, str]]], list[float]]
+
+
+class BatchedRerank(BaseNodePostprocessor):
+    """Rerank the nodes with a cross-encoder shared by all the requests.
+
+    Same as llama-index `SentenceTransformerRerank`, but the (query, node) pairs
+    are scored by `score_pairs`: a `MicroBatchScheduler` of a single instance of
+    the model, batching the pairs of the concurrent requests together, or the
+    inference sidecar.
+    """
+
+    top_n: int = Field(description="Number of nodes to return sorted by score.")
+
+    _score_pairs: ScorePairs = PrivateAttr()
+
+    def __init__(self, score_pairs: ScorePairs, top_n: int) -> None:
+        kwargs: dict[str, Any] = {"top_n": top_n}
+        super().__init__(**kwargs)
+        self._score_pairs = score_pairs
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BatchedRerank"
+
+    def _postprocess_nodes(
+        self,
+        nodes: list[NodeWithScore],
+        query_bundle: QueryBundle | None = None,
+    ) -> list[NodeWithScore]:
+        if query_bundle is None:
+            raise ValueError("Missing query bundle in extra info.")
+        if not nodes:
+            return []
+        scores = self._score_pairs(
+            [
+                (
+                    query_bundle.query_str,
+                    node.node.get_content(metadata_mode=MetadataMode.EMBED),
+                )
+                for node in nodes
+            ]
+        )
+        for node, score in zip(nodes, scores, strict=True):
+            node.score = score
+        return sorted(nodes, key=lambda node: -(node.score or 0.0))[: self.top_n]
@@ -0,0 +1,268 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from sonar_labs.components.embedding.custom.delegating import (
+    DelegatingEmbedding,
+    query_embeddings,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize the unicode form and the whitespaces, which don't change a text."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """Embeddings on disk, by hash of (model id, kind, normalized text).
+
+    The vectors are float32 blobs in a sqlite database, that can be shared by
+    several processes, in front of which the most recently used ones are kept in
+    memory. When the database grows over `max_size_bytes`, the least recently
+    used vectors are evicted, a tenth at a time.
+    """
+
+    # Rough size of a row on top of its vector (key, indexes...)
+    _ROW_OVERHEAD_BYTES = 128
+
+    def __init__(
+        self, persist_path: Path, max_size_bytes: int, memory_items: int
+    ) -> None:
+        persist_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self.memory_items = memory_items
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, Embedding] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(
+            str(persist_path), check_same_thread=False, timeout=30
+        )
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+            )
+            self._size_bytes = self._conn.execute(
+                f"SELECT COALESCE(SUM(LENGTH(vector) + {self._ROW_OVERHEAD_BYTES}), 0) FROM embeddings"
+            ).fetchone()[0]
+
+    @staticmethod
+    def key(model_id: str, kind: str, text: str) -> str:
+        return hashlib.sha256(
+            f"{model_id}\0{kind}\0{normalize_text(text)}".encode()
+        ).hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict[str, Embedding]:
+        found: dict[str, Embedding] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            on_disk = [key for key in set(keys) if key not in found]
+            # Stay below the sqlite limit of variables per statement
+            for i in range(0, len(on_disk), 500):
+                chunk = on_disk[i : i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+                    self._remember(key, found[key])
+                if rows:
+                    with self._conn:
+                        self._conn.executemany(
+                            "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                            [(time.time(), key) for key, _ in rows],
+                        )
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, embeddings: dict[str, Embedding]) -> None:
+        now = time.time()
+        rows = [
+            (key, np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for key, embedding in embeddings.items()
+        ]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    rows,
+                )
+            for key, embedding in embeddings.items():
+                self._remember(key, embedding)
+            self._size_bytes += sum(
+                len(vector) + self._ROW_OVERHEAD_BYTES for _, vector, _ in rows
+            )
+            if self._size_bytes > self.max_size_bytes:
+                self._evict()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "size_bytes": self._size_bytes,
+        }
+
+    def _remember(self, key: str, embedding: Embedding) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        with self._conn:
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            while count and self._size_bytes > self.max_size_bytes:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (max(1, count // 10),),
+                )
+                count, self._size_bytes = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector) + "
+                    f"{self._ROW_OVERHEAD_BYTES}), 0) FROM embeddings"
+                ).fetchone()
+        logger.info("Evicted embeddings from the cache, size=%s", self._size_bytes)
+
+
+class CachedEmbedding(DelegatingEmbedding):
+    """Look the embeddings up in an `EmbeddingCache` before computing them.
+
+    Only the texts missing from the cache are sent to the wrapped model, in a
+    single batch. Query and text embeddings are cached separately, as some
+    models embed them differently.
+
+    The embeddings are cached by `model_id`: models of the same name can embed
+    differently (e.g. the ONNX export of a model, quantized or not). It defaults
+    to the class and the name of the wrapped model.
+    """
+
+    _cache: EmbeddingCache = PrivateAttr()
+    _model_id: str = PrivateAttr()
+
+    def __init__(
+        self,
+        embedding_model: BaseEmbedding,
+        cache: EmbeddingCache,
+        model_id: str | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(embedding_model, **kwargs)
+        self._cache = cache
+        if model_id is None:
+            inner = embedding_model
+            while isinstance(inner, DelegatingEmbedding):
+                inner = inner.embedding_model
+            model_id = f"{inner.class_name()}:{embedding_model.model_name}"
+        self._model_id = model_id
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    def _lookup(
+        self, kind: str, texts: list[str]
+    ) -> tuple[list[str], dict[str, Embedding], dict[str, str]]:
+        keys = [self._cache.key(self._model_id, kind, text) for text in texts]
+        cached = self._cache.get_many(keys)
+        # Missing texts by key, deduplicated
+        missing = {
+            key: text
+            for key, text in zip(keys, texts, strict=True)
+            if key not in cached
+        }
+        return keys, cached, missing
+
+    def _cached(
+        self,
+        kind: str,
+        texts: list[str],
+        embed: Callable[[list[str]], list[Embedding]],
+    ) -> list[Embedding]:
+        keys, cached, missing = self._lookup(kind, texts)
+        if missing:
+            computed = dict(
+                zip(missing.keys(), embed(list(missing.values())), strict=True)
+            )
+            self._cache.put_many(computed)
+            cached.update(computed)
+        return [cached[key] for key in keys]
+
+    async def _acached(
+        self,
+        kind: str,
+        texts: list[str],
+        embed: Callable[[list[str]], Awaitable[list[Embedding]]],
+    ) -> list[Embedding]:
+        keys, cached, missing = self._lookup(kind, texts)
+        if missing:
+            computed = dict(
+                zip(
+                    missing.keys(),
+                    await embed(list(missing.values())),
+                    strict=True,
+                )
+            )
+            self._cache.put_many(computed)
+            cached.update(computed)
+        return [cached[key] for key in keys]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._get_query_embeddings([query])[0]
+
+    def _get_query_embeddings(self, queries: list[str]) -> list[Embedding]:
+        return self._cached(
+            "query",
+            queries,
+            lambda missing: query_embeddings(self._embedding_model, missing),
+        )
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        async def embed(queries: list[str]) -> list[Embedding]:
+            return [await self._embedding_model._aget_query_embedding(queries[0])]
+
+        return (await self._acached("query", [query], embed))[0]
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        return self._cached("text", texts, self._embedding_model._get_text_embeddings)
+
+    async def _aget_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        return await self._acached(
+            "text", texts, self._embedding_model._aget_text_embeddings
+        )
@@ -0,0 +1,69 @@
+from typing import Any
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+
+def query_embeddings(
+    embedding_model: BaseEmbedding, queries: list[str]
+) -> list[Embedding]:
+    """Embed several queries, in one batch when the model supports it.
+
+    `BaseEmbedding` has no batched query embeddings: they are computed by the
+    `_get_query_embeddings` of the models defining it, else by the batched
+    encoding of the huggingface embeddings, else one by one.
+    """
+    if hasattr(embedding_model, "_get_query_embeddings"):
+        embeddings: list[Embedding] = embedding_model._get_query_embeddings(queries)
+        return embeddings
+    if embedding_model.class_name() == "HuggingFaceEmbedding":
+        return embedding_model._embed(queries, prompt_name="query")  # type: ignore
+    return [embedding_model._get_query_embedding(query) for query in queries]
+
+
+class DelegatingEmbedding(BaseEmbedding):
+    """Embedding model forwarding everything to another embedding model.
+
+    Base class of the wrappers adding a behaviour (batching, caching...) on top of
+    the embedding model built by the `EmbeddingComponent`, whatever its type. The
+    wrapper takes the name of the wrapped model, so it is a drop-in replacement.
+    """
+
+    _embedding_model: BaseEmbedding = PrivateAttr()
+
+    def __init__(self, embedding_model: BaseEmbedding, **kwargs: Any) -> None:
+        kwargs.setdefault("model_name", embedding_model.model_name)
+        kwargs.setdefault("embed_batch_size", embedding_model.embed_batch_size)
+        kwargs.setdefault("callback_manager", embedding_model.callback_manager)
+        super().__init__(**kwargs)
+        self._embedding_model = embedding_model
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "DelegatingEmbedding"
+
+    @property
+    def embedding_model(self) -> BaseEmbedding:
+        """The wrapped embedding model."""
+        return self._embedding_model
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._embedding_model._get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await self._embedding_model._aget_query_embedding(query)
+
+    def _get_query_embeddings(self, queries: list[str]) -> list[Embedding]:
+        return query_embeddings(self._embedding_model, queries)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embedding_model._get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await self._embedding_model._aget_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        return self._embedding_model._get_text_embeddings(texts)
+
+    async def _aget_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        return await self._embedding_model._aget_text_embeddings(texts)
@@ -0,0 +1,140 @@
+import logging
+from collections.abc import Callable
+from typing import Any
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+from sonar_labs.components.embedding.custom.delegating import DelegatingEmbedding
+
+logger = logging.getLogger(__name__)
+
+LengthFunction = Callable[[list[str]], list[int]]
+
+
+def approximate_token_lengths(texts: list[str]) -> list[int]:
+    """Rough token count of each text, when no tokenizer is at hand."""
+    return [len(text) // 4 + 1 for text in texts]
+
+
+def length_buckets(
+    lengths: list[int], token_budget: int, max_batch_size: int
+) -> list[list[int]]:
+    """Group the indexes of texts in batches of similar lengths.
+
+    Texts are sorted by length, and batched as long as the padded batch (its
+    size times its longest text) fits in `token_budget` tokens. A text longer
+    than the budget gets a batch of its own.
+    """
+    buckets: list[list[int]] = []
+    current: list[int] = []
+    for index in sorted(range(len(lengths)), key=lengths.__getitem__):
+        # Sorted by length, the text being added is the longest of the batch
+        if current and (
+            len(current) >= max_batch_size
+            or (len(current) + 1) * lengths[index] > token_budget
+        ):
+            buckets.append(current)
+            current = []
+        current.append(index)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+class LengthBucketedEmbedding(DelegatingEmbedding):
+    """Embed texts in batches of similar lengths, sized by a token budget.
+
+    Local models pad every text of a batch to the longest one: batching single
+    sentences with long OCRed paragraphs wastes most of the computation. Texts
+    are sorted by token length, batched by `length_buckets`, embedded, and the
+    embeddings are returned in the original order.
+
+    The wrapped model must embed each batch it is given at once (its own
+    `embed_batch_size` must be at least `max_batch_size`).
+    """
+
+    token_budget: int = Field(
+        description="Maximum number of (padded) tokens in a batch."
+    )
+    max_batch_size: int = Field(description="Maximum number of texts in a batch.")
+
+    _length_function: LengthFunction = PrivateAttr()
+
+    def __init__(
+        self,
+        embedding_model: BaseEmbedding,
+        token_budget: int,
+        max_batch_size: int,
+        length_function: LengthFunction | None = None,
+        **kwargs: Any,
+    ) -> None:
+        # Texts are sorted within the chunks given by `get_text_embedding_batch`,
+        # the bigger they are, the better the buckets
+        kwargs.setdefault("embed_batch_size", max_batch_size * 8)
+        super().__init__(
+            embedding_model,
+            token_budget=token_budget,
+            max_batch_size=max_batch_size,
+            **kwargs,
+        )
+        self._length_function = length_function or approximate_token_lengths
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LengthBucketedEmbedding"
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        buckets = length_buckets(
+            self._length_function(texts), self.token_budget, self.max_batch_size
+        )
+        logger.debug(
+            "Embedding count=%s texts in count=%s length buckets",
+            len(texts),
+            len(buckets),
+        )
+        embeddings: list[Embedding] = [[] for _ in texts]
+        for bucket in buckets:
+            bucket_embeddings = self._embedding_model._get_text_embeddings(
+                [texts[index] for index in bucket]
+            )
+            for index, embedding in zip(bucket, bucket_embeddings, strict=True):
+                embeddings[index] = embedding
+        return embeddings
+
+    async def _aget_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        buckets = length_buckets(
+            self._length_function(texts), self.token_budget, self.max_batch_size
+        )
+        embeddings: list[Embedding] = [[] for _ in texts]
+        for bucket in buckets:
+            bucket_embeddings = await self._embedding_model._aget_text_embeddings(
+                [texts[index] for index in bucket]
+            )
+            for index, embedding in zip(bucket, bucket_embeddings, strict=True):
+                embeddings[index] = embedding
+        return embeddings
+
+
+def tokenizer_length_function(embedding_model: BaseEmbedding) -> LengthFunction | None:
+    """Token lengths from the tokenizer of a local model, if any.
+
+    Works with the sentence-transformers models of the huggingface embeddings,
+    and the `OnnxEmbedding`.
+    """
+    model = getattr(embedding_model, "_model", None)
+    tokenizer = getattr(model, "tokenizer", None)
+    max_length = getattr(model, "max_seq_length", None) or 512
+    if tokenizer is None:
+        tokenizer = getattr(embedding_model, "_tokenizer", None)
+        max_length = getattr(embedding_model, "max_length", None) or 512
+    if tokenizer is None:
+        return None
+
+    def token_lengths(texts: list[str]) -> list[int]:
+        input_ids = tokenizer(texts, truncation=True, max_length=max_length)[
+            "input_ids"
+        ]
+        return [len(ids) for ids in input_ids]
+
+    return token_lengths
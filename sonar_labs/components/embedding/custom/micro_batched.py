@@ -0,0 +1,85 @@
+import asyncio
+from typing import Any
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from sonar_labs.components.embedding.custom.delegating import (
+    DelegatingEmbedding,
+    query_embeddings,
+)
+from sonar_labs.components.embedding.micro_batch_scheduler import (
+    MicroBatchScheduler,
+)
+
+
+class MicroBatchedEmbedding(DelegatingEmbedding):
+    """Embed the queries and small batches of concurrent callers together.
+
+    Each API request embeds a single query, or a few texts: they are sent to
+    `MicroBatchScheduler`s, that embed the items of concurrent requests in a
+    single batch. Batches of at least `max_batch_size` texts gain nothing from
+    waiting for others, and are embedded right away.
+    """
+
+    _query_scheduler: MicroBatchScheduler[str, Embedding] = PrivateAttr()
+    _text_scheduler: MicroBatchScheduler[str, Embedding] = PrivateAttr()
+
+    def __init__(
+        self,
+        embedding_model: BaseEmbedding,
+        max_batch_size: int,
+        max_wait: float,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(embedding_model, **kwargs)
+        self._query_scheduler = MicroBatchScheduler(
+            lambda queries: query_embeddings(embedding_model, queries),
+            max_batch_size=max_batch_size,
+            max_wait=max_wait,
+            name="query-embeddings",
+        )
+        self._text_scheduler = MicroBatchScheduler(
+            embedding_model._get_text_embeddings,
+            max_batch_size=max_batch_size,
+            max_wait=max_wait,
+            name="text-embeddings",
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MicroBatchedEmbedding"
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._query_scheduler.run(query)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        (future,) = self._query_scheduler.submit_many([query])
+        return await asyncio.wrap_future(future)
+
+    def _get_query_embeddings(self, queries: list[str]) -> list[Embedding]:
+        return self._query_scheduler.run_many(queries)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._text_scheduler.run(text)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        (future,) = self._text_scheduler.submit_many([text])
+        return await asyncio.wrap_future(future)
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        if len(texts) >= self._text_scheduler.max_batch_size:
+            return self._embedding_model._get_text_embeddings(texts)
+        return self._text_scheduler.run_many(texts)
+
+    async def _aget_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        if len(texts) >= self._text_scheduler.max_batch_size:
+            return await self._embedding_model._aget_text_embeddings(texts)
+        return list(
+            await asyncio.gather(
+                *(
+                    asyncio.wrap_future(future)
+                    for future in self._text_scheduler.submit_many(texts)
+                )
+            )
+        )
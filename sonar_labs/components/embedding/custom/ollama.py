@@ -0,0 +1,135 @@
+import asyncio
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import httpx
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+
+class OllamaBatchEmbedding(BaseEmbedding):
+    """Ollama embeddings, in batches, with concurrent requests.
+
+    Uses the `/api/embed` endpoint, that embeds a list of texts in a request,
+    instead of the one text per request of llama-index `OllamaEmbedding`. Up to
+    `max_concurrency` batches are in flight at a time, over a pool of keep-alive
+    connections, so Ollama always has the next batch queued.
+    """
+
+    base_url: str = Field(description="Base URL of the Ollama API.")
+    keep_alive: str | None = Field(
+        default=None,
+        description="Time the model stays loaded in memory after a request.",
+    )
+    request_timeout: float = Field(
+        default=120.0, description="Timeout of a request, in seconds."
+    )
+    batch_size: int = Field(
+        default=64, description="Maximum number of texts embedded in a request."
+    )
+    max_concurrency: int = Field(
+        default=4, description="Maximum number of batch requests in flight."
+    )
+
+    _client: httpx.Client = PrivateAttr()
+    _executor: ThreadPoolExecutor = PrivateAttr()
+    _async_client: httpx.AsyncClient | None = PrivateAttr(default=None)
+    _async_loop: asyncio.AbstractEventLoop | None = PrivateAttr(default=None)
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._client = httpx.Client(
+            base_url=self.base_url,
+            timeout=self.request_timeout,
+            limits=self._limits(),
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="ollama-embed"
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OllamaBatchEmbedding"
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_concurrency,
+            max_keepalive_connections=self.max_concurrency,
+        )
+
+    def _payload(self, texts: list[str]) -> dict[str, Any]:
+        payload: dict[str, Any] = {"model": self.model_name, "input": texts}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def _batches(self, texts: list[str]) -> Iterator[list[str]]:
+        # `get_text_embedding_batch` gives chunks of `embed_batch_size` texts, to
+        # fill the concurrent requests it should be `batch_size * max_concurrency`
+        for i in range(0, len(texts), self.batch_size):
+            yield texts[i : i + self.batch_size]
+
+    def _request(self, texts: list[str]) -> list[Embedding]:
+        response = self._client.post("/api/embed", json=self._payload(texts))
+        response.raise_for_status()
+        embeddings: list[Embedding] = response.json()["embeddings"]
+        return embeddings
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # An async client is bound to the event loop it was first used in
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.request_timeout,
+                limits=self._limits(),
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    async def _arequest(self, texts: list[str]) -> list[Embedding]:
+        response = await self._get_async_client().post(
+            "/api/embed", json=self._payload(texts)
+        )
+        response.raise_for_status()
+        embeddings: list[Embedding] = response.json()["embeddings"]
+        return embeddings
+
+    def _embed(self, texts: list[str]) -> list[Embedding]:
+        batches = list(self._batches(texts))
+        if len(batches) == 1:
+            return self._request(batches[0])
+        return [
+            embedding
+            for batch_embeddings in self._executor.map(self._request, batches)
+            for embedding in batch_embeddings
+        ]
+
+    async def _aembed(self, texts: list[str]) -> list[Embedding]:
+        # The connection limits of the client bound the requests in flight
+        results = await asyncio.gather(
+            *(self._arequest(batch) for batch in self._batches(texts))
+        )
+        return [embedding for batch in results for embedding in batch]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._embed([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return (await self._aembed([query]))[0]
+
+    def _get_query_embeddings(self, queries: list[str]) -> list[Embedding]:
+        return self._embed(queries)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aembed([text]))[0]
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        return self._embed(texts)
+
+    async def _aget_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        return await self._aembed(texts)
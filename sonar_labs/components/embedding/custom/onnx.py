@@ -0,0 +1,195 @@
+import logging
+import shutil
+from pathlib import Path
+from typing import Any, Literal
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_FILE = "model.onnx"
+QUANTIZED_ONNX_MODEL_FILE = "model_quantized.onnx"
+
+
+def query_instruction_for_model(model_name: str) -> str | None:
+    """Instruction the huggingface embeddings prepend to the queries of a model.
+
+    The two backends must embed the queries alike, for the retrievals to match.
+    """
+    try:
+        from llama_index.embeddings.huggingface.utils import (  # type: ignore
+            get_query_instruct_for_model_name,
+        )
+    except ImportError:
+        logger.warning(
+            "Huggingface embeddings not installed, queries are embedded without "
+            "the instruction of model=%s, if any",
+            model_name,
+        )
+        return None
+    return get_query_instruct_for_model_name(model_name) or None
+
+
+def export_onnx_model(model_name: str, output_dir: Path, quantize: bool) -> Path:
+    """Export a HuggingFace model as an ONNX graph, once, in `output_dir`.
+
+    The graph is exported with its tokenizer, and optionally quantized to int8
+    weights (dynamic quantization of the activations, at inference). Returns the
+    path of the graph to run.
+    """
+    model_file = output_dir / ONNX_MODEL_FILE
+    if not model_file.exists():
+        try:
+            from optimum.onnxruntime import (  # type: ignore
+                ORTModelForFeatureExtraction,
+            )
+            from transformers import AutoTokenizer  # type: ignore
+        except ImportError as e:
+            raise ImportError(
+                "ONNX dependencies not found, install with `poetry install --extras embeddings-onnx`"
+            ) from e
+
+        logger.info("Exporting model=%s to ONNX in %s", model_name, output_dir)
+        # Exported aside, not to leave a half written model behind on failure
+        tmp_dir = output_dir.with_name(output_dir.name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+        model.save_pretrained(tmp_dir)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)  # type: ignore[no-untyped-call]
+        tokenizer.save_pretrained(tmp_dir)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        tmp_dir.rename(output_dir)
+
+    if not quantize:
+        return model_file
+    quantized_file = output_dir / QUANTIZED_ONNX_MODEL_FILE
+    if not quantized_file.exists():
+        from optimum.onnxruntime import ORTQuantizer  # type: ignore
+        from optimum.onnxruntime.configuration import (  # type: ignore
+            AutoQuantizationConfig,
+        )
+
+        logger.info("Quantizing the ONNX model=%s to int8", model_name)
+        quantizer = ORTQuantizer.from_pretrained(output_dir, file_name=ONNX_MODEL_FILE)
+        quantizer.quantize(
+            save_dir=output_dir,
+            quantization_config=AutoQuantizationConfig.avx2(
+                is_static=False, per_channel=False
+            ),
+        )
+    return quantized_file
+
+
+class OnnxEmbedding(BaseEmbedding):
+    """Embedding model running an ONNX graph exported by `export_onnx_model`.
+
+    Runs on onnxruntime, without torch: on CPU, and even more with the int8
+    quantized graph, it is a few times faster than the huggingface embeddings.
+    """
+
+    pooling: Literal["cls", "mean"] = Field(
+        description="How the token embeddings are pooled in a text embedding."
+    )
+    max_length: int = Field(description="Texts are truncated to this many tokens.")
+    normalize: bool = Field(description="Normalize the embeddings to unit length.")
+    query_instruction: str | None = Field(
+        description="Instruction prepended to the queries."
+    )
+
+    _session: Any = PrivateAttr()
+    _tokenizer: Any = PrivateAttr()
+    _input_names: list[str] = PrivateAttr()
+
+    def __init__(
+        self,
+        model_file: Path,
+        pooling: Literal["cls", "mean"] = "cls",
+        max_length: int = 512,
+        normalize: bool = True,
+        query_instruction: str | None = None,
+        intra_op_threads: int = 0,
+        **kwargs: Any,
+    ) -> None:
+        try:
+            import onnxruntime  # type: ignore
+            from transformers import AutoTokenizer  # type: ignore
+        except ImportError as e:
+            raise ImportError(
+                "ONNX dependencies not found, install with `poetry install --extras embeddings-onnx`"
+            ) from e
+
+        kwargs = {
+            "pooling": pooling,
+            "max_length": max_length,
+            "normalize": normalize,
+            "query_instruction": query_instruction,
+            **kwargs,
+        }
+        super().__init__(**kwargs)
+        session_options = onnxruntime.SessionOptions()
+        # 0 lets onnxruntime use all the physical cores
+        session_options.intra_op_num_threads = intra_op_threads
+        self._session = onnxruntime.InferenceSession(
+            str(model_file),
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._tokenizer = AutoTokenizer.from_pretrained(  # type: ignore[no-untyped-call]
+            model_file.parent
+        )
+        self._input_names = [node.name for node in self._session.get_inputs()]
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OnnxEmbedding"
+
+    def _embed(self, texts: list[str]) -> list[Embedding]:
+        encoded = self._tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        inputs = {
+            name: encoded[name].astype(np.int64)
+            if name in encoded
+            else np.zeros_like(encoded["input_ids"], dtype=np.int64)
+            for name in self._input_names
+        }
+        token_embeddings = self._session.run(None, inputs)[0]
+        if self.pooling == "cls":
+            embeddings = token_embeddings[:, 0]
+        else:
+            mask = encoded["attention_mask"][..., np.newaxis].astype(np.float32)
+            embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(
+                mask.sum(axis=1), 1e-9, None
+            )
+        if self.normalize:
+            embeddings = embeddings / np.clip(
+                np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None
+            )
+        result: list[Embedding] = embeddings.tolist()
+        return result
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._get_query_embeddings([query])[0]
+
+    def _get_query_embeddings(self, queries: list[str]) -> list[Embedding]:
+        if self.query_instruction:
+            queries = [f"{self.query_instruction} {query}".strip() for query in queries]
+        return self._embed(queries)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        return self._embed(texts)
@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+from sonar_labs.components.embedding.custom.cached import normalize_text
+from sonar_labs.components.embedding.custom.delegating import DelegatingEmbedding
+
+
+class QueryCachedEmbedding(DelegatingEmbedding):
+    """Keep the embeddings of the recent queries in memory.
+
+    The same queries are asked over and over (dashboards, retries...), and with a
+    remote embedding model, embedding the query is most of a retrieval. Up to
+    `max_size` query embeddings are kept, for `ttl` seconds, the least recently
+    used being dropped first. Text embeddings are not cached.
+    """
+
+    max_size: int = Field(description="Maximum number of cached query embeddings.")
+    ttl: float = Field(description="Seconds a query embedding is cached for.")
+
+    _entries: OrderedDict[str, tuple[float, Embedding]] = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def __init__(
+        self, embedding_model: BaseEmbedding, max_size: int, ttl: float, **kwargs: Any
+    ) -> None:
+        super().__init__(embedding_model, max_size=max_size, ttl=ttl, **kwargs)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "QueryCachedEmbedding"
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+        }
+
+    def _get(self, key: str) -> Embedding | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def _put(self, key: str, embedding: Embedding) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        key = normalize_text(query)
+        embedding = self._get(key)
+        if embedding is None:
+            embedding = self._embedding_model._get_query_embedding(query)
+            self._put(key, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        key = normalize_text(query)
+        embedding = self._get(key)
+        if embedding is None:
+            embedding = await self._embedding_model._aget_query_embedding(query)
+            self._put(key, embedding)
+        return embedding
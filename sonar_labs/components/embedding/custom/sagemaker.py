@@ -1,10 +1,18 @@
 # mypy: ignore-errors
+import asyncio
 import json
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 import boto3
+from botocore.config import Config
 from llama_index.core.base.embeddings.base import BaseEmbedding
-from pydantic import Field, PrivateAttr
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+# Bytes of the JSON request around the texts, and around each text
+_REQUEST_OVERHEAD_BYTES = 16
+_TEXT_OVERHEAD_BYTES = 4
 
 
 class SagemakerEmbedding(BaseEmbedding):
@@ -23,26 +31,73 @@ class SagemakerEmbedding(BaseEmbedding):
     Make sure the credentials / roles used have the required policies to
     access the Sagemaker endpoint.
     See: https://docs.aws.amazon.com/IAM/latest/UserGuide/access_policies.html
-    """
 
-    endpoint_name: str = Field(description="")
-
-    _boto_client: Any = boto3.client(
-        "sagemaker-runtime",
-    )  # TODO make it an optional field
+    The texts are sent in batches of at most `max_batch_size` texts and
+    `max_payload_bytes` bytes (the endpoint payload is limited to 6MB), up to
+    `max_concurrency` batches at a time, over a pool of as many connections.
+    """
 
-    _async_not_implemented_warned: bool = PrivateAttr(default=False)
+    endpoint_name: str = Field(description="Name of the Sagemaker endpoint.")
+    endpoint_url: str | None = Field(
+        default=None,
+        description="URL of the Sagemaker runtime API, if not the AWS one (tests).",
+    )
+    region_name: str | None = Field(
+        default=None, description="AWS region of the endpoint, if not the default."
+    )
+    max_batch_size: int = Field(
+        default=32, description="Maximum number of texts sent in an invocation."
+    )
+    max_payload_bytes: int = Field(
+        default=5 * 1024 * 1024,
+        description="Maximum size of the body of an invocation, in bytes.",
+    )
+    max_concurrency: int = Field(
+        default=4, description="Maximum number of invocations run at the same time."
+    )
+
+    _boto_client: Any = PrivateAttr()
+    _executor: ThreadPoolExecutor = PrivateAttr()
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        # boto3 clients are thread safe, a single one serves all the invocations
+        self._boto_client = boto3.client(
+            "sagemaker-runtime",
+            endpoint_url=self.endpoint_url,
+            region_name=self.region_name,
+            config=Config(
+                max_pool_connections=self.max_concurrency,
+                retries={"max_attempts": 3, "mode": "adaptive"},
+            ),
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="sagemaker"
+        )
 
     @classmethod
     def class_name(cls) -> str:
         return "SagemakerEmbedding"
 
-    def _async_not_implemented_warn_once(self) -> None:
-        if not self._async_not_implemented_warned:
-            print("Async embedding not available, falling back to sync method.")
-            self._async_not_implemented_warned = True
-
-    def _embed(self, sentences: list[str]) -> list[list[float]]:
+    def _batches(self, sentences: list[str]) -> Iterator[list[str]]:
+        """Split the sentences in batches fitting in an invocation."""
+        batch: list[str] = []
+        batch_bytes = _REQUEST_OVERHEAD_BYTES
+        for sentence in sentences:
+            sentence_bytes = len(json.dumps(sentence)) + _TEXT_OVERHEAD_BYTES
+            if batch and (
+                len(batch) >= self.max_batch_size
+                or batch_bytes + sentence_bytes > self.max_payload_bytes
+            ):
+                yield batch
+                batch = []
+                batch_bytes = _REQUEST_OVERHEAD_BYTES
+            batch.append(sentence)
+            batch_bytes += sentence_bytes
+        if batch:
+            yield batch
+
+    def _invoke(self, sentences: list[str]) -> list[list[float]]:
         request_params = {
             "inputs": sentences,
         }
@@ -59,24 +114,43 @@ class SagemakerEmbedding(BaseEmbedding):
 
         return response_json["vectors"]
 
+    def _embed(self, sentences: list[str]) -> list[list[float]]:
+        batches = list(self._batches(sentences))
+        if len(batches) == 1:
+            return self._invoke(batches[0])
+        embeddings: list[list[float]] = []
+        for batch_embeddings in self._executor.map(self._invoke, batches):
+            embeddings.extend(batch_embeddings)
+        return embeddings
+
+    async def _aembed(self, sentences: list[str]) -> list[list[float]]:
+        # Invocations run in the pool of the client, without blocking the loop
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, self._invoke, batch)
+                for batch in self._batches(sentences)
+            )
+        )
+        return [embedding for batch in results for embedding in batch]
+
     def _get_query_embedding(self, query: str) -> list[float]:
         """Get query embedding."""
         return self._embed([query])[0]
 
     async def _aget_query_embedding(self, query: str) -> list[float]:
-        # Warn the user that sync is being used
-        self._async_not_implemented_warn_once()
-        return self._get_query_embedding(query)
-
-    async def _aget_text_embedding(self, text: str) -> list[float]:
-        # Warn the user that sync is being used
-        self._async_not_implemented_warn_once()
-        return self._get_text_embedding(text)
+        return (await self._aembed([query]))[0]
 
     def _get_text_embedding(self, text: str) -> list[float]:
         """Get text embedding."""
         return self._embed([text])[0]
 
+    async def _aget_text_embedding(self, text: str) -> list[float]:
+        return (await self._aembed([text]))[0]
+
     def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
         """Get text embeddings."""
         return self._embed(texts)
+
+    async def _aget_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return await self._aembed(texts)
@@ -1,20 +1,150 @@
 import logging
+import threading
+from collections.abc import Callable
+from typing import Any
 
 from injector import inject, singleton
 from llama_index.core.embeddings import BaseEmbedding, MockEmbedding
 
-from sonar_labs.paths import models_cache_path
+from sonar_labs.components.embedding.batched_rerank import BatchedRerank
+from sonar_labs.components.embedding.custom.cached import (
+    CachedEmbedding,
+    EmbeddingCache,
+)
+from sonar_labs.components.embedding.custom.length_bucketed import (
+    LengthBucketedEmbedding,
+    tokenizer_length_function,
+)
+from sonar_labs.components.embedding.custom.micro_batched import (
+    MicroBatchedEmbedding,
+)
+from sonar_labs.components.embedding.custom.query_cached import (
+    QueryCachedEmbedding,
+)
+from sonar_labs.components.embedding.micro_batch_scheduler import (
+    MicroBatchScheduler,
+)
+from sonar_labs.paths import local_data_path, models_cache_path
 from sonar_labs.settings.settings import Settings
 
 logger = logging.getLogger(__name__)
 
+# Embedding modes calling a remote API per query: micro-batching their queries
+# would serialize the round-trips of concurrent requests
+REMOTE_EMBEDDING_MODES = {"openai", "azopenai", "sagemaker"}
+
+
+def embedding_model_id(settings: Settings, model_name: str) -> str:
+    """Identity of the vectors of the embedding model named `model_name`.
+
+    The `huggingface` and `onnx` modes run models of the same name, but their
+    vectors differ: the ONNX export, its int8 quantization and its pooling.
+    """
+    mode = settings.embedding.mode
+    if mode == "onnx":
+        hf_settings = settings.huggingface
+        precision = "int8" if hf_settings.onnx_quantize else "fp32"
+        return f"{mode}:{precision}:{hf_settings.onnx_pooling}:{model_name}"
+    return f"{mode}:{model_name}"
+
 
 @singleton
 class EmbeddingComponent:
     embedding_model: BaseEmbedding
+    # Embedding model of the API requests (retrievals, /v1/embeddings): recent
+    # queries are cached, and concurrent requests are embedded together
+    query_embedding_model: BaseEmbedding
+    rerank_scheduler: MicroBatchScheduler[tuple[str, str], float] | None = None
+    # The backend and the name of the embedding model, see `embedding_model_id`
+    model_id: str
 
     @inject
     def __init__(self, settings: Settings) -> None:
+        self._score_pairs: Callable[[list[tuple[str, str]]], list[float]] | None = None
+        if settings.embedding.sidecar:
+            self._init_sidecar_client(settings)
+        else:
+            self._init_local_model(settings)
+        self.model_id = embedding_model_id(settings, self.embedding_model.model_name)
+
+        if settings.embedding.cache:
+            # Outermost, so only the texts missing from the cache are batched
+            self.embedding_model = CachedEmbedding(
+                self.embedding_model,
+                EmbeddingCache(
+                    local_data_path / "embedding_cache.sqlite",
+                    max_size_bytes=settings.embedding.cache_max_size_mb * 1024 * 1024,
+                    memory_items=settings.embedding.cache_memory_items,
+                ),
+                model_id=self.model_id,
+            )
+
+        max_wait = settings.embedding.micro_batch_max_wait_ms / 1000
+        if settings.embedding.sidecar:
+            # The sidecar batches the requests of all the API workers
+            self.query_embedding_model = self.embedding_model
+        elif settings.embedding.mode in REMOTE_EMBEDDING_MODES:
+            # The concurrent requests are embedded in parallel by the API
+            self.query_embedding_model = self.embedding_model
+        else:
+            self.query_embedding_model = MicroBatchedEmbedding(
+                self.embedding_model,
+                max_batch_size=settings.embedding.micro_batch_max_size,
+                max_wait=max_wait,
+            )
+        # The recent queries are embedded from memory, without waiting for a batch
+        if settings.embedding.query_cache_size > 0:
+            self.query_embedding_model = QueryCachedEmbedding(
+                self.query_embedding_model,
+                max_size=settings.embedding.query_cache_size,
+                ttl=settings.embedding.query_cache_ttl,
+            )
+
+        if settings.rag.rerank.enabled and not settings.embedding.sidecar:
+            # The cross-encoder is loaded by the first rerank
+            self._settings = settings
+            self._rerank_lock = threading.Lock()
+            self._score_pairs = self._score_pairs_locally
+
+    def _score_pairs_locally(self, pairs: list[tuple[str, str]]) -> list[float]:
+        with self._rerank_lock:
+            if self.rerank_scheduler is None:
+                try:
+                    from sentence_transformers import CrossEncoder  # type: ignore
+                except ImportError as e:
+                    raise ImportError(
+                        "Rerank dependencies not found, install with `poetry install --extras rerank-sentence-transformers`"
+                    ) from e
+
+                rerank_settings = self._settings.rag.rerank
+                cross_encoder = CrossEncoder(rerank_settings.model, max_length=512)
+                self.rerank_scheduler = MicroBatchScheduler(
+                    lambda batch: cross_encoder.predict(
+                        batch, show_progress_bar=False
+                    ).tolist(),
+                    max_batch_size=rerank_settings.max_batch_size,
+                    max_wait=self._settings.embedding.micro_batch_max_wait_ms / 1000,
+                    name="rerank",
+                )
+        return self.rerank_scheduler.run_many(pairs)
+
+    def _init_sidecar_client(self, settings: Settings) -> None:
+        from sonar_labs.components.inference.inference_client import (
+            InferenceClient,
+            SidecarEmbedding,
+            sidecar_socket_path,
+        )
+
+        socket_path = sidecar_socket_path(settings)
+        logger.info("Using the models of the inference sidecar at %s", socket_path)
+        client = InferenceClient(socket_path)
+        self.embedding_model = SidecarEmbedding(
+            client, embed_batch_size=settings.embedding.micro_batch_max_size * 8
+        )
+        if settings.rag.rerank.enabled:
+            self._score_pairs = client.rerank
+
+    def _init_local_model(self, settings: Settings) -> None:
         embedding_mode = settings.embedding.mode
         logger.info("Initializing the embedding model in mode=%s", embedding_mode)
         match embedding_mode:
@@ -28,10 +158,57 @@ class EmbeddingComponent:
                         "Local dependencies not found, install with `poetry install --extras embeddings-huggingface`"
                     ) from e
 
-                self.embedding_model = HuggingFaceEmbedding(
-                    model_name=settings.huggingface.embedding_hf_model_name,
-                    cache_folder=str(models_cache_path),
+                hf_settings = settings.huggingface
+                if hf_settings.embed_token_budget > 0:
+                    # The wrapper does the batching, each of its batches must be
+                    # embedded at once
+                    embedding_model = HuggingFaceEmbedding(
+                        model_name=hf_settings.embedding_hf_model_name,
+                        cache_folder=str(models_cache_path),
+                        embed_batch_size=hf_settings.embed_max_batch_size,
+                    )
+                    self.embedding_model = LengthBucketedEmbedding(
+                        embedding_model,
+                        token_budget=hf_settings.embed_token_budget,
+                        max_batch_size=hf_settings.embed_max_batch_size,
+                        length_function=tokenizer_length_function(embedding_model),
+                    )
+                else:
+                    self.embedding_model = HuggingFaceEmbedding(
+                        model_name=hf_settings.embedding_hf_model_name,
+                        cache_folder=str(models_cache_path),
+                    )
+            case "onnx":
+                from sonar_labs.components.embedding.custom.onnx import (
+                    OnnxEmbedding,
+                    export_onnx_model,
+                    query_instruction_for_model,
+                )
+
+                hf_settings = settings.huggingface
+                model_name = hf_settings.embedding_hf_model_name
+                model_file = export_onnx_model(
+                    model_name,
+                    models_cache_path / "onnx" / model_name.replace("/", "--"),
+                    quantize=hf_settings.onnx_quantize,
+                )
+                embedding_model = OnnxEmbedding(
+                    model_file,
+                    pooling=hf_settings.onnx_pooling,
+                    query_instruction=query_instruction_for_model(model_name),
+                    intra_op_threads=hf_settings.onnx_intra_op_threads,
+                    model_name=model_name,
+                    embed_batch_size=hf_settings.embed_max_batch_size,
                 )
+                if hf_settings.embed_token_budget > 0:
+                    self.embedding_model = LengthBucketedEmbedding(
+                        embedding_model,
+                        token_budget=hf_settings.embed_token_budget,
+                        max_batch_size=hf_settings.embed_max_batch_size,
+                        length_function=tokenizer_length_function(embedding_model),
+                    )
+                else:
+                    self.embedding_model = embedding_model
             case "sagemaker":
                 try:
                     from sonar_labs.components.embedding.custom.sagemaker import (
@@ -42,8 +219,15 @@ class EmbeddingComponent:
                         "Sagemaker dependencies not found, install with `poetry install --extras embeddings-sagemaker`"
                     ) from e
 
+                sagemaker_settings = settings.sagemaker
                 self.embedding_model = SagemakerEmbedding(
-                    endpoint_name=settings.sagemaker.embedding_endpoint_name,
+                    endpoint_name=sagemaker_settings.embedding_endpoint_name,
+                    endpoint_url=sagemaker_settings.embedding_endpoint_url,
+                    max_batch_size=sagemaker_settings.embedding_max_batch_size,
+                    max_payload_bytes=sagemaker_settings.embedding_max_payload_bytes,
+                    max_concurrency=sagemaker_settings.embedding_max_concurrency,
+                    embed_batch_size=sagemaker_settings.embedding_max_batch_size
+                    * sagemaker_settings.embedding_max_concurrency,
                 )
             case "openai":
                 try:
@@ -58,19 +242,20 @@ class EmbeddingComponent:
                 openai_settings = settings.openai.api_key
                 self.embedding_model = OpenAIEmbedding(api_key=openai_settings)
             case "ollama":
-                try:
-                    from llama_index.embeddings.ollama import (  # type: ignore
-                        OllamaEmbedding,
-                    )
-                except ImportError as e:
-                    raise ImportError(
-                        "Local dependencies not found, install with `poetry install --extras embeddings-ollama`"
-                    ) from e
+                from sonar_labs.components.embedding.custom.ollama import (
+                    OllamaBatchEmbedding,
+                )
 
                 ollama_settings = settings.ollama
-                self.embedding_model = OllamaEmbedding(
+                self.embedding_model = OllamaBatchEmbedding(
                     model_name=ollama_settings.embedding_model,
                     base_url=ollama_settings.embedding_api_base,
+                    keep_alive=ollama_settings.keep_alive,
+                    request_timeout=ollama_settings.request_timeout,
+                    batch_size=ollama_settings.embedding_batch_size,
+                    max_concurrency=ollama_settings.embedding_concurrency,
+                    embed_batch_size=ollama_settings.embedding_batch_size
+                    * ollama_settings.embedding_concurrency,
                 )
             case "azopenai":
                 try:
@@ -94,3 +279,30 @@ class EmbeddingComponent:
                 # Not a random number, is the dimensionality used by
                 # the default embedding model
                 self.embedding_model = MockEmbedding(384)
+
+    def score_pairs(self, pairs: list[tuple[str, str]]) -> list[float]:
+        """Score (query, text) pairs with the shared cross-encoder.
+
+        :raises ValueError: if the reranking is not enabled
+        """
+        if self._score_pairs is None:
+            raise ValueError("Reranking is not enabled, see `rag.rerank.enabled`")
+        return self._score_pairs(pairs)
+
+    def reranker(self, top_n: int) -> BatchedRerank:
+        """Node postprocessor reranking with the shared cross-encoder.
+
+        :raises ValueError: if the reranking is not enabled
+        """
+        if self._score_pairs is None:
+            raise ValueError("Reranking is not enabled, see `rag.rerank.enabled`")
+        return BatchedRerank(self._score_pairs, top_n=top_n)
+
+    def cache_stats(self) -> dict[str, Any]:
+        """Hits and misses of the embedding caches that are enabled."""
+        stats: dict[str, Any] = {}
+        if isinstance(self.embedding_model, CachedEmbedding):
+            stats["embeddings"] = self.embedding_model.cache.stats()
+        if isinstance(self.query_embedding_model, QueryCachedEmbedding):
+            stats["queries"] = self.query_embedding_model.stats()
+        return stats
@@ -0,0 +1,86 @@
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatchScheduler(Generic[T, R]):
+    """Run the items submitted by concurrent callers in shared batches.
+
+    Inference requests (a query to embed, query/text pairs to rerank...) come one
+    by one from the API threads, and would each run a forward pass of batch size
+    1, all competing for the same cores. Instead, the submitted items are queued,
+    and a single thread collects them for up to `max_wait` seconds (or until
+    `max_batch_size` items), runs `process` once on the whole batch, and resolves
+    the future of each item with its result.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[list[T]], list[R]],
+        max_batch_size: int,
+        max_wait: float,
+        name: str = "micro-batch",
+    ) -> None:
+        self._process = process
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: queue.Queue[tuple[T, Future[R]]] = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit_many(self, items: list[T]) -> list["Future[R]"]:
+        futures: list[Future[R]] = []
+        for item in items:
+            future: Future[R] = Future()
+            self._queue.put((item, future))
+            futures.append(future)
+        return futures
+
+    def run_many(self, items: list[T]) -> list[R]:
+        """Process the items in the shared batches, waiting for their results."""
+        return [future.result() for future in self.submit_many(items)]
+
+    def run(self, item: T) -> R:
+        return self.run_many([item])[0]
+
+    def _next_batch(self) -> list[tuple[T, "Future[R]"]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(
+                    self._queue.get(timeout=timeout)
+                    if timeout > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            logger.debug("Processing a micro batch of size=%s", len(batch))
+            try:
+                results = self._process([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(
+                        f"Got {len(results)} results for a batch of {len(batch)} items"
+                    )
+            except Exception as e:
+                # Never let the thread die, the callers would wait forever
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results, strict=True):
+                future.set_result(result)
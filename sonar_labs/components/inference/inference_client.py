@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import queue
+import socket
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from sonar_labs.components.inference.protocol import (
+    OP_EMBED_QUERIES,
+    OP_EMBED_TEXTS,
+    OP_INFO,
+    OP_RERANK,
+    STATUS_ERROR,
+    decode_matrix,
+    decode_strings,
+    encode_strings,
+    recv_frame,
+    send_frame,
+)
+from sonar_labs.paths import local_data_path
+from sonar_labs.settings.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def sidecar_socket_path(settings: Settings) -> Path:
+    socket_path = Path(settings.embedding.sidecar_socket)
+    return socket_path if socket_path.is_absolute() else local_data_path / socket_path
+
+
+class InferenceClient:
+    """Client of the inference sidecar, over its Unix domain socket.
+
+    Calls are synchronous on a connection: the connections are pooled, and
+    concurrent calls use different connections, batched together by the sidecar.
+    """
+
+    def __init__(self, socket_path: Path, timeout: float = 120) -> None:
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._connections: queue.LifoQueue[socket.socket] = queue.LifoQueue()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(str(self.socket_path))
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _call(self, op: int, body: bytes) -> bytes:
+        for attempt in range(2):
+            try:
+                sock = self._connections.get_nowait()
+                pooled = True
+            except queue.Empty:
+                sock = self._connect()
+                pooled = False
+            try:
+                send_frame(sock, op, body)
+                status, response = recv_frame(sock)
+            except OSError:
+                sock.close()
+                # A pooled connection might have been closed by a sidecar restart
+                if pooled and attempt == 0:
+                    logger.debug("Inference sidecar connection lost, reconnecting")
+                    continue
+                raise
+            self._connections.put(sock)
+            if status == STATUS_ERROR:
+                raise RuntimeError(f"Inference sidecar error: {response.decode()}")
+            return response
+        raise AssertionError("unreachable")
+
+    def model_name(self) -> str:
+        return decode_strings(self._call(OP_INFO, b""))[0]
+
+    def embed_queries(self, queries: list[str]) -> list[Embedding]:
+        body = self._call(OP_EMBED_QUERIES, encode_strings(queries))
+        embeddings: list[Embedding] = decode_matrix(body).tolist()
+        return embeddings
+
+    def embed_texts(self, texts: list[str]) -> list[Embedding]:
+        body = self._call(OP_EMBED_TEXTS, encode_strings(texts))
+        embeddings: list[Embedding] = decode_matrix(body).tolist()
+        return embeddings
+
+    def rerank(self, pairs: list[tuple[str, str]]) -> list[float]:
+        """Scores of (query, text) pairs by the rerank model of the sidecar."""
+        flattened = [string for pair in pairs for string in pair]
+        scores = decode_matrix(self._call(OP_RERANK, encode_strings(flattened)))
+        ranked: list[float] = np.ravel(scores).tolist()
+        return ranked
+
+
+class SidecarEmbedding(BaseEmbedding):
+    """Embedding model of the inference sidecar, thin client of `InferenceClient`."""
+
+    _client: InferenceClient = PrivateAttr()
+
+    def __init__(self, client: InferenceClient, **kwargs: Any) -> None:
+        kwargs.setdefault("model_name", client.model_name())
+        super().__init__(**kwargs)
+        self._client = client
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "SidecarEmbedding"
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._client.embed_queries([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    def _get_query_embeddings(self, queries: list[str]) -> list[Embedding]:
+        return self._client.embed_queries(queries)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._client.embed_texts([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await asyncio.to_thread(self._get_text_embedding, text)
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        return self._client.embed_texts(texts)
+
+    async def _aget_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        return await asyncio.to_thread(self._get_text_embeddings, texts)
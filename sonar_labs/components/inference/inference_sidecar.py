@@ -0,0 +1,137 @@
+"""Inference sidecar: a process owning the models, serving the API workers.
+
+Each API worker would otherwise load its own embedding and rerank models. With
+`embedding.sidecar` enabled, the models are loaded once, by this process, and
+the workers call it over a Unix domain socket (see `protocol`). The calls of
+all the workers are batched together by the micro batch schedulers.
+
+Started by `python -m sonar_labs`, or on its own with
+`python -m sonar_labs.components.inference.inference_sidecar`.
+"""
+
+import atexit
+import logging
+import socket
+import socketserver
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from sonar_labs.components.embedding.custom.delegating import query_embeddings
+from sonar_labs.components.embedding.embedding_component import EmbeddingComponent
+from sonar_labs.components.inference.inference_client import sidecar_socket_path
+from sonar_labs.components.inference.protocol import (
+    OP_EMBED_QUERIES,
+    OP_EMBED_TEXTS,
+    OP_INFO,
+    OP_RERANK,
+    STATUS_ERROR,
+    STATUS_OK,
+    ConnectionClosedError,
+    decode_strings,
+    encode_matrix,
+    encode_strings,
+    recv_frame,
+    send_frame,
+)
+from sonar_labs.settings.settings import Settings, settings
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceSidecar:
+    def __init__(self, settings: Settings) -> None:
+        # The models are loaded here, the caches stay in the API workers
+        local_settings = settings.model_copy(
+            update={
+                "embedding": settings.embedding.model_copy(
+                    update={"sidecar": False, "cache": False, "query_cache_size": 0}
+                )
+            }
+        )
+        self.embedding_component = EmbeddingComponent(local_settings)
+        # Schedules the small batches, embeds the big ones right away
+        self._embedding_model = self.embedding_component.query_embedding_model
+
+    def handle(self, op: int, body: bytes) -> bytes:
+        if op == OP_INFO:
+            return encode_strings([self._embedding_model.model_name])
+        if op == OP_EMBED_QUERIES:
+            embeddings = query_embeddings(self._embedding_model, decode_strings(body))
+            return encode_matrix(np.asarray(embeddings, dtype=np.float32))
+        if op == OP_EMBED_TEXTS:
+            embeddings = self._embedding_model._get_text_embeddings(
+                decode_strings(body)
+            )
+            return encode_matrix(np.asarray(embeddings, dtype=np.float32))
+        if op == OP_RERANK:
+            strings = decode_strings(body)
+            scores = self.embedding_component.score_pairs(
+                list(zip(strings[::2], strings[1::2], strict=True))
+            )
+            return encode_matrix(np.asarray(scores, dtype=np.float32)[:, None])
+        raise ValueError(f"Unknown operation {op}")
+
+    def server(self, socket_path: Path) -> socketserver.ThreadingUnixStreamServer:
+        """Server of the calls on the socket, a thread per connection."""
+        sidecar = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                while True:
+                    try:
+                        op, body = recv_frame(self.request)
+                    except ConnectionClosedError:
+                        return
+                    try:
+                        response, status = sidecar.handle(op, body), STATUS_OK
+                    except Exception as e:
+                        logger.exception("Inference sidecar call failed")
+                        response, status = str(e).encode(), STATUS_ERROR
+                    send_frame(self.request, status, response)
+
+        socket_path.unlink(missing_ok=True)
+        server = socketserver.ThreadingUnixStreamServer(str(socket_path), Handler)
+        server.daemon_threads = True
+        return server
+
+    def serve(self, socket_path: Path) -> None:
+        with self.server(socket_path) as server:
+            logger.info("Inference sidecar listening on %s", socket_path)
+            server.serve_forever()
+
+
+def start_inference_sidecar(settings: Settings, timeout: float = 600) -> None:
+    """Start the sidecar process, and wait for it to serve (models loaded).
+
+    The sidecar is stopped when this process exits.
+    """
+    socket_path = sidecar_socket_path(settings)
+    socket_path.unlink(missing_ok=True)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "sonar_labs.components.inference.inference_sidecar"]
+    )
+    atexit.register(process.terminate)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(
+                f"The inference sidecar exited with code {process.returncode}"
+            )
+        if socket_path.exists():
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                try:
+                    sock.connect(str(socket_path))
+                    return
+                except OSError:
+                    pass
+        time.sleep(0.5)
+    process.terminate()
+    raise TimeoutError(f"The inference sidecar did not start in {timeout}s")
+
+
+if __name__ == "__main__":
+    InferenceSidecar(settings()).serve(sidecar_socket_path(settings()))
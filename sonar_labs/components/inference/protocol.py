@@ -0,0 +1,88 @@
+"""Binary framing of the calls to the inference sidecar.
+
+Every message is a frame: a header of 5 bytes, the operation (requests) or the
+status (responses) on 1 byte and the length of the body on 4 bytes, then the
+body. Texts are sent as a count followed by length prefixed UTF-8 strings, and
+the results come back as a float32 matrix: its shape, then its values. All the
+integers and floats are little-endian.
+"""
+
+import socket
+import struct
+
+import numpy as np
+import numpy.typing as npt
+
+OP_INFO = 0
+OP_EMBED_QUERIES = 1
+OP_EMBED_TEXTS = 2
+OP_RERANK = 3
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_HEADER = struct.Struct("<BI")
+_UINT32 = struct.Struct("<I")
+_SHAPE = struct.Struct("<II")
+
+
+class ConnectionClosedError(ConnectionError):
+    pass
+
+
+def encode_strings(strings: list[str]) -> bytes:
+    parts = [_UINT32.pack(len(strings))]
+    for string in strings:
+        encoded = string.encode()
+        parts.append(_UINT32.pack(len(encoded)))
+        parts.append(encoded)
+    return b"".join(parts)
+
+
+def decode_strings(body: bytes) -> list[str]:
+    (count,) = _UINT32.unpack_from(body, 0)
+    offset = _UINT32.size
+    strings: list[str] = []
+    for _ in range(count):
+        (length,) = _UINT32.unpack_from(body, offset)
+        offset += _UINT32.size
+        strings.append(body[offset : offset + length].decode())
+        offset += length
+    return strings
+
+
+def encode_matrix(matrix: npt.NDArray[np.float32]) -> bytes:
+    if matrix.size == 0:
+        # No rows at all, from an empty list
+        matrix = matrix.reshape(len(matrix), 0)
+    rows, columns = matrix.shape
+    return _SHAPE.pack(rows, columns) + matrix.astype("<f4").tobytes()
+
+
+def decode_matrix(body: bytes) -> npt.NDArray[np.float32]:
+    rows, columns = _SHAPE.unpack_from(body, 0)
+    if rows * columns == 0:
+        return np.zeros((rows, columns), dtype=np.float32)
+    return np.frombuffer(body, dtype="<f4", offset=_SHAPE.size).reshape(rows, columns)
+
+
+def send_frame(sock: socket.socket, code: int, body: bytes) -> None:
+    sock.sendall(_HEADER.pack(code, len(body)))
+    sock.sendall(body)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionClosedError("Inference sidecar connection closed")
+        received += count
+    return bytes(buffer)
+
+
+def recv_frame(sock: socket.socket) -> tuple[int, bytes]:
+    code, length = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return code, _recv_exactly(sock, length)
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import BinaryIO, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+_READ_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: Path) -> str:
+    """Hash a file without loading it whole in memory."""
+    digest = hashlib.sha256()
+    with file_path.open("rb") as f:
+        while chunk := f.read(_READ_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_with_sha256(source: BinaryIO, destination: BinaryIO) -> str:
+    """Copy `source` to `destination` chunk by chunk, and hash it on the way."""
+    digest = hashlib.sha256()
+    while chunk := source.read(_READ_CHUNK_SIZE):
+        digest.update(chunk)
+        destination.write(chunk)
+    return digest.hexdigest()
+
+
+class RegisteredFile(NamedTuple):
+    file_id: str | None
+    fingerprint: str
+    doc_ids: list[str]
+
+
+class ContentHashRegistry:
+    """Fingerprints of the files already ingested, per tenant and file name.
+
+    A fingerprint combines the sha256 of the uploaded bytes with the parser and
+    embedding model versions, so a file is only considered unchanged if
+    re-ingesting it would produce the very same documents.
+
+    The registry is a small sqlite database kept next to the docstore. It is only
+    a cache: callers must check the registered doc_ids still exist before
+    trusting an entry.
+    """
+
+    def __init__(self, persist_path: Path) -> None:
+        persist_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(persist_path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "key TEXT PRIMARY KEY, file_id TEXT, fingerprint TEXT, doc_ids TEXT)"
+            )
+
+    @staticmethod
+    def _key(
+        org_id: str | None,
+        project_id: str | None,
+        user_id: str | None,
+        file_name: str,
+    ) -> str:
+        return json.dumps([org_id, project_id, user_id, file_name])
+
+    def get(
+        self,
+        org_id: str | None,
+        project_id: str | None,
+        user_id: str | None,
+        file_name: str,
+    ) -> RegisteredFile | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_id, fingerprint, doc_ids FROM files WHERE key = ?",
+                (self._key(org_id, project_id, user_id, file_name),),
+            ).fetchone()
+        if row is None:
+            return None
+        file_id, fingerprint, doc_ids = row
+        return RegisteredFile(file_id, fingerprint, json.loads(doc_ids))
+
+    def record(
+        self,
+        org_id: str | None,
+        project_id: str | None,
+        user_id: str | None,
+        file_name: str,
+        file_id: str | None,
+        fingerprint: str,
+        doc_ids: list[str],
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (
+                    self._key(org_id, project_id, user_id, file_name),
+                    file_id,
+                    fingerprint,
+                    json.dumps(doc_ids),
+                ),
+            )
+
+    def forget(
+        self,
+        org_id: str | None,
+        project_id: str | None,
+        user_id: str | None,
+        file_name: str,
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM files WHERE key = ?",
+                (self._key(org_id, project_id, user_id, file_name),),
+            )
+
+    def forget_tenant(self, org_id: str | None, project_id: str | None = None) -> None:
+        """Forget the files of an organization, or of one of its projects."""
+        tenant = [org_id] if project_id is None else [org_id, project_id]
+        # The keys of the tenant, without the closing bracket
+        prefix = json.dumps(tenant)[:-1] + ","
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM files WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            )
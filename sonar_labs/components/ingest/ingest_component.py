@@ -5,9 +5,11 @@ import multiprocessing
 import multiprocessing.pool
 import os
 import threading
+import time
+from concurrent.futures import Future
 from pathlib import Path
-from queue import Queue
-from typing import Any, Optional
+from queue import Empty, Queue
+from typing import Any, NamedTuple, Optional
 
 from llama_index.core.data_structs import IndexDict
 from llama_index.core.embeddings.utils import EmbedType
@@ -17,7 +19,15 @@ from llama_index.core.ingestion import run_transformations
 from llama_index.core.schema import BaseNode, Document, TransformComponent
 from llama_index.core.storage import StorageContext
 
-from sonar_labs.components.ingest.ingest_helper import IngestionHelper
+from sonar_labs.components.ingest.ingest_helper import (
+    IngestionHelper,
+    PDFParseOptions,
+)
+from sonar_labs.components.ingest.ingest_progress import IngestProgress
+from sonar_labs.components.node_store.tenant_index import TenantDocIndex
+from sonar_labs.components.vector_store.sharded_vector_store import (
+    ShardedVectorStore,
+)
 from sonar_labs.paths import local_data_path
 from sonar_labs.settings.settings import Settings
 from sonar_labs.utils.eta import eta
@@ -32,25 +42,72 @@ class BaseIngestComponent(abc.ABC):
         embed_model: EmbedType,
         transformations: list[TransformComponent],
         *args: Any,
+        parse_options: Optional[PDFParseOptions] = None,
         **kwargs: Any,
     ) -> None:
         logger.debug("Initializing base ingest component type=%s", type(self).__name__)
         self.storage_context = storage_context
         self.embed_model = embed_model
         self.transformations = transformations
+        self.parse_options = parse_options or PDFParseOptions()
 
     @abc.abstractmethod
-    def ingest(self, file_name: str, file_data: Path, file_id: str, project_id: Optional[str], user_id: Optional[str], org_id: Optional[str]) -> list[Document]:
+    def ingest(
+        self,
+        file_name: str,
+        file_data: Path,
+        file_id: str,
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[Document]:
         pass
 
     @abc.abstractmethod
-    def bulk_ingest(self, files: list[tuple[str, Path, str]], project_id: Optional[str], user_id: Optional[str], org_id: Optional[str]) -> list[Document]:
+    def bulk_ingest(
+        self,
+        files: list[tuple[str, Path, str]],
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[Document]:
+        pass
+
+    @abc.abstractmethod
+    def ingest_documents(
+        self,
+        documents: list[Document],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[Document]:
+        """Ingest already parsed documents, e.g. built from a text."""
         pass
 
     @abc.abstractmethod
     def delete(self, doc_id: str) -> None:
         pass
 
+    @abc.abstractmethod
+    def delete_many(self, doc_ids: list[str]) -> None:
+        pass
+
+    @abc.abstractmethod
+    def delete_tenant(self, org_id: str, project_id: Optional[str] = None) -> None:
+        """Delete the documents of an organization, or of one of its projects."""
+        pass
+
+    @abc.abstractmethod
+    def find_docs(
+        self,
+        org_id: Optional[str],
+        project_id: Optional[str],
+        user_id: Optional[str],
+        file_id: Optional[str] = None,
+        file_names: Optional[list[str]] = None,
+    ) -> list[str]:
+        pass
+
 
 class BaseIngestComponentWithIndex(BaseIngestComponent, abc.ABC):
     def __init__(
@@ -68,6 +125,9 @@ class BaseIngestComponentWithIndex(BaseIngestComponent, abc.ABC):
             threading.Lock()
         )  # Thread lock! Not Multiprocessing lock
         self._index = self._initialize_index()
+        self._tenant_index = TenantDocIndex.from_docstore(
+            self.storage_context.docstore, local_data_path / "tenant_index.sqlite"
+        )
 
     def _initialize_index(self) -> BaseIndex[IndexDict]:
         """Initialize the index from the storage context."""
@@ -97,14 +157,114 @@ class BaseIngestComponentWithIndex(BaseIngestComponent, abc.ABC):
     def _save_index(self) -> None:
         self._index.storage_context.persist(persist_dir=local_data_path)
 
+    def ingest_documents(
+        self,
+        documents: list[Document],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[Document]:
+        if progress is not None:
+            progress.add(pages_parsed=len(documents))
+        saved: list[Document] = self._save_docs(  # type: ignore[attr-defined]
+            documents, progress
+        )
+        return saved
+
     def delete(self, doc_id: str) -> None:
+        self.delete_many([doc_id])
+
+    def delete_many(self, doc_ids: list[str]) -> None:
+        """Delete documents from the index, the stores, and persist them once.
+
+        Unlike `delete_ref_doc` on each document, the vector store is called once
+        when it supports it (`delete_ref_docs`), and nothing is saved in between.
+        A sharded vector store is given the metadata of the documents, to only
+        delete them from the shards of their tenants.
+        """
+        self._delete_many(doc_ids)
+
+    def delete_tenant(self, org_id: str, project_id: Optional[str] = None) -> None:
+        """Delete the documents of an organization, or of one of its projects.
+
+        When the vector store has a shard per tenant of this scope, the shard is
+        dropped instead of deleting the nodes of each document from it.
+        """
+        tenant_field, tenant = (
+            ("org_id", org_id) if project_id is None else ("project_id", project_id)
+        )
+        vector_store = self.storage_context.vector_store
+        doc_ids = self._tenant_index.find_tenant(org_id, project_id)
+        logger.info(
+            "Deleting the count=%s documents of %s=%s",
+            len(doc_ids),
+            tenant_field,
+            tenant,
+        )
+        if (
+            isinstance(vector_store, ShardedVectorStore)
+            and vector_store.tenant_field == tenant_field
+        ):
+            vector_store.drop_tenant(tenant)
+            self._delete_many(doc_ids, delete_vectors=False)
+        else:
+            self._delete_many(doc_ids)
+
+    def _delete_many(self, doc_ids: list[str], delete_vectors: bool = True) -> None:
+        if not doc_ids:
+            return
+        docstore = self.storage_context.docstore
         with self._index_thread_lock:
-            # Delete the document from the index
-            self._index.delete_ref_doc(doc_id, delete_from_docstore=True)
-
+            node_ids = []
+            ref_doc_metadata = {}
+            for doc_id in doc_ids:
+                ref_doc_info = docstore.get_ref_doc_info(doc_id)
+                if ref_doc_info is not None:
+                    node_ids.extend(ref_doc_info.node_ids)
+                    ref_doc_metadata[doc_id] = ref_doc_info.metadata
+
+            if delete_vectors:
+                self._delete_vectors(doc_ids, ref_doc_metadata)
+
+            index_struct = self._index.index_struct
+            for node_id in node_ids:
+                index_struct.delete(node_id)
+            for doc_id in doc_ids:
+                docstore.delete_ref_doc(doc_id, raise_error=False)
+            self._tenant_index.remove_many(doc_ids)
+            self.storage_context.index_store.add_index_struct(index_struct)
+
+            logger.debug(
+                "Deleted count=%s documents (count=%s nodes)",
+                len(doc_ids),
+                len(node_ids),
+            )
             # Save the index
             self._save_index()
 
+    def _delete_vectors(
+        self, doc_ids: list[str], ref_doc_metadata: dict[str, dict[str, Any]]
+    ) -> None:
+        vector_store = self.storage_context.vector_store
+        delete_ref_docs = getattr(vector_store, "delete_ref_docs", None)
+        if isinstance(vector_store, ShardedVectorStore):
+            vector_store.delete_ref_docs(doc_ids, ref_doc_metadata=ref_doc_metadata)
+        elif delete_ref_docs is not None:
+            delete_ref_docs(doc_ids)
+        else:
+            for doc_id in doc_ids:
+                vector_store.delete(doc_id)
+
+    def find_docs(
+        self,
+        org_id: Optional[str],
+        project_id: Optional[str],
+        user_id: Optional[str],
+        file_id: Optional[str] = None,
+        file_names: Optional[list[str]] = None,
+    ) -> list[str]:
+        return self._tenant_index.find(
+            org_id, project_id, user_id, file_id=file_id, file_names=file_names
+        )
+
 
 class SimpleIngestComponent(BaseIngestComponentWithIndex):
     def __init__(
@@ -117,34 +277,66 @@ class SimpleIngestComponent(BaseIngestComponentWithIndex):
     ) -> None:
         super().__init__(storage_context, embed_model, transformations, *args, **kwargs)
 
-    def ingest(self, file_name: str, file_data: Path, file_id: str, project_id: Optional[str], user_id: Optional[str]) -> list[Document]:
+    def ingest(
+        self,
+        file_name: str,
+        file_data: Path,
+        file_id: str,
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[Document]:
         logger.info("Ingesting file_name=%s", file_name)
-        documents = IngestionHelper.transform_file_into_documents(file_name, file_data, file_id, project_id, user_id)
+        documents = IngestionHelper.transform_file_into_documents(
+            file_name, file_data, file_id, project_id, user_id, org_id,
+            self.parse_options,
+        )
         logger.info(
             "Transformed file=%s into count=%s documents", file_name, len(documents)
         )
+        if progress is not None:
+            progress.add(pages_parsed=len(documents))
         logger.debug("Saving the documents in the index and doc store")
-        return self._save_docs(documents)
+        return self._save_docs(documents, progress)
 
-    def bulk_ingest(self, files: list[tuple[str, Path, str]], project_id: Optional[str], user_id: Optional[str]) -> list[Document]:
+    def bulk_ingest(
+        self,
+        files: list[tuple[str, Path, str]],
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[Document]:
         saved_documents = []
         for file_name, file_path, file_id in files:
-            documents = IngestionHelper.transform_file_into_documents(
-                file_name, file_path, file_id,
-                project_id, user_id
+            saved_documents.extend(
+                self.ingest(
+                    file_name, file_path, file_id, project_id, user_id, org_id, progress
+                )
             )
-            saved_documents.extend(self._save_docs(documents))
         return saved_documents
 
-    def _save_docs(self, documents: list[Document]) -> list[Document]:
+    def _save_docs(
+        self, documents: list[Document], progress: Optional[IngestProgress] = None
+    ) -> list[Document]:
         logger.debug("Transforming count=%s documents into nodes", len(documents))
         with self._index_thread_lock:
+            count_nodes = 0
             for document in documents:
                 self._index.insert(document, show_progress=True)
+                ref_doc_info = self._index.docstore.get_ref_doc_info(document.doc_id)
+                count_nodes += len(ref_doc_info.node_ids) if ref_doc_info else 0
+            self._tenant_index.add_documents(documents)
+            # `insert` embeds and stores at once, the nodes are only persisted below
+            if progress is not None:
+                progress.add(nodes_embedded=count_nodes)
             logger.debug("Persisting the index and nodes")
             # persist the index and nodes
             self._save_index()
             logger.debug("Persisted the index and nodes")
+            if progress is not None:
+                progress.add(nodes_persisted=count_nodes)
         return documents
 
 
@@ -176,20 +368,48 @@ class BatchIngestComponent(BaseIngestComponentWithIndex):
             processes=self.count_workers
         )
 
-    def ingest(self, file_name: str, file_data: Path, file_id: str) -> list[Document]:
+    def ingest(
+        self,
+        file_name: str,
+        file_data: Path,
+        file_id: str,
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[Document]:
         logger.info("Ingesting file_name=%s", file_name)
-        documents = IngestionHelper.transform_file_into_documents(file_name, file_data, file_id)
+        documents = IngestionHelper.transform_file_into_documents(
+            file_name, file_data, file_id, project_id, user_id, org_id,
+            self.parse_options,
+        )
         logger.info(
             "Transformed file=%s into count=%s documents", file_name, len(documents)
         )
+        if progress is not None:
+            progress.add(pages_parsed=len(documents))
         logger.debug("Saving the documents in the index and doc store")
-        return self._save_docs(documents)
+        return self._save_docs(documents, progress)
 
-    def bulk_ingest(self, files: list[tuple[str, Path]]) -> list[Document]:
+    def bulk_ingest(
+        self,
+        files: list[tuple[str, Path, str]],
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[Document]:
         documents = list(
             itertools.chain.from_iterable(
                 self._file_to_documents_work_pool.starmap(
-                    IngestionHelper.transform_file_into_documents, files
+                    IngestionHelper.transform_file_into_documents,
+                    [
+                        (
+                            file_name, file_path, file_id, project_id, user_id, org_id,
+                            self.parse_options,
+                        )
+                        for file_name, file_path, file_id in files
+                    ],
                 )
             )
         )
@@ -198,15 +418,21 @@ class BatchIngestComponent(BaseIngestComponentWithIndex):
             len(files),
             len(documents),
         )
-        return self._save_docs(documents)
+        if progress is not None:
+            progress.add(pages_parsed=len(documents))
+        return self._save_docs(documents, progress)
 
-    def _save_docs(self, documents: list[Document]) -> list[Document]:
+    def _save_docs(
+        self, documents: list[Document], progress: Optional[IngestProgress] = None
+    ) -> list[Document]:
         logger.debug("Transforming count=%s documents into nodes", len(documents))
         nodes = run_transformations(
             documents,  # type: ignore[arg-type]
             self.transformations,
             show_progress=self.show_progress,
         )
+        if progress is not None:
+            progress.add(nodes_embedded=len(nodes))
         # Locking the index to avoid concurrent writes
         with self._index_thread_lock:
             logger.info("Inserting count=%s nodes in the index", len(nodes))
@@ -215,10 +441,13 @@ class BatchIngestComponent(BaseIngestComponentWithIndex):
                 self._index.docstore.set_document_hash(
                     document.get_doc_id(), document.hash
                 )
+            self._tenant_index.add_documents(documents)
             logger.debug("Persisting the index and nodes")
             # persist the index and nodes
             self._save_index()
             logger.debug("Persisted the index and nodes")
+            if progress is not None:
+                progress.add(nodes_persisted=len(nodes))
         return documents
 
 
@@ -258,37 +487,77 @@ class ParallelizedIngestComponent(BaseIngestComponentWithIndex):
             processes=self.count_workers
         )
 
-    def ingest(self, file_name: str, file_data: Path, project_id: Optional[str], user_id: Optional[str]) -> list[Document]:
+    def ingest(
+        self,
+        file_name: str,
+        file_data: Path,
+        file_id: str,
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[Document]:
         logger.info("Ingesting file_name=%s", file_name)
         # Running in a single (1) process to release the current
         # thread, and take a dedicated CPU core for computation
         documents = self._file_to_documents_work_pool.apply(
-            IngestionHelper.transform_file_into_documents, (file_name, file_data, project_id, user_id)
+            IngestionHelper.transform_file_into_documents,
+            (
+                file_name, file_data, file_id, project_id, user_id, org_id,
+                self.parse_options,
+            ),
         )
         logger.info(
             "Transformed file=%s into count=%s documents", file_name, len(documents)
         )
+        if progress is not None:
+            progress.add(pages_parsed=len(documents))
         logger.debug("Saving the documents in the index and doc store")
-        return self._save_docs(documents)
+        return self._save_docs(documents, progress)
 
-    def bulk_ingest(self, files: list[tuple[str, Path]]) -> list[Document]:
+    def bulk_ingest(
+        self,
+        files: list[tuple[str, Path, str]],
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[Document]:
         # Lightweight threads, used for parallelize the
         # underlying IO calls made in the ingestion
 
         documents = list(
             itertools.chain.from_iterable(
-                self._ingest_work_pool.starmap(self.ingest, files)
+                self._ingest_work_pool.starmap(
+                    self.ingest,
+                    [
+                        (
+                            file_name,
+                            file_path,
+                            file_id,
+                            project_id,
+                            user_id,
+                            org_id,
+                            progress,
+                        )
+                        for file_name, file_path, file_id in files
+                    ],
+                )
             )
         )
         return documents
 
-    def _save_docs(self, documents: list[Document]) -> list[Document]:
+    def _save_docs(
+        self, documents: list[Document], progress: Optional[IngestProgress] = None
+    ) -> list[Document]:
         logger.debug("Transforming count=%s documents into nodes", len(documents))
         nodes = run_transformations(
             documents,  # type: ignore[arg-type]
             self.transformations,
             show_progress=self.show_progress,
         )
+        if progress is not None:
+            progress.add(nodes_embedded=len(nodes))
         # Locking the index to avoid concurrent writes
         with self._index_thread_lock:
             logger.info("Inserting count=%s nodes in the index", len(nodes))
@@ -297,10 +566,13 @@ class ParallelizedIngestComponent(BaseIngestComponentWithIndex):
                 self._index.docstore.set_document_hash(
                     document.get_doc_id(), document.hash
                 )
+            self._tenant_index.add_documents(documents)
             logger.debug("Persisting the index and nodes")
             # persist the index and nodes
             self._save_index()
             logger.debug("Persisted the index and nodes")
+            if progress is not None:
+                progress.add(nodes_persisted=len(nodes))
         return documents
 
     def __del__(self) -> None:
@@ -317,6 +589,16 @@ class ParallelizedIngestComponent(BaseIngestComponentWithIndex):
         self._file_to_documents_work_pool.terminate()
 
 
+class _PipelineFile(NamedTuple):
+    """A file going through the pipeline, and the future of its ingestion."""
+
+    file_name: str | None
+    documents: list[Document]
+    progress: IngestProgress | None
+    # Resolved once the nodes of the file are saved
+    future: Future[list[Document]]
+
+
 class PipelineIngestComponent(BaseIngestComponentWithIndex):
     """Pipeline ingestion - keeping the embedding worker pool as busy as possible.
 
@@ -329,12 +611,19 @@ class PipelineIngestComponent(BaseIngestComponentWithIndex):
     accumulated documents are flushed to the document store, index, and vector
     store.
 
+    Every file gets a future, resolved once its nodes are saved. The writer saves
+    the accumulated nodes of all the in-flight files (whatever the request they
+    come from) when they reach `NODE_FLUSH_COUNT`, when the oldest of them has
+    waited `NODE_FLUSH_INTERVAL` seconds, or when there is nothing else to wait
+    for. No request waits for the whole pipeline to drain.
+
     Exception handling ensures robustness against erroneous files. However, in the
     pipelined design, one error can lead to the discarding of multiple files. Any
-    discarded files will be reported.
+    discarded files will be reported, and their futures fail.
     """
 
     NODE_FLUSH_COUNT = 5000  # Save the index every # nodes.
+    NODE_FLUSH_INTERVAL = 2.0  # Or every # seconds.
 
     def __init__(
         self,
@@ -365,13 +654,17 @@ class PipelineIngestComponent(BaseIngestComponentWithIndex):
         self.doc_semaphore = multiprocessing.Semaphore(
             self.count_workers
         )  # limit the doc queue to # items.
-        self.doc_q: Queue[tuple[str, str | None, list[Document] | None]] = Queue(20)
+        self.doc_q: Queue[tuple[str, _PipelineFile | None]] = Queue(20)
         # node_q stores documents parsed into nodes (embeddings).
         # Larger queue size so we don't block the embedding workers during a slow
         # index update.
         self.node_q: Queue[
-            tuple[str, str | None, list[Document] | None, list[BaseNode] | None]
+            tuple[str, _PipelineFile | None, list[BaseNode] | None]
         ] = Queue(40)
+        # Files queued but not embedded yet: the writer does not wait for more
+        # nodes when there are none
+        self._embedding_count = 0
+        self._embedding_count_lock = threading.Lock()
         threading.Thread(target=self._doc_to_node, daemon=True).start()
         threading.Thread(target=self._write_nodes, daemon=True).start()
 
@@ -379,106 +672,176 @@ class PipelineIngestComponent(BaseIngestComponentWithIndex):
         # Parse documents into nodes
         with multiprocessing.pool.ThreadPool(processes=self.count_workers) as pool:
             while True:
-                try:
-                    cmd, file_name, documents = self.doc_q.get(
-                        block=True
-                    )  # Documents for a file
-                    if cmd == "process":
-                        # Push CPU/GPU embedding work to the worker pool
-                        # Acquire semaphore to control access to worker pool
-                        self.doc_semaphore.acquire()
-                        pool.apply_async(
-                            self._doc_to_node_worker, (file_name, documents)
-                        )
-                    elif cmd == "quit":
-                        break
-                finally:
-                    if cmd != "process":
-                        self.doc_q.task_done()  # unblock Q joins
-
-    def _doc_to_node_worker(self, file_name: str, documents: list[Document]) -> None:
+                cmd, pipeline_file = self.doc_q.get(block=True)  # Documents for a file
+                if cmd == "process":
+                    # Push CPU/GPU embedding work to the worker pool
+                    # Acquire semaphore to control access to worker pool
+                    self.doc_semaphore.acquire()
+                    pool.apply_async(self._doc_to_node_worker, (pipeline_file,))
+                elif cmd == "quit":
+                    break
+
+    def _doc_to_node_worker(self, pipeline_file: _PipelineFile) -> None:
         # CPU/GPU intensive work in its own process
         try:
             nodes = run_transformations(
-                documents,  # type: ignore[arg-type]
+                pipeline_file.documents,  # type: ignore[arg-type]
                 self.transformations,
                 show_progress=self.show_progress,
             )
-            self.node_q.put(("process", file_name, documents, nodes))
+        except Exception as e:
+            logger.exception(f"Embedding file {pipeline_file.file_name}")
+            pipeline_file.future.set_exception(e)
+            nodes = None
         finally:
             self.doc_semaphore.release()
-            self.doc_q.task_done()  # unblock Q joins
+            # Before handing the nodes over, for the writer to see it is idle
+            with self._embedding_count_lock:
+                self._embedding_count -= 1
+        if nodes is not None:
+            if pipeline_file.progress is not None:
+                pipeline_file.progress.add(nodes_embedded=len(nodes))
+            self.node_q.put(("process", pipeline_file, nodes))
 
     def _save_docs(
-        self, files: list[str], documents: list[Document], nodes: list[BaseNode]
+        self, pipeline_files: list[tuple[_PipelineFile, int]], nodes: list[BaseNode]
     ) -> None:
+        documents = [
+            document
+            for pipeline_file, _ in pipeline_files
+            for document in pipeline_file.documents
+        ]
         try:
             logger.info(
-                f"Saving {len(files)} files ({len(documents)} documents / {len(nodes)} nodes)"
+                f"Saving {len(pipeline_files)} files ({len(documents)} documents / {len(nodes)} nodes)"
             )
-            self._index.insert_nodes(nodes)
-            for document in documents:
-                self._index.docstore.set_document_hash(
-                    document.get_doc_id(), document.hash
-                )
-            self._save_index()
-        except Exception:
+            with self._index_thread_lock:
+                self._index.insert_nodes(nodes)
+                for document in documents:
+                    self._index.docstore.set_document_hash(
+                        document.get_doc_id(), document.hash
+                    )
+                self._tenant_index.add_documents(documents)
+                self._save_index()
+        except Exception as e:
             # Tell the user so they can investigate these files
-            logger.exception(f"Processing files {files}")
+            logger.exception(
+                f"Processing files {[f.file_name for f, _ in pipeline_files]}"
+            )
+            for pipeline_file, _ in pipeline_files:
+                pipeline_file.future.set_exception(e)
+        else:
+            for pipeline_file, count_nodes in pipeline_files:
+                if pipeline_file.progress is not None:
+                    pipeline_file.progress.add(nodes_persisted=count_nodes)
+                pipeline_file.future.set_result(pipeline_file.documents)
         finally:
             # Clearing work, even on exception, maintains a clean state.
             nodes.clear()
-            documents.clear()
-            files.clear()
+            pipeline_files.clear()
 
     def _write_nodes(self) -> None:
         # Save nodes to index.  I/O intensive.
         node_stack: list[BaseNode] = []
-        doc_stack: list[Document] = []
-        file_stack: list[str] = []
+        file_stack: list[tuple[_PipelineFile, int]] = []
+        # When the oldest unsaved nodes must be saved at the latest
+        flush_deadline: float | None = None
         while True:
+            timeout = (
+                max(0.0, flush_deadline - time.monotonic())
+                if flush_deadline is not None
+                else None
+            )
             try:
-                cmd, file_name, documents, nodes = self.node_q.get(block=True)
-                if cmd in ("flush", "quit"):
-                    if file_stack:
-                        self._save_docs(file_stack, doc_stack, node_stack)
-                    if cmd == "quit":
-                        break
-                elif cmd == "process":
-                    node_stack.extend(nodes)  # type: ignore[arg-type]
-                    doc_stack.extend(documents)  # type: ignore[arg-type]
-                    file_stack.append(file_name)  # type: ignore[arg-type]
-                    # Constant saving is heavy on I/O - accumulate to a threshold
-                    if len(node_stack) >= self.NODE_FLUSH_COUNT:
-                        self._save_docs(file_stack, doc_stack, node_stack)
-            finally:
-                self.node_q.task_done()
-
-    def _flush(self) -> None:
-        self.doc_q.put(("flush", None, None))
-        self.doc_q.join()
-        self.node_q.put(("flush", None, None, None))
-        self.node_q.join()
-
-    def ingest(self, file_name: str, file_data: Path, file_id: str, project_id: Optional[str], user_id: Optional[str], org_id: Optional[str]) -> list[Document]:
-        documents = IngestionHelper.transform_file_into_documents(file_name, file_data, file_id, project_id, user_id, org_id)
-        self.doc_q.put(("process", file_name, documents))
-        self._flush()
-        return documents
+                cmd, pipeline_file, nodes = self.node_q.get(block=True, timeout=timeout)
+            except Empty:
+                cmd, pipeline_file, nodes = "flush", None, None
+
+            if cmd == "process":
+                node_stack.extend(nodes)  # type: ignore[arg-type]
+                file_stack.append((pipeline_file, len(nodes)))  # type: ignore[arg-type]
+                if flush_deadline is None:
+                    flush_deadline = time.monotonic() + self.NODE_FLUSH_INTERVAL
+                # Constant saving is heavy on I/O - accumulate to a threshold,
+                # unless nothing else is coming
+                with self._embedding_count_lock:
+                    idle = self._embedding_count == 0 and self.node_q.empty()
+                if len(node_stack) < self.NODE_FLUSH_COUNT and not idle:
+                    continue
+
+            if file_stack:
+                self._save_docs(file_stack, node_stack)
+            flush_deadline = None
+            if cmd == "quit":
+                break
+
+    def _submit(
+        self,
+        file_name: str | None,
+        documents: list[Document],
+        progress: Optional[IngestProgress],
+    ) -> Future[list[Document]]:
+        """Queue the documents of a file, to be embedded and saved."""
+        pipeline_file = _PipelineFile(file_name, documents, progress, Future())
+        if not documents:
+            pipeline_file.future.set_result(documents)
+            return pipeline_file.future
+        if progress is not None:
+            progress.add(pages_parsed=len(documents))
+        with self._embedding_count_lock:
+            self._embedding_count += 1
+        self.doc_q.put(("process", pipeline_file))
+        return pipeline_file.future
+
+    def ingest(
+        self,
+        file_name: str,
+        file_data: Path,
+        file_id: str,
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[Document]:
+        documents = IngestionHelper.transform_file_into_documents(
+            file_name, file_data, file_id, project_id, user_id, org_id,
+            self.parse_options,
+        )
+        return self._submit(file_name, documents, progress).result()
 
-    def bulk_ingest(self, files: list[tuple[str, Path, str]], project_id: Optional[str], user_id: Optional[str], org_id: Optional[str]) -> list[Document]:
-        docs = []
+    def ingest_documents(
+        self,
+        documents: list[Document],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[Document]:
+        file_name = documents[0].metadata.get("file_name") if documents else None
+        return self._submit(file_name, documents, progress).result()
+
+    def bulk_ingest(
+        self,
+        files: list[tuple[str, Path, str]],
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[Document]:
+        futures: list[tuple[str, Future[list[Document]]]] = []
         for file_name, file_path, file_id in eta(files):
             try:
                 documents = IngestionHelper.transform_file_into_documents(
                     file_name, file_path, file_id,
-                    project_id, user_id, org_id
+                    project_id, user_id, org_id, self.parse_options
                 )
-                self.doc_q.put(("process", file_name, documents))
-                docs.extend(documents)
+                futures.append((file_name, self._submit(file_name, documents, progress)))
             except Exception:
                 logger.exception(f"Skipping {file_path.name}")
-        self._flush()
+        docs = []
+        for file_name, future in futures:
+            try:
+                docs.extend(future.result())
+            except Exception:
+                # Already reported by the pipeline
+                logger.warning(f"Discarded {file_name}")
         return docs
 
 
@@ -490,12 +853,18 @@ def get_ingestion_component(
 ) -> BaseIngestComponent:
     """Get the ingestion component for the given configuration."""
     ingest_mode = settings.embedding.ingest_mode
+    parse_options = PDFParseOptions(
+        pages_per_shard=settings.embedding.pdf_pages_per_shard,
+        workers=settings.embedding.count_workers,
+        ocr=settings.ocr,
+    )
     if ingest_mode == "batch":
         return BatchIngestComponent(
             storage_context=storage_context,
             embed_model=embed_model,
             transformations=transformations,
             count_workers=settings.embedding.count_workers,
+            parse_options=parse_options,
         )
     elif ingest_mode == "parallel":
         return ParallelizedIngestComponent(
@@ -503,6 +872,7 @@ def get_ingestion_component(
             embed_model=embed_model,
             transformations=transformations,
             count_workers=settings.embedding.count_workers,
+            parse_options=parse_options,
         )
     elif ingest_mode == "pipeline":
         return PipelineIngestComponent(
@@ -510,10 +880,12 @@ def get_ingestion_component(
             embed_model=embed_model,
             transformations=transformations,
             count_workers=settings.embedding.count_workers,
+            parse_options=parse_options,
         )
     else:
         return SimpleIngestComponent(
             storage_context=storage_context,
             embed_model=embed_model,
             transformations=transformations,
+            parse_options=parse_options,
         )
@@ -1,14 +1,22 @@
 import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Optional
+from typing import NamedTuple, Optional
 import fitz
 import uuid
-from google.cloud import vision
 
 from llama_index.core.readers import StringIterableReader
 from llama_index.core.readers.base import BaseReader
 from llama_index.core.readers.json import JSONReader
 from llama_index.core.schema import Document
+
+from sonar_labs.components.ocr.ocr_engine import BaseOCREngine, get_ocr_engine
+from sonar_labs.paths import local_data_path
+from sonar_labs.settings.settings import OCRSettings
+
 logger = logging.getLogger(__name__)
 
 
@@ -64,6 +72,33 @@ FILE_READER_CLS.update(
 )
 
 
+# Part of the content fingerprint of ingested files: bump it whenever the
+# documents produced for a given file change, so unchanged uploads get re-parsed.
+PARSER_VERSION = "2"
+
+
+class PageAnalysis(NamedTuple):
+    title: str | None
+    text_coverage: float
+    text: str
+
+
+class PDFParseOptions(NamedTuple):
+    """How the PDFs are parsed, set from the settings by the ingest component.
+
+    PDFs bigger than `pages_per_shard` pages are split in page ranges, parsed
+    in parallel by `workers` processes. Scanned pages are OCRed by the engine
+    configured by `ocr`.
+    """
+
+    pages_per_shard: int = 25
+    workers: int = 1
+    ocr: OCRSettings = OCRSettings()
+
+
+_DEFAULT_PARSE_OPTIONS = PDFParseOptions()
+
+
 class IngestionHelper:
     """Helper class to transform a file into a list of documents.
 
@@ -74,9 +109,27 @@ class IngestionHelper:
     @staticmethod
     def transform_file_into_documents(
         file_name: str, file_path: Path, file_id: str, 
+        project_id: Optional[str], user_id: Optional[str], org_id: Optional[str],
+        parse_options: PDFParseOptions = _DEFAULT_PARSE_OPTIONS,
+    ) -> list[Document]:
+        documents = IngestionHelper._load_file_to_documents(
+            file_name, file_path, parse_options
+        )
+        for document in documents:
+            document.metadata["file_name"] = file_name
+            document.metadata["file_id"] = file_id
+            document.metadata["project_id"] = project_id
+            document.metadata["user_id"] = user_id
+            document.metadata["org_id"] = org_id
+        IngestionHelper._exclude_metadata(documents)
+        return documents
+
+    @staticmethod
+    def transform_text_into_documents(
+        file_name: str, text: str, file_id: Optional[str],
         project_id: Optional[str], user_id: Optional[str], org_id: Optional[str]
     ) -> list[Document]:
-        documents = IngestionHelper._load_file_to_documents(file_name, file_path)
+        documents = [Document(text=text)]
         for document in documents:
             document.metadata["file_name"] = file_name
             document.metadata["file_id"] = file_id
@@ -87,7 +140,9 @@ class IngestionHelper:
         return documents
 
     @staticmethod
-    def _load_file_to_documents(file_name: str, file_path: Path) -> list[Document]:
+    def _load_file_to_documents(
+        file_name: str, file_path: Path, parse_options: PDFParseOptions
+    ) -> list[Document]:
         logger.debug("Transforming file_name=%s into documents", file_name)
         extension = Path(file_name).suffix
         reader_cls = FILE_READER_CLS.get(extension)
@@ -103,7 +158,7 @@ class IngestionHelper:
 
         logger.debug("Specific reader found for extension=%s", extension)
         # return reader_cls().load_data(file_path)
-        return IngestionHelper._sonar_parser(file_path)
+        return IngestionHelper._sonar_parser(file_path, parse_options)
 
     @staticmethod
     def _exclude_metadata(documents: list[Document]) -> None:
@@ -116,111 +171,187 @@ class IngestionHelper:
             document.excluded_llm_metadata_keys = ["doc_id", "file_id", "org_id"]
             
     @staticmethod
-    def _get_text_percentage(page) -> float:
-        """
-        Calculate the percentage of the page that is covered by (searchable) text.
-        """
-        total_page_area = abs(page.rect)
-        total_text_area = 0.0
-        
-        for b in page.get_text_blocks():
-            r = fitz.Rect(b[:4])  # rectangle where block text appears
-            total_text_area += abs(r)
-            
-        return total_text_area / total_page_area
-    
-    
-    
+    def _render_page(page) -> bytes:
+        """Render the given PDF page as a PNG image, to be OCRed."""
+        return page.get_pixmap().tobytes(output="png")
+
     @staticmethod
-    def _perform_ocr_with_google(page) -> str:
-        """
-        Perform OCR on the given PDF page using Google Cloud Vision API.
+    def _analyze_page(page) -> PageAnalysis:
+        """Extract the title, text coverage and text of a PDF page in a single pass.
+
+        The text coverage is the ratio of the page area covered by (searchable)
+        text blocks. The title is the first line of the page, if it is text.
         """
-        client = vision.ImageAnnotatorClient()
-        
-        pix = page.get_pixmap()
-        # logger.info(f'Image size: width={pix.width}, height={pix.height}')
-        img_bytes = pix.tobytes(output="png")
-        # file_size_kb = len(img_bytes) / 1024
-        # logger.info(f'File size: {file_size_kb:.2f} KB')
-        image = vision.Image(content=img_bytes)
-
-        response = client.text_detection(image=image)
-        texts = response.text_annotations
-
-        text = ""
-        if texts:
-            text = texts[0].description  # Full text
-        if response.error.message:
-            raise Exception(f'{response.error.message}')
-        
-        return text
+        # Images are not needed, don't let fitz extract their content
+        blocks = page.get_text(
+            "dict", flags=fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+        )["blocks"]
+        title = None
+        text_area = 0.0
+        lines = []
+        for block in blocks:
+            if block["type"] != 0:  # not a text block
+                continue
+            x0, y0, x1, y1 = block["bbox"]
+            text_area += abs((x1 - x0) * (y1 - y0))
+            for line in block["lines"]:
+                line_text = "".join(span["text"] for span in line["spans"])
+                if title is None and line_text.strip():
+                    title = line_text.strip()
+                lines.append(line_text)
+        page_area = abs(page.rect)
+        text_coverage = text_area / page_area if page_area else 0.0
+        # Same layout as `page.get_text()`: one line of text per line
+        text = "".join(line + "\n" for line in lines)
+        return PageAnalysis(title, text_coverage, text)
 
     @staticmethod
-    def _get_page_title(page) -> str:
-        """
-        Extract the title from the given PDF page using heuristics.
+    def _page_document(page_num: int, text: str) -> Document:
+        return Document(
+            id_=str(uuid.uuid4()),
+            embedding=None,
+            metadata={"page_label": page_num + 1},
+            excluded_embed_metadata_keys=[],
+            excluded_llm_metadata_keys=[],
+            relationships={},
+            text=text,
+            start_char_idx=None,
+            end_char_idx=None,
+            text_template='{metadata_str}\n\n{content}',
+            metadata_template='{key}: {value}',
+            metadata_seperator='\n',
+            class_name="Document"
+        )
+
+    @staticmethod
+    def _parse_page_range(
+        file_path: Path, start: int, stop: int, ocr_settings: OCRSettings
+    ) -> list[tuple[int, str]]:
+        """Parse the pages [start, stop) of a PDF into (page_num, text).
+
+        Runs in the page parsing processes: each opens the file on its own. The
+        scanned pages of the range are OCRed together, once all are rendered.
         """
-        text_blocks = page.get_text("dict")["blocks"]
-        if not text_blocks:
-            return None
-
-        # Simple heuristic: assume the first text block is the title
-        first_block = text_blocks[0]
-        if first_block["type"] == 0:  # text block
-            title = first_block["lines"][0]["spans"][0]["text"]
-            return title.strip()
-        
-        return None
-    
+        pages: dict[int, str] = {}
+        scanned_pages: dict[int, bytes] = {}
+        debug = logger.isEnabledFor(logging.DEBUG)
+        with fitz.open(file_path) as doc:
+            for page_num in range(start, stop):
+                page = doc[page_num]
+                analysis = IngestionHelper._analyze_page(page)
+                if debug:
+                    logger.debug(
+                        "Page %s title=%r text coverage=%.2f%%",
+                        page_num + 1,
+                        analysis.title,
+                        analysis.text_coverage * 100,
+                    )
+                if analysis.text_coverage < ocr_settings.min_text_coverage:
+                    scanned_pages[page_num] = IngestionHelper._render_page(page)
+                else:
+                    pages[page_num] = analysis.text
+        if scanned_pages:
+            if debug:
+                logger.debug(
+                    "OCRing count=%s scanned pages of %s", len(scanned_pages), file_path
+                )
+            ocr_texts = _get_ocr_engine(ocr_settings).recognize(
+                list(scanned_pages.values())
+            )
+            pages.update(zip(scanned_pages.keys(), ocr_texts, strict=True))
+        return sorted(pages.items())
+
     @staticmethod
-    def _sonar_parser(file_path: Path) -> list[Document]:
-        doc = fitz.open(file_path)
-        parsed_documents = []
-        
-        for page_num, page in enumerate(doc):
-            title = IngestionHelper._get_page_title(page)
-            if title is None:
-                title = f"Document {page_num + 1}"
-            
-            text_perc = IngestionHelper._get_text_percentage(page)
-            print(f"Page {page_num + 1} Text percentage: {text_perc:.2%}")
-            if text_perc < 30.00:
-                print(f"Page {page_num + 1} is a fully scanned page - performing OCR using Google Vision")
-                ocr_text = IngestionHelper._perform_ocr_with_google(page)
-                parsed_documents.append(Document(
-                id_=str(uuid.uuid4()),
-                embedding=None,
-                metadata={"page_label": page_num + 1},
-                excluded_embed_metadata_keys=[],
-                excluded_llm_metadata_keys=[],
-                relationships={},
-                text=ocr_text,
-                start_char_idx=None,
-                end_char_idx=None,
-                text_template='{metadata_str}\n\n{content}',
-                metadata_template='{key}: {value}',
-                metadata_seperator='\n',
-                class_name="Document"
-            ))
-                print(f"OCR Text for Page {page_num + 1}:\n{ocr_text}")
-            else:
-                page_text = page.get_text()
-                parsed_documents.append(Document(
-                id_=str(uuid.uuid4()),
-                embedding=None,
-                metadata={"page_label": page_num + 1},
-                excluded_embed_metadata_keys=[],
-                excluded_llm_metadata_keys=[],
-                relationships={},
-                text=page_text,
-                start_char_idx=None,
-                end_char_idx=None,
-                text_template='{metadata_str}\n\n{content}',
-                metadata_template='{key}: {value}',
-                metadata_seperator='\n',
-                class_name="Document"
-            ))
-                print(f"Text for Page {page_num + 1}:\n{page_text}")
-        doc.close()             
-        return parsed_documents
+    def _sonar_parser(
+        file_path: Path, parse_options: PDFParseOptions
+    ) -> list[Document]:
+        with fitz.open(file_path) as doc:
+            page_count = doc.page_count
+
+        ocr_settings = parse_options.ocr
+        shards = _page_shards(page_count, parse_options.pages_per_shard)
+        pool = _get_page_pool(parse_options.workers) if len(shards) > 1 else None
+        pages: list[tuple[int, str]] = []
+        if pool is None:
+            for start, stop in shards:
+                pages.extend(
+                    IngestionHelper._parse_page_range(file_path, start, stop, ocr_settings)
+                )
+        else:
+            logger.debug(
+                "Parsing count=%s pages of %s in count=%s shards",
+                page_count, file_path, len(shards),
+            )
+            futures = [
+                pool.submit(
+                    IngestionHelper._parse_page_range, file_path, start, stop, ocr_settings
+                )
+                for start, stop in shards
+            ]
+            try:
+                # The shards are in page order, and so are their pages
+                for future in futures:
+                    pages.extend(future.result())
+            except BrokenProcessPool:
+                logger.warning("Page parsing pool broken, parsing %s sequentially", file_path)
+                _reset_page_pool(pool)
+                pages = IngestionHelper._parse_page_range(
+                    file_path, 0, page_count, ocr_settings
+                )
+        return [IngestionHelper._page_document(page_num, text) for page_num, text in pages]
+
+
+def _page_shards(page_count: int, pages_per_shard: int) -> list[tuple[int, int]]:
+    """Split the pages of a document in [start, stop) ranges of `pages_per_shard`."""
+    pages_per_shard = max(1, pages_per_shard)
+    return [
+        (start, min(start + pages_per_shard, page_count))
+        for start in range(0, page_count, pages_per_shard)
+    ]
+
+
+# Pools of page parsing processes, by count of workers
+_page_pools: dict[int, ProcessPoolExecutor] = {}
+_page_pool_lock = threading.Lock()
+
+
+def _get_page_pool(workers: int) -> ProcessPoolExecutor | None:
+    """Pool of processes parsing the shards of big PDFs, None to parse in-process.
+
+    Daemonic processes (e.g. the workers of the `batch` and `parallel` ingest modes,
+    that already parse files in parallel) are not allowed to have children.
+    """
+    if workers <= 1 or multiprocessing.current_process().daemon:
+        return None
+    with _page_pool_lock:
+        if workers not in _page_pools:
+            # Spawned, not forked: the server process is multithreaded
+            _page_pools[workers] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _page_pools[workers]
+
+
+def _reset_page_pool(pool: ProcessPoolExecutor) -> None:
+    with _page_pool_lock:
+        for workers, page_pool in list(_page_pools.items()):
+            if page_pool is pool:
+                del _page_pools[workers]
+    pool.shutdown(wait=False)
+
+
+# OCR engines of the current process, by configuration: the page parsing
+# processes get the configuration with each page range, not the engine
+_ocr_engines: dict[str, BaseOCREngine] = {}
+_ocr_engines_lock = threading.Lock()
+
+
+def _get_ocr_engine(ocr_settings: OCRSettings) -> BaseOCREngine:
+    key = ocr_settings.model_dump_json()
+    with _ocr_engines_lock:
+        if key not in _ocr_engines:
+            _ocr_engines[key] = get_ocr_engine(
+                ocr_settings, local_data_path / "ocr_cache.sqlite"
+            )
+        return _ocr_engines[key]
@@ -0,0 +1,28 @@
+import threading
+from collections.abc import Callable
+
+
+class IngestProgress:
+    """Progress counters of an ingestion, updated by the ingest components.
+
+    The components may update it from several threads. `on_change` is called
+    after every update, e.g. to notify the clients following an ingestion job.
+    """
+
+    def __init__(self, on_change: Callable[[], None] | None = None) -> None:
+        self._lock = threading.Lock()
+        self._on_change = on_change
+        # Documents produced by the parser, a PDF makes one Document per page
+        self.pages_parsed = 0
+        self.nodes_embedded = 0
+        self.nodes_persisted = 0
+
+    def add(
+        self, pages_parsed: int = 0, nodes_embedded: int = 0, nodes_persisted: int = 0
+    ) -> None:
+        with self._lock:
+            self.pages_parsed += pages_parsed
+            self.nodes_embedded += nodes_embedded
+            self.nodes_persisted += nodes_persisted
+        if self._on_change is not None:
+            self._on_change()
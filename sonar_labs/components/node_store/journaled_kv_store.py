@@ -0,0 +1,398 @@
+import json
+import logging
+import os
+import sys
+import threading
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from fsspec.implementations.local import LocalFileSystem  # type: ignore
+from llama_index.core.constants import DATA_KEY
+from llama_index.core.storage.kvstore.simple_kvstore import DATA_TYPE, SimpleKVStore
+from llama_index.core.storage.kvstore.types import DEFAULT_COLLECTION
+
+if sys.platform != "win32":
+    import fcntl
+
+logger = logging.getLogger(__name__)
+
+# Below this size, the journal is never compacted: rewriting a small snapshot
+# is cheap, but doing it on every persist would defeat the purpose.
+MIN_COMPACTION_BYTES = 16 * 1024 * 1024
+
+JOURNAL_SUFFIX = ".journal"
+LOCK_SUFFIX = ".lock"
+
+
+@contextmanager
+def _file_lock(persist_path: str) -> Iterator[None]:
+    """Lock the files of `persist_path` against the other processes (not on Windows)."""
+    Path(persist_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(persist_path + LOCK_SUFFIX, "a") as lock_file:
+        if sys.platform != "win32":
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform != "win32":
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_generation(persist_path: str) -> str | None:
+    """The generation of the snapshot, in the header line of its journal."""
+    try:
+        with open(persist_path + JOURNAL_SUFFIX, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return header.get("g") if isinstance(header, dict) and "c" not in header else None
+
+
+def _check_local(fs: Any | None) -> None:
+    if fs is not None and not isinstance(fs, LocalFileSystem):
+        raise NotImplementedError(
+            f"{JournaledKVStore.__name__} is only persisted to the local filesystem"
+        )
+
+
+def _struct_fields(val: dict[str, Any]) -> dict[str, Any] | None:
+    """The fields of an index struct value (see `index_struct_to_json`), if it is."""
+    data = val.get(DATA_KEY)
+    if not isinstance(data, str):
+        return None
+    fields = json.loads(data)
+    return fields if isinstance(fields, dict) else None
+
+
+def _all_struct_fields(data: DATA_TYPE) -> dict[tuple[str, str], dict[str, Any]]:
+    """The fields of the index structs of `data`, by (collection, key)."""
+    all_fields = {}
+    for collection, values in data.items():
+        for key, val in values.items():
+            fields = _struct_fields(val)
+            if fields is not None:
+                all_fields[(collection, key)] = fields
+    return all_fields
+
+
+def _diff_fields(old: dict[str, Any], new: dict[str, Any]) -> dict[str, Any]:
+    """The patch turning the fields `old` into `new`, see `_patch_fields`.
+
+    The dict fields (e.g. the `nodes_dict` of the node ids of an index) are
+    patched key by key, the others are replaced.
+    """
+    replaced: dict[str, Any] = {}
+    updated: dict[str, dict[str, Any]] = {}
+    deleted: dict[str, list[str]] = {}
+    for field, value in new.items():
+        previous = old.get(field)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            changes = {
+                k: v for k, v in value.items() if k not in previous or previous[k] != v
+            }
+            removed = [k for k in previous if k not in value]
+            if changes:
+                updated[field] = changes
+            if removed:
+                deleted[field] = removed
+        elif field not in old or previous != value:
+            replaced[field] = value
+    return {
+        "set": replaced,
+        "upd": updated,
+        "del": deleted,
+        "unset": [field for field in old if field not in new],
+    }
+
+
+def _patch_fields(fields: dict[str, Any], patch: dict[str, Any]) -> None:
+    for field in patch["unset"]:
+        fields.pop(field, None)
+    fields.update(patch["set"])
+    for field, changes in patch["upd"].items():
+        fields.setdefault(field, {}).update(changes)
+    for field, removed in patch["del"].items():
+        for key in removed:
+            fields[field].pop(key, None)
+
+
+def _replay(persist_path: str) -> tuple[DATA_TYPE, str | None]:
+    """The data of the snapshot at `persist_path` with its journal, and its generation.
+
+    The patches are only applied on top of the values of the same generation: the
+    patches of a process that did not see the last snapshot, or whose value is
+    missing, are skipped as corrupted.
+    """
+    with open(persist_path, encoding="utf-8") as f:
+        data: DATA_TYPE = json.load(f)
+    generation: str | None = None
+    journal_path = persist_path + JOURNAL_SUFFIX
+    if not os.path.exists(journal_path):
+        return data, generation
+
+    replayed = skipped = 0
+    # Fields of the patched index structs, serialized once at the end
+    patched: dict[tuple[str, str], dict[str, Any]] = {}
+    with open(journal_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Only the last line can be partially written (crash)
+                logger.warning("Skipping corrupted journal entry")
+                continue
+            if "c" not in entry:
+                # Header line
+                generation = entry.get("g")
+                continue
+            collection_data = data.setdefault(entry["c"], {})
+            struct_key = (entry["c"], entry["k"])
+            if "p" in entry:
+                fields = patched.get(struct_key)
+                if fields is None and entry["k"] in collection_data:
+                    fields = _struct_fields(collection_data[entry["k"]])
+                if fields is None or entry.get("g") != generation:
+                    skipped += 1
+                    continue
+                _patch_fields(fields, entry["p"])
+                patched[struct_key] = fields
+                collection_data[entry["k"]] = entry["r"]
+            else:
+                patched.pop(struct_key, None)
+                if entry.get("d"):
+                    collection_data.pop(entry["k"], None)
+                else:
+                    collection_data[entry["k"]] = entry["v"]
+            replayed += 1
+    for (collection, key), fields in patched.items():
+        data[collection][key] = {
+            **data[collection][key],
+            DATA_KEY: json.dumps(fields),
+        }
+    if skipped:
+        logger.warning(
+            "Skipped count=%s journal patches of %s without their value",
+            skipped,
+            persist_path,
+        )
+    logger.debug("Replayed count=%s journal entries", replayed)
+    return data, generation
+
+
+class JournaledKVStore(SimpleKVStore):
+    """Simple (in-memory) key-value store, persisted as a snapshot plus a journal.
+
+    `SimpleKVStore.persist` rewrites the whole store in a single JSON file. This
+    store instead appends the keys changed since the last persist to an
+    append-only journal, next to the snapshot, so the cost of a persist scales
+    with the change and not with the size of the store.
+
+    The index structs of an index store are a single key, holding the ids of all
+    the nodes of the index: once journaled, they are journaled as patches of
+    their fields (the node ids added and removed) instead of in full.
+
+    When the journal grows bigger than `compaction_ratio` times the snapshot,
+    a background thread folds it into a new snapshot. Loading the store reads the
+    snapshot and replays the journal on top of it.
+
+    Several processes (API workers) can persist to the same files, under a file
+    lock. Every snapshot written from memory starts a new generation, written in
+    the header of the journal: the patches are tagged with the generation they
+    were computed against, and the processes that did not write it journal their
+    values in full again.
+
+    The snapshot has the very same format as the `SimpleKVStore` file. Only the
+    local filesystem is supported.
+    """
+
+    def __init__(
+        self, data: DATA_TYPE | None = None, compaction_ratio: float = 1.0
+    ) -> None:
+        super().__init__(data)
+        self.compaction_ratio = compaction_ratio
+        self._lock = threading.RLock()
+        # Changes not persisted yet, coalesced by key. `None` marks a deletion.
+        self._pending: dict[tuple[str, str], dict[str, Any] | None] = {}
+        self._persist_path: str | None = None
+        # Generation of the snapshot the journaled patches are relative to
+        self._generation: str | None = None
+        # Fields of the index structs, as last journaled, to journal patches
+        self._journaled_fields: dict[tuple[str, str], dict[str, Any]] = {}
+        self._snapshot_size = 0
+        self._journal_size = 0
+        self._compaction_thread: threading.Thread | None = None
+
+    def put(
+        self, key: str, val: dict[str, Any], collection: str = DEFAULT_COLLECTION
+    ) -> None:
+        with self._lock:
+            super().put(key, val, collection)
+            self._pending[(collection, key)] = self._data[collection][key]
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        with self._lock:
+            deleted = super().delete(key, collection)
+            if deleted:
+                self._pending[(collection, key)] = None
+            return deleted
+
+    def persist(self, persist_path: str, fs: Any | None = None) -> None:
+        """Append the pending changes to the journal of `persist_path`.
+
+        A full snapshot is written instead if `persist_path` is not the snapshot
+        this store was loaded from (or last persisted to), unless another process
+        created it since this store was: the changes are appended to it then.
+
+        :raises NotImplementedError: if `fs` is not the local filesystem
+        """
+        _check_local(fs)
+        persist_path = str(persist_path)
+        with self._lock, _file_lock(persist_path):
+            if self._persist_path is None and os.path.exists(persist_path):
+                # All the changes of this store are pending, and journaled in full
+                self._persist_path = persist_path
+                self._generation = _read_generation(persist_path)
+            if persist_path != self._persist_path or not os.path.exists(persist_path):
+                data = self._copy_data()
+                self._generation = uuid.uuid4().hex
+                self._write_snapshot(persist_path, data)
+                self._write_journal(persist_path, self._generation, b"")
+                self._persist_path = persist_path
+                self._pending.clear()
+                self._journaled_fields = _all_struct_fields(data)
+                return
+
+            self._append_pending(persist_path)
+            if self._needs_compaction():
+                self._compaction_thread = threading.Thread(
+                    target=self._compact, args=(persist_path,), daemon=True
+                )
+                self._compaction_thread.start()
+
+    def _append_pending(self, persist_path: str) -> None:
+        if not self._pending:
+            return
+        generation = _read_generation(persist_path)
+        if generation != self._generation:
+            # Another process wrote a snapshot: the values the patches would be
+            # relative to may be gone
+            self._generation = generation
+            self._journaled_fields.clear()
+        lines = [
+            json.dumps(self._journal_entry(collection, key, val)) + "\n"
+            for (collection, key), val in self._pending.items()
+        ]
+        with open(persist_path + JOURNAL_SUFFIX, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+        self._journal_size = os.path.getsize(persist_path + JOURNAL_SUFFIX)
+        self._pending.clear()
+
+    def _journal_entry(
+        self, collection: str, key: str, val: dict[str, Any] | None
+    ) -> dict[str, Any]:
+        if val is None:
+            self._journaled_fields.pop((collection, key), None)
+            return {"c": collection, "k": key, "d": True}
+        fields = _struct_fields(val)
+        if fields is None:
+            self._journaled_fields.pop((collection, key), None)
+            return {"c": collection, "k": key, "v": val}
+        previous = self._journaled_fields.get((collection, key))
+        self._journaled_fields[(collection, key)] = fields
+        if previous is None:
+            return {"c": collection, "k": key, "v": val}
+        # The other keys of the value (its type) are small
+        rest = {k: v for k, v in val.items() if k != DATA_KEY}
+        return {
+            "c": collection,
+            "k": key,
+            "g": self._generation,
+            "p": _diff_fields(previous, fields),
+            "r": rest,
+        }
+
+    def _needs_compaction(self) -> bool:
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return False
+        threshold = max(
+            MIN_COMPACTION_BYTES, self.compaction_ratio * self._snapshot_size
+        )
+        return self._journal_size > threshold
+
+    def _copy_data(self) -> DATA_TYPE:
+        # Values are replaced on write, never mutated: copying the collections
+        # is enough to get a consistent view of the store
+        return {collection: dict(data) for collection, data in self._data.items()}
+
+    def _compact(self, persist_path: str) -> None:
+        """Fold the journal into the snapshot, as written by all the processes.
+
+        The generation is kept: the values the patches are relative to are in
+        the new snapshot.
+        """
+        try:
+            with _file_lock(persist_path):
+                logger.info(
+                    "Compacting journal of %s (%s bytes)",
+                    persist_path,
+                    os.path.getsize(persist_path + JOURNAL_SUFFIX),
+                )
+                data, generation = _replay(persist_path)
+                self._write_snapshot(persist_path, data)
+                self._write_journal(persist_path, generation, b"")
+        except Exception:
+            logger.exception("Failed to compact the journal of %s", persist_path)
+
+    def _write_snapshot(self, persist_path: str, data: DATA_TYPE) -> None:
+        Path(persist_path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = persist_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, persist_path)
+        self._snapshot_size = os.path.getsize(persist_path)
+
+    def _write_journal(
+        self, persist_path: str, generation: str | None, entries: bytes
+    ) -> None:
+        """Replace the journal of `persist_path` by its header and `entries`."""
+        journal_path = persist_path + JOURNAL_SUFFIX
+        tmp_path = journal_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps({"g": generation}).encode() + b"\n" + entries)
+        os.replace(tmp_path, journal_path)
+        self._journal_size = os.path.getsize(journal_path)
+
+    @classmethod
+    def from_persist_path(
+        cls,
+        persist_path: str,
+        fs: Any | None = None,
+        compaction_ratio: float = 1.0,
+    ) -> "JournaledKVStore":
+        """Load the snapshot at `persist_path`, and replay its journal.
+
+        :raises FileNotFoundError: if there is no snapshot at `persist_path`
+        :raises NotImplementedError: if `fs` is not the local filesystem
+        """
+        _check_local(fs)
+        persist_path = str(persist_path)
+        logger.debug("Loading %s from %s", cls.__name__, persist_path)
+        if not os.path.exists(persist_path):
+            raise FileNotFoundError(persist_path)
+        with _file_lock(persist_path):
+            data, generation = _replay(persist_path)
+            store = cls(data, compaction_ratio=compaction_ratio)
+            store._persist_path = persist_path
+            store._generation = generation
+            store._snapshot_size = os.path.getsize(persist_path)
+            journal_path = persist_path + JOURNAL_SUFFIX
+            if os.path.exists(journal_path):
+                store._journal_size = os.path.getsize(journal_path)
+        # The next persists patch the values as loaded
+        store._journaled_fields = _all_struct_fields(store._data)
+        return store
@@ -2,9 +2,16 @@ import logging
 
 from injector import inject, singleton
 from llama_index.core.storage.docstore import BaseDocumentStore, SimpleDocumentStore
+from llama_index.core.storage.docstore.types import (
+    DEFAULT_PERSIST_FNAME as DOCSTORE_FNAME,
+)
 from llama_index.core.storage.index_store import SimpleIndexStore
+from llama_index.core.storage.index_store.types import (
+    DEFAULT_PERSIST_FNAME as INDEX_STORE_FNAME,
+)
 from llama_index.core.storage.index_store.types import BaseIndexStore
 
+from sonar_labs.components.node_store.journaled_kv_store import JournaledKVStore
 from sonar_labs.paths import local_data_path
 from sonar_labs.settings.settings import Settings
 
@@ -20,21 +27,28 @@ class NodeStoreComponent:
     def __init__(self, settings: Settings) -> None:
         match settings.nodestore.database:
             case "simple":
+                # Persisted as a snapshot and an append-only journal of the
+                # changes, replayed here, so persisting does not rewrite the stores
+                compaction_ratio = settings.nodestore.journal_compaction_ratio
                 try:
-                    self.index_store = SimpleIndexStore.from_persist_dir(
-                        persist_dir=str(local_data_path)
+                    index_kvstore = JournaledKVStore.from_persist_path(
+                        str(local_data_path / INDEX_STORE_FNAME),
+                        compaction_ratio=compaction_ratio,
                     )
                 except FileNotFoundError:
                     logger.debug("Local index store not found, creating a new one")
-                    self.index_store = SimpleIndexStore()
+                    index_kvstore = JournaledKVStore(compaction_ratio=compaction_ratio)
+                self.index_store = SimpleIndexStore(simple_kvstore=index_kvstore)
 
                 try:
-                    self.doc_store = SimpleDocumentStore.from_persist_dir(
-                        persist_dir=str(local_data_path)
+                    doc_kvstore = JournaledKVStore.from_persist_path(
+                        str(local_data_path / DOCSTORE_FNAME),
+                        compaction_ratio=compaction_ratio,
                     )
                 except FileNotFoundError:
                     logger.debug("Local document store not found, creating a new one")
-                    self.doc_store = SimpleDocumentStore()
+                    doc_kvstore = JournaledKVStore(compaction_ratio=compaction_ratio)
+                self.doc_store = SimpleDocumentStore(simple_kvstore=doc_kvstore)
 
             case "postgres":
                 try:
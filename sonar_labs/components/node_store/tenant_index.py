@@ -0,0 +1,273 @@
+import logging
+import sqlite3
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+from llama_index.core.schema import Document
+from llama_index.core.storage.docstore import BaseDocumentStore
+
+logger = logging.getLogger(__name__)
+
+# Changes kept in the log for the processes that did not read them yet: a
+# process further behind rebuilds its index from the docstore
+MAX_LOG_ENTRIES = 100_000
+
+_DocKey = tuple[str | None, str | None, str | None, str | None, str | None]
+
+
+class _FileDocs:
+    """doc_ids of a single tenant, keyed by file_id and by file_name."""
+
+    def __init__(self) -> None:
+        self.by_file_id: dict[str | None, set[str]] = {}
+        self.by_file_name: dict[str | None, set[str]] = {}
+
+    def is_empty(self) -> bool:
+        return not self.by_file_id and not self.by_file_name
+
+
+def _discard(index: dict[str | None, set[str]], key: str | None, doc_id: str) -> None:
+    doc_ids = index.get(key)
+    if doc_ids is None:
+        return
+    doc_ids.discard(doc_id)
+    if not doc_ids:
+        del index[key]
+
+
+class TenantDocIndex:
+    """Secondary index of ingested doc_ids by tenant metadata.
+
+    Documents are indexed as org_id -> project_id -> user_id -> file_id/file_name
+    -> doc_ids. The index is built from the docstore and then maintained by
+    the ingest component on every insert and delete, so finding the documents of
+    a file costs O(matches) instead of a walk over every `RefDocInfo`.
+
+    Other processes (API workers) change the documents too: with a `log_path`,
+    every change is also appended to a sqlite log shared by the processes of the
+    host, and the changes of the others are applied before a `find`, in
+    O(changes). A process that missed changes already pruned from the log
+    rebuilds its index from the docstore.
+    """
+
+    def __init__(
+        self,
+        docstore: BaseDocumentStore | None = None,
+        log_path: Path | None = None,
+    ) -> None:
+        self._lock = threading.Lock()
+        self._docstore = docstore
+        self._conn: sqlite3.Connection | None = None
+        if log_path is not None:
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(
+                str(log_path), check_same_thread=False, timeout=30
+            )
+            with self._lock, self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS tenant_docs_log ("
+                    "seq INTEGER PRIMARY KEY AUTOINCREMENT, doc_id TEXT NOT NULL, "
+                    "deleted INTEGER NOT NULL, org_id TEXT, project_id TEXT, "
+                    "user_id TEXT, file_id TEXT, file_name TEXT)"
+                )
+        # Last change of the log applied to the index
+        self._seq = 0
+        self._tenants: dict[
+            str | None, dict[str | None, dict[str | None, _FileDocs]]
+        ] = {}
+        # doc_id -> (org_id, project_id, user_id, file_id, file_name)
+        self._docs: dict[str, _DocKey] = {}
+
+    @classmethod
+    def from_docstore(
+        cls, docstore: BaseDocumentStore, log_path: Path | None = None
+    ) -> "TenantDocIndex":
+        index = cls(docstore, log_path)
+        index._rebuild()
+        return index
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _rebuild(self) -> None:
+        """Rebuild the index from the docstore."""
+        assert self._docstore is not None
+        # Read before the docstore: applying a change twice is harmless
+        seq = self._last_seq()
+        rebuilt = TenantDocIndex()
+        ref_docs = self._docstore.get_all_ref_doc_info() or {}
+        for doc_id, ref_doc_info in ref_docs.items():
+            if ref_doc_info is not None and ref_doc_info.metadata:
+                rebuilt._add(doc_id, ref_doc_info.metadata)
+        with self._lock:
+            self._tenants, self._docs = rebuilt._tenants, rebuilt._docs
+            self._seq = seq
+        logger.debug("Built tenant index with count=%s documents", len(self))
+
+    def _last_seq(self) -> int:
+        if self._conn is None:
+            return 0
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(seq) FROM tenant_docs_log").fetchone()
+        return row[0] or 0
+
+    def _log(self, rows: list[tuple[Any, ...]]) -> None:
+        """Append `(doc_id, deleted, *key)` changes to the log, and prune it."""
+        if self._conn is None or not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO tenant_docs_log (doc_id, deleted, org_id, project_id, "
+                "user_id, file_id, file_name) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute(
+                "DELETE FROM tenant_docs_log WHERE seq <= "
+                "(SELECT MAX(seq) FROM tenant_docs_log) - ?",
+                (MAX_LOG_ENTRIES,),
+            )
+
+    def refresh(self) -> None:
+        """Apply the changes of the documents made by the other processes."""
+        if self._conn is None:
+            return
+        with self._lock:
+            first_seq = self._conn.execute(
+                "SELECT MIN(seq) FROM tenant_docs_log"
+            ).fetchone()[0]
+        if first_seq is not None and first_seq > self._seq + 1:
+            logger.info("Missed changes of the documents, rebuilding the index")
+            self._rebuild()
+            return
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, doc_id, deleted, org_id, project_id, user_id, file_id, "
+                "file_name FROM tenant_docs_log WHERE seq > ? ORDER BY seq",
+                (self._seq,),
+            ).fetchall()
+            for seq, doc_id, deleted, *key in rows:
+                if deleted:
+                    self._remove(doc_id)
+                else:
+                    self._add_key(doc_id, tuple(key))  # type: ignore[arg-type]
+                self._seq = seq
+        if rows:
+            logger.debug("Applied count=%s changes of the documents", len(rows))
+
+    def add(self, doc_id: str, metadata: dict[str, Any]) -> None:
+        self._log([(doc_id, False, *self._add(doc_id, metadata))])
+
+    def _add(self, doc_id: str, metadata: dict[str, Any]) -> _DocKey:
+        key = (
+            metadata.get("org_id"),
+            metadata.get("project_id"),
+            metadata.get("user_id"),
+            metadata.get("file_id"),
+            metadata.get("file_name"),
+        )
+        with self._lock:
+            self._add_key(doc_id, key)
+        return key
+
+    def _add_key(self, doc_id: str, key: _DocKey) -> None:
+        if doc_id in self._docs:
+            self._remove(doc_id)
+        org_id, project_id, user_id, file_id, file_name = key
+        files = (
+            self._tenants.setdefault(org_id, {})
+            .setdefault(project_id, {})
+            .setdefault(user_id, _FileDocs())
+        )
+        files.by_file_id.setdefault(file_id, set()).add(doc_id)
+        files.by_file_name.setdefault(file_name, set()).add(doc_id)
+        self._docs[doc_id] = key
+
+    def add_documents(self, documents: Iterable[Document]) -> None:
+        self._log(
+            [
+                (document.doc_id, False, *self._add(document.doc_id, document.metadata))
+                for document in documents
+            ]
+        )
+
+    def remove(self, doc_id: str) -> None:
+        self.remove_many([doc_id])
+
+    def remove_many(self, doc_ids: Iterable[str]) -> None:
+        doc_ids = list(doc_ids)
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+        self._log([(doc_id, True, None, None, None, None, None) for doc_id in doc_ids])
+
+    def _remove(self, doc_id: str) -> None:
+        key = self._docs.pop(doc_id, None)
+        if key is None:
+            return
+        org_id, project_id, user_id, file_id, file_name = key
+        projects = self._tenants[org_id]
+        users = projects[project_id]
+        files = users[user_id]
+        _discard(files.by_file_id, file_id, doc_id)
+        _discard(files.by_file_name, file_name, doc_id)
+        # Prune empty branches, so deleted tenants do not leak memory
+        if files.is_empty():
+            del users[user_id]
+            if not users:
+                del projects[project_id]
+                if not projects:
+                    del self._tenants[org_id]
+
+    def find(
+        self,
+        org_id: str | None,
+        project_id: str | None,
+        user_id: str | None,
+        file_id: str | None = None,
+        file_names: Iterable[str] | None = None,
+    ) -> list[str]:
+        """Return the doc_ids of a tenant, optionally narrowed to some files.
+
+        When both `file_id` and `file_names` are given, only the documents
+        matching both are returned.
+        """
+        self.refresh()
+        with self._lock:
+            files = self._tenants.get(org_id, {}).get(project_id, {}).get(user_id)
+            if files is None:
+                return []
+            if file_id is None and file_names is None:
+                return [
+                    doc_id
+                    for doc_ids in files.by_file_id.values()
+                    for doc_id in doc_ids
+                ]
+            matches: set[str] | None = None
+            if file_id is not None:
+                matches = set(files.by_file_id.get(file_id, ()))
+            if file_names is not None:
+                by_name: set[str] = set()
+                for file_name in file_names:
+                    by_name.update(files.by_file_name.get(file_name, ()))
+                matches = by_name if matches is None else matches & by_name
+            return list(matches or ())
+
+    def find_tenant(
+        self, org_id: str | None, project_id: str | None = None
+    ) -> list[str]:
+        """Return the doc_ids of an organization, or of one of its projects."""
+        self.refresh()
+        with self._lock:
+            projects = self._tenants.get(org_id, {})
+            if project_id is not None:
+                projects = {project_id: projects.get(project_id, {})}
+            return [
+                doc_id
+                for users in projects.values()
+                for files in users.values()
+                for doc_ids in files.by_file_id.values()
+                for doc_id in doc_ids
+            ]
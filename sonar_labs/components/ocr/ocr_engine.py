@@ -0,0 +1,202 @@
+import abc
+import hashlib
+import io
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from sonar_labs.settings.settings import OCRSettings
+
+logger = logging.getLogger(__name__)
+
+
+def _chunks(items: list[bytes], size: int) -> list[list[bytes]]:
+    size = max(1, size)
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+class BaseOCREngine(abc.ABC):
+    """Extract the text of page images (PNG bytes)."""
+
+    # Part of the cache key: results of different engines are not interchangeable
+    name: str
+
+    @abc.abstractmethod
+    def recognize(self, images: list[bytes]) -> list[str]:
+        """Return the text of each image, in the same order."""
+        pass
+
+
+class GoogleVisionOCREngine(BaseOCREngine):
+    """OCR with Google Cloud Vision.
+
+    Pages are sent `batch_size` at a time with `batch_annotate_images`, with up to
+    `max_concurrency` requests in flight. The client is created once, and reused.
+    """
+
+    name = "google"
+
+    # Limit of images per synchronous request of the Vision API
+    MAX_BATCH_SIZE = 16
+
+    def __init__(self, batch_size: int, max_concurrency: int) -> None:
+        from google.cloud import vision  # type: ignore
+
+        self._vision = vision
+        self._client = vision.ImageAnnotatorClient()
+        self.batch_size = min(max(1, batch_size), self.MAX_BATCH_SIZE)
+        self.max_concurrency = max(1, max_concurrency)
+
+    def recognize(self, images: list[bytes]) -> list[str]:
+        batches = _chunks(images, self.batch_size)
+        if len(batches) == 1:
+            return self._annotate(batches[0])
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return [
+                text for texts in pool.map(self._annotate, batches) for text in texts
+            ]
+
+    def _annotate(self, images: list[bytes]) -> list[str]:
+        vision = self._vision
+        feature = vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)
+        response = self._client.batch_annotate_images(
+            requests=[
+                vision.AnnotateImageRequest(
+                    image=vision.Image(content=image), features=[feature]
+                )
+                for image in images
+            ]
+        )
+        texts = []
+        for image_response in response.responses:
+            if image_response.error.message:
+                raise Exception(f"{image_response.error.message}")
+            annotations = image_response.text_annotations
+            # The first annotation is the full text
+            texts.append(annotations[0].description if annotations else "")
+        return texts
+
+
+class TesseractOCREngine(BaseOCREngine):
+    """OCR with a local Tesseract, `max_concurrency` pages at a time."""
+
+    name = "tesseract"
+
+    def __init__(self, lang: str, max_concurrency: int) -> None:
+        try:
+            import pytesseract  # type: ignore
+            from PIL import Image  # type: ignore
+        except ImportError as e:
+            raise ImportError(
+                "Tesseract dependencies not found, install with `poetry install --extras ocr-tesseract`"
+            ) from e
+
+        self._pytesseract = pytesseract
+        self._image_cls = Image
+        self.lang = lang
+        self.name = f"tesseract:{lang}"
+        self.max_concurrency = max(1, max_concurrency)
+
+    def recognize(self, images: list[bytes]) -> list[str]:
+        # Tesseract runs in its own process, threads are enough to use the cores
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(pool.map(self._recognize_one, images))
+
+    def _recognize_one(self, image: bytes) -> str:
+        text: str = self._pytesseract.image_to_string(
+            self._image_cls.open(io.BytesIO(image)), lang=self.lang
+        )
+        return text
+
+
+class MockOCREngine(BaseOCREngine):
+    """Deterministic OCR, that does not read the images: for tests."""
+
+    name = "mock"
+
+    def recognize(self, images: list[bytes]) -> list[str]:
+        return [
+            f"Scanned page {hashlib.sha256(image).hexdigest()[:16]}" for image in images
+        ]
+
+
+class CachedOCREngine(BaseOCREngine):
+    """Cache the results of another engine on disk, by sha256 of the page image.
+
+    Only the images missing from the cache are sent to the engine, all at once.
+    The cache is a sqlite database, that can be shared by several processes.
+    """
+
+    def __init__(self, engine: BaseOCREngine, cache_path: Path) -> None:
+        self.engine = engine
+        self.name = engine.name
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(cache_path), check_same_thread=False, timeout=30
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr (key TEXT PRIMARY KEY, text TEXT NOT NULL)"
+            )
+
+    def recognize(self, images: list[bytes]) -> list[str]:
+        keys = [f"{self.name}:{hashlib.sha256(image).hexdigest()}" for image in images]
+        cached = self._get(set(keys))
+        missing = {
+            key: image
+            for key, image in zip(keys, images, strict=True)
+            if key not in cached
+        }
+        if missing:
+            logger.debug(
+                "OCR cache hits=%s misses=%s", len(images) - len(missing), len(missing)
+            )
+            texts = self.engine.recognize(list(missing.values()))
+            recognized = dict(zip(missing.keys(), texts, strict=True))
+            self._put(recognized)
+            cached.update(recognized)
+        return [cached[key] for key in keys]
+
+    def _get(self, keys: set[str]) -> dict[str, str]:
+        found: dict[str, str] = {}
+        key_list = list(keys)
+        with self._lock:
+            # Stay below the sqlite limit of variables per statement
+            for i in range(0, len(key_list), 500):
+                chunk = key_list[i : i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, text FROM ocr WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def _put(self, texts: dict[str, str]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ocr (key, text) VALUES (?, ?)", texts.items()
+            )
+
+
+def get_ocr_engine(ocr_settings: OCRSettings, cache_path: Path) -> BaseOCREngine:
+    """Get the OCR engine for the given configuration."""
+    engine: BaseOCREngine
+    match ocr_settings.mode:
+        case "google":
+            engine = GoogleVisionOCREngine(
+                batch_size=ocr_settings.batch_size,
+                max_concurrency=ocr_settings.max_concurrency,
+            )
+        case "tesseract":
+            engine = TesseractOCREngine(
+                lang=ocr_settings.tesseract_lang,
+                max_concurrency=ocr_settings.max_concurrency,
+            )
+        case "mock":
+            engine = MockOCREngine()
+    if ocr_settings.cache:
+        engine = CachedOCREngine(engine, cache_path)
+    return engine
@@ -101,3 +101,13 @@ class BatchedChromaVectorStore(ChromaVectorStore):  # type: ignore
             all_ids.extend(ids)
 
         return all_ids
+
+    def delete_ref_docs(self, ref_doc_ids: list[str]) -> None:
+        """Delete the nodes of all the given ref docs, in a single call.
+
+        Args:
+            ref_doc_ids: List[str]: ids of the documents to delete
+        """
+        if not ref_doc_ids:
+            return
+        self._collection.delete(where={"document_id": {"$in": ref_doc_ids}})
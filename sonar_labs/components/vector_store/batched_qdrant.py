@@ -0,0 +1,228 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, cast
+
+from grpc import RpcError  # type: ignore
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from llama_index.vector_stores.qdrant import QdrantVectorStore  # type: ignore
+from qdrant_client.http import models as rest  # type: ignore
+from qdrant_client.http.exceptions import UnexpectedResponse  # type: ignore
+from qdrant_client.local.qdrant_local import QdrantLocal  # type: ignore
+
+from sonar_labs.components.vector_store.vector_compaction import VectorPrecision
+from sonar_labs.open_ai.extensions.context_filter import FILTER_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Payload key holding the ref doc id of the nodes, see `QdrantVectorStore.delete`
+DOCUMENT_ID_KEY = "doc_id"
+
+
+class BatchedQdrantVectorStore(QdrantVectorStore):  # type: ignore
+    """Qdrant vector store, deleting the nodes of many documents at once.
+
+    `QdrantVectorStore.delete` removes the nodes of a single ref doc per request.
+
+    The collection is created with the vectors stored in `vector_precision`:
+    `float32` vectors, or `int8` scalar quantized vectors kept in RAM (the
+    original vectors being used to rescore the results). `float16` vectors need
+    a more recent qdrant-client than the pinned one. The original vectors
+    are memory-mapped from disk with `on_disk`, and the HNSW graph is built with
+    `hnsw_config`.
+
+    The searches use the `search_params` query kwarg, if given (see
+    `VectorIndexRetriever(vector_store_kwargs=...)`), e.g. for their `hnsw_ef`.
+
+    The collection has a keyword payload index on each of the `FILTER_FIELDS`,
+    created with the collection, or on startup for the existing collections:
+    without them, the filtered searches scan the payloads of the collection.
+
+    The points are upserted in batches of `batch_size` points, `parallel`
+    batches at a time (in threads, over the connections of the client).
+    """
+
+    _vector_params: dict[str, Any] = PrivateAttr(default_factory=dict)
+    _collection_params: dict[str, Any] = PrivateAttr(default_factory=dict)
+    _executor: ThreadPoolExecutor | None = PrivateAttr(default=None)
+
+    def __init__(
+        self,
+        *args: Any,
+        vector_precision: VectorPrecision = "float32",
+        on_disk: bool = False,
+        quantization_always_ram: bool = True,
+        hnsw_config: rest.HnswConfigDiff | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self._vector_params = {}
+        self._collection_params = {}
+        if on_disk:
+            self._vector_params["on_disk"] = True
+        if vector_precision == "float16":
+            raise ValueError(
+                "vector_precision=float16 is not supported by Qdrant, use float32 or int8"
+            )
+        if vector_precision == "int8":
+            self._collection_params["quantization_config"] = rest.ScalarQuantization(
+                scalar=rest.ScalarQuantizationConfig(
+                    type=rest.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=quantization_always_ram,
+                )
+            )
+        if hnsw_config is not None:
+            self._collection_params["hnsw_config"] = hnsw_config
+        self._executor = (
+            ThreadPoolExecutor(
+                max_workers=self.parallel, thread_name_prefix="qdrant-upsert"
+            )
+            if self.parallel > 1
+            else None
+        )
+        if self._collection_initialized:
+            self._create_payload_indexes(self.collection_name)
+
+    def _create_payload_indexes(self, collection_name: str) -> None:
+        if isinstance(self._client._client, QdrantLocal):
+            # No payload indexes in the local mode, the payloads are in memory
+            return
+        payload_schema = self._client.get_collection(collection_name).payload_schema
+        for field_name in FILTER_FIELDS:
+            if field_name not in payload_schema:
+                logger.info(
+                    "Creating the payload index of %s in collection %s",
+                    field_name,
+                    collection_name,
+                )
+                self._client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=rest.PayloadSchemaType.KEYWORD,
+                )
+
+    def _create_collection(self, collection_name: str, vector_size: int) -> None:
+        if self.enable_hybrid:
+            super()._create_collection(collection_name, vector_size)
+            self._create_payload_indexes(collection_name)
+            return
+        try:
+            self._client.create_collection(
+                collection_name=collection_name,
+                vectors_config=rest.VectorParams(
+                    size=vector_size,
+                    distance=rest.Distance.COSINE,
+                    **self._vector_params,
+                ),
+                **self._collection_params,
+            )
+        except (RpcError, ValueError, UnexpectedResponse) as exc:
+            if "already exists" not in str(exc):
+                raise
+            logger.warning(
+                "Collection %s already exists, skipping collection creation.",
+                collection_name,
+            )
+        self._create_payload_indexes(collection_name)
+        self._collection_initialized = True
+
+    def add(self, nodes: list[BaseNode], **add_kwargs: Any) -> list[str]:
+        """Upsert the nodes, `parallel` batches of `batch_size` points at a time.
+
+        Args:
+            nodes: List[BaseNode]: list of nodes with embeddings
+        """
+        if self._executor is None or len(nodes) <= self.batch_size:
+            return cast(list[str], super().add(nodes, **add_kwargs))
+        if not self._collection_initialized:
+            self._create_collection(
+                collection_name=self.collection_name,
+                vector_size=len(nodes[0].get_embedding()),
+            )
+        points, ids = self._build_points(nodes, self.sparse_vector_name())
+        batches = [
+            points[i : i + self.batch_size]
+            for i in range(0, len(points), self.batch_size)
+        ]
+        # `upload_points(parallel=...)` forks processes, threads are enough to
+        # keep several requests in flight
+        for _ in self._executor.map(self._upsert, batches):
+            pass
+        return cast(list[str], ids)
+
+    def _upsert(self, points: list[Any]) -> None:
+        self._client.upload_points(
+            collection_name=self.collection_name,
+            points=points,
+            batch_size=len(points),
+            max_retries=self.max_retries,
+            wait=True,
+        )
+
+    def close(self) -> None:
+        """Stop the upsert threads, the client (maybe shared) is left open."""
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def _dense_search_params(
+        self, query: VectorStoreQuery, **kwargs: Any
+    ) -> rest.SearchParams | None:
+        """The `search_params` of a dense search, None to search like the parent."""
+        if self.enable_hybrid or query.mode != VectorStoreQueryMode.DEFAULT:
+            return None
+        return kwargs.get("search_params")
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        search_params = self._dense_search_params(query, **kwargs)
+        if search_params is None:
+            return cast(VectorStoreQueryResult, super().query(query, **kwargs))
+        response = self._client.search(
+            collection_name=self.collection_name,
+            query_vector=cast(list[float], query.query_embedding),
+            limit=query.similarity_top_k,
+            query_filter=kwargs.get("qdrant_filters")
+            or self._build_query_filter(query),
+            search_params=search_params,
+        )
+        return cast(VectorStoreQueryResult, self.parse_to_query_result(response))
+
+    async def aquery(
+        self, query: VectorStoreQuery, **kwargs: Any
+    ) -> VectorStoreQueryResult:
+        search_params = self._dense_search_params(query, **kwargs)
+        if search_params is None:
+            return cast(VectorStoreQueryResult, await super().aquery(query, **kwargs))
+        response = await self._aclient.search(
+            collection_name=self.collection_name,
+            query_vector=cast(list[float], query.query_embedding),
+            limit=query.similarity_top_k,
+            query_filter=kwargs.get("qdrant_filters")
+            or self._build_query_filter(query),
+            search_params=search_params,
+        )
+        return cast(VectorStoreQueryResult, self.parse_to_query_result(response))
+
+    def delete_ref_docs(self, ref_doc_ids: list[str], **delete_kwargs: Any) -> None:
+        """Delete the nodes of all the given ref docs, with a single filter.
+
+        Args:
+            ref_doc_ids: List[str]: ids of the documents to delete
+        """
+        if not ref_doc_ids or not self._collection_initialized:
+            return
+        self._client.delete(
+            collection_name=self.collection_name,
+            points_selector=rest.Filter(
+                must=[
+                    rest.FieldCondition(
+                        key=DOCUMENT_ID_KEY, match=rest.MatchAny(any=ref_doc_ids)
+                    )
+                ]
+            ),
+        )
@@ -0,0 +1,46 @@
+from typing import TYPE_CHECKING
+
+from llama_index.core.indices.vector_store import VectorIndexRetriever
+from llama_index.core.schema import BaseNode, NodeWithScore
+from llama_index.core.vector_stores.types import VectorStoreQueryResult
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+
+class DocstoreVectorIndexRetriever(VectorIndexRetriever):
+    """Retriever fetching from the docstore the nodes the vector store only has ids of.
+
+    `VectorIndexRetriever` maps the ids through the `nodes_dict` of the index
+    struct, which only the index of the ingestion keeps up to date. The vector
+    stores not storing the nodes (`stores_text` is False) return their node ids.
+    """
+
+    def _build_node_list_from_query_result(
+        self, query_result: VectorStoreQueryResult
+    ) -> list[NodeWithScore]:
+        if query_result.nodes is None and query_result.ids is not None:
+            similarities: Sequence[float | None] = query_result.similarities or [
+                None
+            ] * len(query_result.ids)
+            found = [
+                (node, similarity)
+                for node_id, similarity in zip(
+                    query_result.ids, similarities, strict=True
+                )
+                # A node deleted since the search has no node anymore
+                if isinstance(
+                    node := self._docstore.get_document(node_id, raise_error=False),
+                    BaseNode,
+                )
+            ]
+            query_result = VectorStoreQueryResult(
+                nodes=[node for node, _ in found],
+                similarities=(
+                    [similarity for _, similarity in found]  # type: ignore[misc]
+                    if query_result.similarities is not None
+                    else None
+                ),
+                ids=[node.node_id for node, _ in found],
+            )
+        return super()._build_node_list_from_query_result(query_result)
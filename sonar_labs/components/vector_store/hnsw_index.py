@@ -0,0 +1,101 @@
+import logging
+import os
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import hnswlib  # type: ignore
+import numpy as np
+import numpy.typing as npt
+
+logger = logging.getLogger(__name__)
+
+
+class HnswIndex:
+    """HNSW graph of the vectors of a `LocalVectorStore`, labelled by row key.
+
+    The keys of the rows are stable (compacting the store keeps them), so the
+    graph is only changed by the inserts and the deletes. Deleted labels are
+    marked as such, and their slots are reused by the next inserts.
+
+    The vectors are normalized, the inner product is their cosine similarity.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        dim: int,
+        m: int = 16,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+    ) -> None:
+        self.path = path
+        self.ef_search = ef_search
+        self._lock = threading.Lock()
+        self._index = hnswlib.Index(space="ip", dim=dim)
+        if path.exists():
+            self._index.load_index(str(path), allow_replace_deleted=True)
+            logger.debug(
+                "Loaded HNSW index of count=%s vectors", self._index.element_count
+            )
+        else:
+            self._index.init_index(
+                max_elements=1024,
+                M=m,
+                ef_construction=ef_construction,
+                allow_replace_deleted=True,
+            )
+
+    def labels(self) -> npt.NDArray[np.int64]:
+        """Labels in the graph, deleted ones included."""
+        with self._lock:
+            return np.asarray(self._index.get_ids_list(), dtype=np.int64)
+
+    def add(
+        self, vectors: npt.NDArray[np.floating[Any]], keys: npt.NDArray[np.int64]
+    ) -> None:
+        if len(keys) == 0:
+            return
+        with self._lock:
+            needed = self._index.element_count + len(keys)
+            if needed > self._index.get_max_elements():
+                self._index.resize_index(
+                    max(needed, 2 * self._index.get_max_elements())
+                )
+            self._index.add_items(
+                np.asarray(vectors, dtype=np.float32), keys, replace_deleted=True
+            )
+
+    def delete(self, keys: npt.NDArray[np.int64]) -> None:
+        with self._lock:
+            for key in keys.tolist():
+                try:
+                    self._index.mark_deleted(key)
+                except RuntimeError:
+                    # Not in the graph, or already deleted
+                    pass
+
+    def search(
+        self,
+        query: npt.NDArray[np.float32],
+        top_k: int,
+        ef: int | None = None,
+        filter_: Callable[[int], bool] | None = None,
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float32]]:
+        """Keys and similarities of the (approximate) `top_k` closest vectors.
+
+        :raises RuntimeError: if less than `top_k` vectors are found
+        """
+        with self._lock:
+            self._index.set_ef(max(ef or self.ef_search, top_k))
+            labels, distances = self._index.knn_query(
+                query, k=top_k, num_threads=1, filter=filter_
+            )
+        return labels[0].astype(np.int64), 1 - distances[0]
+
+    def save(self) -> None:
+        tmp_path = self.path.with_suffix(".tmp")
+        with self._lock:
+            self._index.save_index(str(tmp_path))
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,850 @@
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Literal, cast
+
+import numpy as np
+import numpy.typing as npt
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterCondition,
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+from sonar_labs.open_ai.extensions.context_filter import FILTER_FIELDS
+
+if sys.platform != "win32":
+    import fcntl
+
+logger = logging.getLogger(__name__)
+
+# Code of a missing metadata value in the filter columns
+_MISSING_CODE = 0
+
+# Rows preallocated in the column files, doubled when full
+_MIN_CAPACITY = 1024
+
+# Rows scored (or copied) at a time when the vectors have to be converted
+_CHUNK_ROWS = 65536
+
+# Below this number of rows, the tombstones are never compacted
+MIN_COMPACTION_ROWS = 1024
+
+# Filtered searches gather the matching rows instead of scoring all of them
+# when they are less than this fraction of the rows
+_GATHER_RATIO = 0.25
+
+# Filtered HNSW searches fetch up to this number of unfiltered results, to
+# filter them, before walking the graph with the filter
+_MAX_OVERFETCH = 1024
+
+_SQLITE_MAX_VARIABLES = 500
+
+
+@dataclass(frozen=True)
+class _Segment:
+    """Memory-mapped columns of a generation of the store.
+
+    Only the rows below `count` are valid. A segment is never resized in place:
+    growing or compacting the store publishes a new segment, so a search keeps a
+    consistent view of the one it started with.
+    """
+
+    generation: int
+    count: int
+    capacity: int
+    vectors: "np.memmap[Any, np.dtype[Any]]"
+    keys: "np.memmap[Any, np.dtype[np.int64]]"
+    live: "np.memmap[Any, np.dtype[np.uint8]]"
+    columns: "dict[str, np.memmap[Any, np.dtype[Any]]]"
+
+    def flush(self) -> None:
+        for column in (self.vectors, self.keys, self.live, *self.columns.values()):
+            column.flush()
+
+
+class LocalVectorStore(BasePydanticVectorStore):
+    """Vector store embedded in the process, in memory-mapped files.
+
+    The normalized vectors are stored in a column file (float32 or float16), next
+    to the columns of the rows: a key identifying the node, a live flag, and the
+    codes of the `FILTER_FIELDS` values. A sqlite side table maps the keys to the
+    node ids, and the codes to the metadata values. Opening the store maps the
+    files, nothing is loaded.
+
+    Searches are exact: the cosine similarity of the query with all the matching
+    rows, in a single matrix product, and the top-k selected with
+    `np.argpartition`.
+
+    Nodes are appended, and deleted by clearing their live flag (tombstones).
+    When the tombstones exceed `compaction_ratio` of the rows, a background
+    thread rewrites the live rows in a new generation of the files.
+
+    With `index="hnsw"`, the searches go through an HNSW graph of the vectors
+    (see `HnswIndex`), saved on `persist`: it is brought up to date with the
+    rows on load if it was not saved after the last changes. The searches
+    filtered down to at most `exact_search_max_rows` rows stay exact, the graph
+    being a poor way to find the few vectors of a selective filter.
+
+    Several processes (API workers) can open the same `persist_dir`: the writes
+    hold a file lock, and the rows written by another process are mapped when
+    its change is seen, before the next write or search.
+
+    The nodes are not stored here (`stores_text` is False), only their vectors.
+    """
+
+    stores_text: bool = False
+    persist_dir: str = Field(description="Directory of the files of the store.")
+    precision: Literal["float32", "float16"] = Field(
+        default="float32", description="Precision the vectors are stored in."
+    )
+    compaction_ratio: float = Field(
+        default=0.2,
+        description="Fraction of deleted rows above which the files are compacted.",
+    )
+    index: Literal["flat", "hnsw"] = Field(
+        default="flat",
+        description="Exact (`flat`) or approximate (`hnsw`) search of the vectors.",
+    )
+    hnsw_m: int = Field(default=16, description="Links per node of the HNSW graph.")
+    hnsw_ef_construction: int = Field(
+        default=200, description="Candidates explored to link a new node."
+    )
+    hnsw_ef_search: int = Field(
+        default=64, description="Candidates explored by a search."
+    )
+    exact_search_max_rows: int = Field(
+        default=50000,
+        description="Searches over at most this number of rows are exact.",
+    )
+
+    _write_lock: Any = PrivateAttr()
+    _db_lock: threading.Lock = PrivateAttr()
+    _conn: sqlite3.Connection = PrivateAttr()
+    _lock_file: Any = PrivateAttr()
+    _lock_depth: int = PrivateAttr(default=0)
+    _segment: _Segment | None = PrivateAttr(default=None)
+    # Version (in the meta table) of the last change mapped
+    _version: str | None = PrivateAttr(default=None)
+    _next_key: int = PrivateAttr(default=0)
+    _deleted: int = PrivateAttr(default=0)
+    _compaction_thread: threading.Thread | None = PrivateAttr(default=None)
+    _hnsw: Any = PrivateAttr(default=None)
+    _hnsw_synced: bool = PrivateAttr(default=False)
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        Path(self.persist_dir).mkdir(parents=True, exist_ok=True)
+        self._write_lock = threading.RLock()
+        self._db_lock = threading.Lock()
+        self._lock_file = open(Path(self.persist_dir) / "lock", "a")  # noqa: SIM115
+        self._conn = sqlite3.connect(
+            str(Path(self.persist_dir) / "index.sqlite"),
+            check_same_thread=False,
+            timeout=30,
+        )
+        with self._db_lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS nodes (key INTEGER PRIMARY KEY, node_id TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS nodes_node_id ON nodes (node_id)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS terms ("
+                "field TEXT NOT NULL, value TEXT NOT NULL, code INTEGER NOT NULL, "
+                "PRIMARY KEY (field, value))"
+            )
+        with self._locked():
+            self._reload()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    # Files
+
+    def _meta(self) -> dict[str, str]:
+        with self._db_lock:
+            return dict(self._conn.execute("SELECT name, value FROM meta").fetchall())
+
+    def _path(self, name: str, generation: int) -> Path:
+        return Path(self.persist_dir) / f"{name}.{generation}.bin"
+
+    def _column_specs(
+        self, dim: int
+    ) -> dict[str, tuple[np.dtype[Any], tuple[int, ...]]]:
+        specs: dict[str, tuple[np.dtype[Any], tuple[int, ...]]] = {
+            "vectors": (np.dtype(self.precision), (dim,)),
+            "keys": (np.dtype(np.int64), ()),
+            "live": (np.dtype(np.uint8), ()),
+        }
+        for field in FILTER_FIELDS:
+            specs[field] = (np.dtype(np.int32), ())
+        return specs
+
+    def _map(self, generation: int, count: int, capacity: int, dim: int) -> _Segment:
+        """Map the column files of `generation`, extended to `capacity` rows."""
+        columns: dict[str, np.memmap[Any, np.dtype[Any]]] = {}
+        for name, (dtype, row_shape) in self._column_specs(dim).items():
+            path = self._path(name, generation)
+            size = capacity * dtype.itemsize * int(np.prod(row_shape, dtype=np.int64))
+            with open(path, "r+b" if path.exists() else "w+b") as f:
+                if os.fstat(f.fileno()).st_size < size:
+                    # Sparse extension, the new rows read as zeros
+                    f.truncate(size)
+            columns[name] = np.memmap(
+                path, dtype=dtype, mode="r+", shape=(capacity, *row_shape)
+            )
+        return _Segment(
+            generation=generation,
+            count=count,
+            capacity=capacity,
+            vectors=columns.pop("vectors"),
+            keys=columns.pop("keys"),
+            live=columns.pop("live"),
+            columns=columns,
+        )
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Lock the files against the other threads and processes (not on Windows)."""
+        with self._write_lock:
+            if self._lock_depth == 0 and sys.platform != "win32":
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and sys.platform != "win32":
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """Map the changes of the other processes, if any."""
+        if self._meta().get("version") != self._version:
+            with self._locked():
+                self._reload()
+
+    def _reload(self) -> None:
+        """Map the rows as of the meta table, with the changes of other processes.
+
+        Called with the files locked.
+        """
+        meta = self._meta()
+        if "dim" not in meta:
+            return
+        if self._segment is not None and meta.get("version") == self._version:
+            return
+        if meta["precision"] != self.precision:
+            logger.warning(
+                "Local vector store was created in precision=%s, ignoring precision=%s",
+                meta["precision"],
+                self.precision,
+            )
+            self.precision = meta["precision"]  # type: ignore[assignment]
+        dim = int(meta["dim"])
+        generation = int(meta["generation"])
+        count = int(meta["count"])
+        vectors_path = self._path("vectors", generation)
+        row_bytes = dim * np.dtype(self.precision).itemsize
+        capacity = max(count, os.path.getsize(vectors_path) // row_bytes)
+        previous = self._segment
+        if (
+            previous is None
+            or previous.generation != generation
+            or previous.capacity < capacity
+        ):
+            segment = self._map(generation, count, capacity, dim)
+        else:
+            segment = replace(previous, count=count)
+        self._segment = segment
+        self._deleted = count - int(np.count_nonzero(segment.live[:count]))
+        self._version = meta.get("version")
+        watermark, self._next_key = self._next_key, int(meta.get("next_key", 0))
+        if previous is None:
+            logger.debug(
+                "Opened local vector store with count=%s vectors (deleted=%s)",
+                count,
+                self._deleted,
+            )
+            self._open_hnsw(dim)
+        elif self._hnsw is not None:
+            # Changed by another process
+            self._sync_hnsw(segment, watermark)
+            self._hnsw_synced = meta.get("hnsw_synced") == "1"
+
+    def _open_hnsw(self, dim: int) -> None:
+        if self.index != "hnsw" or self._hnsw is not None:
+            return
+        try:
+            from sonar_labs.components.vector_store.hnsw_index import HnswIndex
+        except ImportError as e:
+            raise ImportError(
+                "HNSW dependencies not found, install with `poetry install --extras vector-stores-local-hnsw`"
+            ) from e
+
+        self._hnsw = HnswIndex(
+            Path(self.persist_dir) / "hnsw.bin",
+            dim,
+            m=self.hnsw_m,
+            ef_construction=self.hnsw_ef_construction,
+            ef_search=self.hnsw_ef_search,
+        )
+        meta = self._meta()
+        self._hnsw_synced = meta.get("hnsw_synced") == "1"
+        if not self._hnsw_synced and self._segment is not None:
+            self._sync_hnsw(self._segment, int(meta.get("hnsw_watermark", 0)))
+            self._save_hnsw()
+
+    def _sync_hnsw(self, segment: _Segment, watermark: int) -> None:
+        """Catch up with the changes made since the graph was last saved.
+
+        The rows of a key above `watermark` were added after the save, the
+        labels of the graph that are not live rows were deleted after it.
+        """
+        keys = segment.keys[: segment.count]
+        live = segment.live[: segment.count] != 0
+        rows = np.flatnonzero(live & (keys >= watermark))
+        logger.info("Adding count=%s vectors to the HNSW index", len(rows))
+        for i in range(0, len(rows), _CHUNK_ROWS):
+            chunk = rows[i : i + _CHUNK_ROWS]
+            self._hnsw.add(segment.vectors[chunk].astype(np.float32), keys[chunk])
+        labels = self._hnsw.labels()
+        self._hnsw.delete(labels[~np.isin(labels, keys[live])])
+
+    def _hnsw_changed(self) -> None:
+        # Marked before the change, so that a crash is caught up on the next load
+        if self._hnsw_synced:
+            with self._db_lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES ('hnsw_synced', '0')"
+                )
+            self._hnsw_synced = False
+
+    def _save_hnsw(self) -> None:
+        with self._locked():
+            # The graph has the rows of the other processes once reloaded
+            self._reload()
+            if self._hnsw is None or self._hnsw_synced:
+                return
+            self._hnsw.save()
+            with self._db_lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                    [("hnsw_synced", "1"), ("hnsw_watermark", str(self._next_key))],
+                )
+            self._hnsw_synced = True
+
+    def _meta_rows(
+        self, segment: _Segment, next_key: int | None = None
+    ) -> list[tuple[str, str]]:
+        """The meta of `segment`, with a new version for the other processes."""
+        self._version = uuid.uuid4().hex
+        values = {
+            "dim": str(segment.vectors.shape[1]),
+            "precision": self.precision,
+            "generation": str(segment.generation),
+            "count": str(segment.count),
+            "version": self._version,
+        }
+        if next_key is not None:
+            values["next_key"] = str(next_key)
+            self._next_key = next_key
+        return list(values.items())
+
+    def _save_meta(self, segment: _Segment) -> None:
+        with self._db_lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                self._meta_rows(segment),
+            )
+
+    # Side table
+
+    def _codes(
+        self, field: str, values: list[str], create: bool = False
+    ) -> dict[str, int]:
+        """Codes of the `values` of `field`, new codes are assigned if `create`."""
+        unique = list(set(values))
+        codes: dict[str, int] = {}
+        with self._db_lock:
+            for i in range(0, len(unique), _SQLITE_MAX_VARIABLES):
+                chunk = unique[i : i + _SQLITE_MAX_VARIABLES]
+                codes.update(
+                    self._conn.execute(
+                        "SELECT value, code FROM terms WHERE field = ? AND value IN "
+                        f"({','.join('?' * len(chunk))})",
+                        [field, *chunk],
+                    ).fetchall()
+                )
+            missing = [value for value in unique if value not in codes]
+            if create and missing:
+                next_code = self._conn.execute(
+                    "SELECT COALESCE(MAX(code), 0) + 1 FROM terms WHERE field = ?",
+                    (field,),
+                ).fetchone()[0]
+                new_codes = {value: next_code + i for i, value in enumerate(missing)}
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO terms (field, value, code) VALUES (?, ?, ?)",
+                        [(field, value, code) for value, code in new_codes.items()],
+                    )
+                codes.update(new_codes)
+        return codes
+
+    def _keys_of_nodes(self, node_ids: list[str]) -> list[int]:
+        keys: list[int] = []
+        with self._db_lock:
+            for i in range(0, len(node_ids), _SQLITE_MAX_VARIABLES):
+                chunk = node_ids[i : i + _SQLITE_MAX_VARIABLES]
+                keys.extend(
+                    key
+                    for (key,) in self._conn.execute(
+                        f"SELECT key FROM nodes WHERE node_id IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                )
+        return keys
+
+    def _node_ids(self, keys: list[int]) -> dict[int, str]:
+        node_ids: dict[int, str] = {}
+        with self._db_lock:
+            for i in range(0, len(keys), _SQLITE_MAX_VARIABLES):
+                chunk = keys[i : i + _SQLITE_MAX_VARIABLES]
+                node_ids.update(
+                    self._conn.execute(
+                        f"SELECT key, node_id FROM nodes WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+        return node_ids
+
+    # Writes
+
+    @staticmethod
+    def _field_value(node: BaseNode, field: str) -> str | None:
+        if field == "doc_id":
+            return node.ref_doc_id or node.metadata.get("doc_id")
+        value = node.metadata.get(field)
+        return None if value is None else str(value)
+
+    def add(self, nodes: list[BaseNode], **add_kwargs: Any) -> list[str]:
+        """Append the nodes, replacing the ones already stored with the same id."""
+        if not nodes:
+            return []
+        embeddings = np.asarray([node.get_embedding() for node in nodes], np.float32)
+        embeddings /= np.clip(
+            np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None
+        )
+        node_ids = [node.node_id for node in nodes]
+
+        with self._locked():
+            self._reload()
+            segment = self._segment
+            if segment is None:
+                segment = self._map(0, 0, _MIN_CAPACITY, embeddings.shape[1])
+                self._open_hnsw(embeddings.shape[1])
+            elif segment.vectors.shape[1] != embeddings.shape[1]:
+                raise ValueError(
+                    f"Cannot add embeddings of {embeddings.shape[1]} dimensions to a "
+                    f"store of {segment.vectors.shape[1]} dimensions"
+                )
+            self._delete_keys(segment, self._keys_of_nodes(node_ids))
+
+            start, end = segment.count, segment.count + len(nodes)
+            if end > segment.capacity:
+                segment = self._map(
+                    segment.generation,
+                    segment.count,
+                    max(end, 2 * segment.capacity),
+                    embeddings.shape[1],
+                )
+            next_key = self._next_key
+            keys = np.arange(next_key, next_key + len(nodes), dtype=np.int64)
+            segment.vectors[start:end] = embeddings.astype(self.precision)
+            segment.keys[start:end] = keys
+            segment.live[start:end] = 1
+            for field, column in segment.columns.items():
+                values = [self._field_value(node, field) for node in nodes]
+                codes = self._codes(
+                    field, [value for value in values if value is not None], create=True
+                )
+                column[start:end] = [
+                    _MISSING_CODE if value is None else codes[value] for value in values
+                ]
+            segment.flush()
+            if self._hnsw is not None:
+                self._hnsw_changed()
+                self._hnsw.add(embeddings, keys)
+
+            # The rows only exist once they are counted in the meta table
+            segment = replace(segment, count=end)
+            with self._db_lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO nodes (key, node_id) VALUES (?, ?)",
+                    zip(keys.tolist(), node_ids, strict=True),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                    self._meta_rows(segment, next_key=next_key + len(nodes)),
+                )
+            self._segment = segment
+        return node_ids
+
+    def _delete_keys(self, segment: _Segment, keys: list[int]) -> None:
+        if not keys or segment.count == 0:
+            return
+        rows = np.flatnonzero(
+            np.isin(segment.keys[: segment.count], keys)
+            & (segment.live[: segment.count] != 0)
+        )
+        self._delete_rows(segment, rows)
+
+    def _delete_rows(self, segment: _Segment, rows: npt.NDArray[np.intp]) -> None:
+        if len(rows) == 0:
+            return
+        segment.live[rows] = 0
+        segment.live.flush()
+        if self._hnsw is not None:
+            self._hnsw_changed()
+            self._hnsw.delete(segment.keys[rows])
+        keys = segment.keys[rows].tolist()
+        with self._db_lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM nodes WHERE key = ?", [(key,) for key in keys]
+            )
+            self._version = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('version', ?)",
+                (self._version,),
+            )
+        self._deleted += len(rows)
+        self._maybe_compact()
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self.delete_ref_docs([ref_doc_id])
+
+    def delete_ref_docs(self, ref_doc_ids: list[str]) -> None:
+        """Delete the nodes of all the given ref docs at once.
+
+        Args:
+            ref_doc_ids: List[str]: ids of the documents to delete
+        """
+        with self._locked():
+            self._reload()
+            segment = self._segment
+            if not ref_doc_ids or segment is None:
+                return
+            codes = list(self._codes("doc_id", ref_doc_ids).values())
+            if not codes:
+                return
+            rows = np.flatnonzero(
+                np.isin(segment.columns["doc_id"][: segment.count], codes)
+                & (segment.live[: segment.count] != 0)
+            )
+            self._delete_rows(segment, rows)
+
+    def persist(self, persist_path: str, fs: Any | None = None) -> None:
+        """Save the HNSW graph, the rows are saved in `persist_dir` on every change."""
+        self._save_hnsw()
+
+    def close(self) -> None:
+        """Wait for the compaction, save the HNSW graph and close the side table.
+
+        The searches still running keep reading the mapped files.
+        """
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join()
+        self._save_hnsw()
+        with self._write_lock, self._db_lock:
+            self._conn.close()
+            self._lock_file.close()
+
+    # Compaction
+
+    def _maybe_compact(self) -> None:
+        segment = self._segment
+        if segment is None or segment.count < MIN_COMPACTION_ROWS:
+            return
+        if self._deleted <= self.compaction_ratio * segment.count:
+            return
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(
+            target=self.compact, name="local-vector-store-compaction", daemon=True
+        )
+        self._compaction_thread.start()
+
+    def compact(self) -> None:
+        """Rewrite the live rows in a new generation of the files.
+
+        Writes wait for the compaction, searches keep using the previous
+        generation until it is done.
+        """
+        try:
+            with self._locked():
+                self._reload()
+                segment = self._segment
+                if segment is None or self._deleted == 0:
+                    return
+                rows = np.flatnonzero(segment.live[: segment.count])
+                logger.info(
+                    "Compacting local vector store, dropping count=%s deleted rows",
+                    segment.count - len(rows),
+                )
+                compacted = self._map(
+                    segment.generation + 1,
+                    len(rows),
+                    max(len(rows), _MIN_CAPACITY),
+                    segment.vectors.shape[1],
+                )
+                for i in range(0, len(rows), _CHUNK_ROWS):
+                    chunk = rows[i : i + _CHUNK_ROWS]
+                    target = slice(i, i + len(chunk))
+                    compacted.vectors[target] = segment.vectors[chunk]
+                    compacted.keys[target] = segment.keys[chunk]
+                    for field, column in compacted.columns.items():
+                        column[target] = segment.columns[field][chunk]
+                compacted.live[: len(rows)] = 1
+                compacted.flush()
+                self._save_meta(compacted)
+                self._segment = compacted
+                self._deleted = 0
+                # The searches still mapping the old files keep reading them
+                for name in self._column_specs(segment.vectors.shape[1]):
+                    self._path(name, segment.generation).unlink(missing_ok=True)
+        except Exception:
+            logger.exception("Failed to compact the local vector store")
+
+    # Search
+
+    def _filter_mask(
+        self, segment: _Segment, filter_: MetadataFilter | MetadataFilters
+    ) -> npt.NDArray[np.bool_]:
+        count = segment.count
+        if isinstance(filter_, MetadataFilters):
+            masks = [self._filter_mask(segment, f) for f in filter_.filters]
+            if not masks:
+                return np.ones(count, dtype=bool)
+            reduce = (
+                np.logical_or.reduce
+                if filter_.condition == FilterCondition.OR
+                else np.logical_and.reduce
+            )
+            return cast(npt.NDArray[np.bool_], reduce(masks))
+
+        if filter_.key not in FILTER_FIELDS:
+            raise ValueError(
+                f"Cannot filter on {filter_.key}, only on {', '.join(FILTER_FIELDS)}"
+            )
+        values = filter_.value if isinstance(filter_.value, list) else [filter_.value]
+        codes = list(
+            self._codes(filter_.key, [str(value) for value in values]).values()
+        )
+        matches = np.isin(segment.columns[filter_.key][:count], codes)
+        match filter_.operator:
+            case FilterOperator.EQ | FilterOperator.IN:
+                return matches
+            case FilterOperator.NE | FilterOperator.NIN:
+                return ~matches
+            case _:
+                raise ValueError(f"Filter operator {filter_.operator} not supported")
+
+    def _candidates(
+        self, segment: _Segment, query: VectorStoreQuery
+    ) -> npt.NDArray[np.bool_] | None:
+        """Mask of the rows matching the query, None if all the live rows do."""
+        mask: npt.NDArray[np.bool_] | None = None
+
+        def restrict(rows_mask: npt.NDArray[np.bool_]) -> None:
+            nonlocal mask
+            mask = rows_mask if mask is None else mask & rows_mask
+
+        count = segment.count
+        if query.doc_ids is not None:
+            codes = list(self._codes("doc_id", query.doc_ids).values())
+            restrict(np.isin(segment.columns["doc_id"][:count], codes))
+        if query.node_ids is not None:
+            keys = self._keys_of_nodes(query.node_ids)
+            restrict(np.isin(segment.keys[:count], keys))
+        if query.filters is not None:
+            restrict(self._filter_mask(segment, query.filters))
+        if self._deleted or mask is not None:
+            restrict(segment.live[:count] != 0)
+        return mask
+
+    def _scores(
+        self, vectors: npt.NDArray[np.floating[Any]], query: npt.NDArray[np.float32]
+    ) -> npt.NDArray[np.float32]:
+        if vectors.dtype == np.float32:
+            return vectors @ query
+        # No BLAS for float16, the vectors are converted a chunk at a time
+        scores = np.empty(len(vectors), dtype=np.float32)
+        for i in range(0, len(vectors), _CHUNK_ROWS):
+            scores[i : i + _CHUNK_ROWS] = (
+                vectors[i : i + _CHUNK_ROWS].astype(np.float32) @ query
+            )
+        return scores
+
+    def _search(
+        self,
+        segment: _Segment,
+        query_embedding: npt.NDArray[np.float32],
+        top_k: int,
+        mask: npt.NDArray[np.bool_] | None,
+    ) -> tuple[npt.NDArray[np.intp], npt.NDArray[np.float32]]:
+        """Rows and similarities of the `top_k` rows of `mask` closest to the query."""
+        if mask is not None:
+            rows = np.flatnonzero(mask)
+            if len(rows) < _GATHER_RATIO * segment.count:
+                scores = self._scores(segment.vectors[rows], query_embedding)
+            else:
+                rows = None  # type: ignore[assignment]
+                scores = self._scores(segment.vectors[: segment.count], query_embedding)
+                scores[~mask] = -np.inf
+                top_k = min(top_k, int(np.count_nonzero(mask)))
+        else:
+            rows = None  # type: ignore[assignment]
+            scores = self._scores(segment.vectors[: segment.count], query_embedding)
+
+        top_k = min(top_k, len(scores))
+        if top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return (top if rows is None else rows[top]), scores[top]
+
+    def _approximate_search(
+        self,
+        segment: _Segment,
+        query_embedding: npt.NDArray[np.float32],
+        top_k: int,
+        mask: npt.NDArray[np.bool_] | None,
+        filtered: bool,
+    ) -> tuple[npt.NDArray[np.intp], npt.NDArray[np.float32]] | None:
+        """Search the HNSW graph, None if the search should be exact instead."""
+        if self._hnsw is None or segment.count <= self.exact_search_max_rows:
+            return None
+        if not filtered or mask is None:
+            # The deleted rows are deleted from the graph too
+            return self._hnsw_search(
+                segment, query_embedding, top_k, self.hnsw_ef_search, None, mask
+            )
+
+        matching = int(np.count_nonzero(mask))
+        if matching <= self.exact_search_max_rows:
+            return None
+        top_k = min(top_k, matching)
+        # Unless the filter is selective, the closest vectors of the whole graph
+        # hold enough matching ones
+        overfetch = int(np.ceil(2 * top_k * segment.count / matching))
+        if overfetch <= _MAX_OVERFETCH:
+            found = self._hnsw_search(
+                segment,
+                query_embedding,
+                overfetch,
+                max(self.hnsw_ef_search, overfetch),
+                None,
+                mask,
+            )
+            if found is not None and len(found[0]) >= top_k:
+                return found[0][:top_k], found[1][:top_k]
+
+        # Otherwise the graph is walked through the non-matching vectors, the
+        # fewer rows match, the more candidates are explored to find them
+        keys = segment.keys[: segment.count]
+
+        def filter_(key: int) -> bool:
+            row = int(np.searchsorted(keys, key))
+            return row < len(keys) and keys[row] == key and bool(mask[row])
+
+        ef = min(
+            int(self.hnsw_ef_search * segment.count / matching),
+            16 * self.hnsw_ef_search,
+        )
+        return self._hnsw_search(segment, query_embedding, top_k, ef, filter_, mask)
+
+    def _hnsw_search(
+        self,
+        segment: _Segment,
+        query_embedding: npt.NDArray[np.float32],
+        top_k: int,
+        ef: int,
+        filter_: Callable[[int], bool] | None,
+        mask: npt.NDArray[np.bool_] | None,
+    ) -> tuple[npt.NDArray[np.intp], npt.NDArray[np.float32]] | None:
+        try:
+            found_keys, similarities = self._hnsw.search(
+                query_embedding, top_k, ef, filter_
+            )
+        except RuntimeError:
+            logger.debug("HNSW search found less than top_k=%s vectors", top_k)
+            return None
+        # The graph may have changed since `segment` was taken
+        keys = segment.keys[: segment.count]
+        rows = np.minimum(np.searchsorted(keys, found_keys), len(keys) - 1)
+        valid = (keys[rows] == found_keys) & (
+            segment.live[rows] != 0 if mask is None else mask[rows]
+        )
+        return rows[valid], similarities[valid]
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.query_embedding is None:
+            raise ValueError("Query embedding is required")
+        self._refresh()
+        segment = self._segment
+        if segment is None or segment.count == 0:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+
+        query_embedding = np.asarray(query.query_embedding, dtype=np.float32)
+        if len(query_embedding) != segment.vectors.shape[1]:
+            raise ValueError(
+                f"Cannot search embeddings of {segment.vectors.shape[1]} dimensions "
+                f"with a query of {len(query_embedding)} dimensions"
+            )
+        query_embedding /= max(float(np.linalg.norm(query_embedding)), 1e-12)
+
+        mask = self._candidates(segment, query)
+        filtered = (
+            query.doc_ids is not None
+            or query.node_ids is not None
+            or query.filters is not None
+        )
+        found = self._approximate_search(
+            segment, query_embedding, query.similarity_top_k, mask, filtered
+        )
+        rows, similarities = found or self._search(
+            segment, query_embedding, query.similarity_top_k, mask
+        )
+        keys = segment.keys[rows].tolist()
+        node_ids = self._node_ids(keys)
+        # A node deleted since the search started has no id anymore
+        kept = [i for i, key in enumerate(keys) if key in node_ids]
+        return VectorStoreQueryResult(
+            nodes=None,
+            similarities=[float(similarities[i]) for i in kept],
+            ids=[node_ids[keys[i]] for i in kept],
+        )
@@ -0,0 +1,475 @@
+import hashlib
+import heapq
+import logging
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+logger = logging.getLogger(__name__)
+
+# Tenant ids used as is in the names of the shards, the others are hashed
+_PLAIN_TENANT = re.compile(r"[a-z0-9]{1,32}")
+
+
+def shard_name(base_name: str, tenant_field: str, tenant: str | None) -> str:
+    """Name of the shard (collection, table...) of the nodes of a tenant.
+
+    The nodes without tenant stay in the `base_name` shard. The names are made
+    of lowercase alphanumeric characters and underscores, valid for all the
+    databases: the tenant ids which are not short lowercase alphanumeric
+    strings are hashed.
+    """
+    if tenant is None:
+        return base_name
+    if _PLAIN_TENANT.fullmatch(tenant) is None:
+        tenant = "h_" + hashlib.sha256(tenant.encode()).hexdigest()[:16]
+    return f"{base_name}_{tenant_field}_{tenant}"
+
+
+@dataclass(frozen=True)
+class ShardBackend:
+    """The shards of a database: how they are opened, listed and dropped.
+
+    Opening a shard does not have to create it, the vector stores create their
+    collection (or table) on the first insert.
+    """
+
+    # Name of the shard of the nodes without tenant, the only shard when the
+    # vector store is not sharded
+    base_name: str
+    open: Callable[[str], BasePydanticVectorStore]
+    # Names of all the shards of the database, of other stores included
+    names: Callable[[], Iterable[str]]
+    # Whether a shard exists, without listing all of them
+    exists: Callable[[str], bool]
+    drop: Callable[[str], None]
+    stores_text: bool = True
+    # Client shared by the shards, if any
+    client: Any = None
+
+
+def close_store(store: BasePydanticVectorStore) -> None:
+    close = getattr(store, "close", None)
+    if close is not None:
+        close()
+
+
+def qdrant_shards(base_name: str, client: Any, **store_kwargs: Any) -> ShardBackend:
+    """Shards in collections of Qdrant, with `BatchedQdrantVectorStore` kwargs."""
+    from sonar_labs.components.vector_store.batched_qdrant import (
+        BatchedQdrantVectorStore,
+    )
+
+    return ShardBackend(
+        base_name=base_name,
+        open=lambda name: BatchedQdrantVectorStore(
+            client=client, collection_name=name, **store_kwargs
+        ),
+        names=lambda: [
+            collection.name for collection in client.get_collections().collections
+        ],
+        exists=lambda name: client.collection_exists(name),
+        drop=lambda name: client.delete_collection(name),
+        client=client,
+    )
+
+
+def chroma_shards(base_name: str, chroma_client: Any) -> ShardBackend:
+    """Shards in collections of ChromaDB."""
+    from sonar_labs.components.vector_store.batched_chroma import (
+        BatchedChromaVectorStore,
+    )
+
+    def exists(name: str) -> bool:
+        try:
+            chroma_client.get_collection(name)
+        except Exception:
+            # ValueError, or InvalidCollectionException since chromadb 0.5
+            return False
+        return True
+
+    return ShardBackend(
+        base_name=base_name,
+        open=lambda name: BatchedChromaVectorStore(
+            chroma_client=chroma_client,
+            chroma_collection=chroma_client.get_or_create_collection(name),
+        ),
+        # Collections before chromadb 0.6, their names since
+        names=lambda: [
+            getattr(collection, "name", collection)
+            for collection in chroma_client.list_collections()
+        ],
+        exists=exists,
+        drop=lambda name: chroma_client.delete_collection(name),
+        client=chroma_client,
+    )
+
+
+def postgres_shards(
+    base_name: str, connection: dict[str, Any], embed_dim: int
+) -> ShardBackend:
+    """Shards in tables of Postgres, `connection` being the `postgres` settings.
+
+    `PGVectorStore` stores the nodes of the `table_name` in the `data_{table_name}`
+    table.
+    """
+    import sqlalchemy
+    from llama_index.vector_stores.postgres import PGVectorStore  # type: ignore
+    from sqlalchemy.engine import URL
+
+    schema = connection.get("schema_name", "public")
+    engine = sqlalchemy.create_engine(
+        URL.create(
+            "postgresql+psycopg2",
+            username=connection.get("user"),
+            password=connection.get("password"),
+            host=connection.get("host"),
+            port=connection.get("port"),
+            database=connection.get("database"),
+        )
+    )
+
+    def names() -> list[str]:
+        with engine.connect() as db:
+            tables = db.execute(
+                sqlalchemy.text(
+                    "SELECT table_name FROM information_schema.tables "
+                    "WHERE table_schema = :schema"
+                ),
+                {"schema": schema},
+            )
+            return [
+                table.removeprefix("data_")
+                for (table,) in tables
+                if table.startswith("data_")
+            ]
+
+    def exists(name: str) -> bool:
+        with engine.connect() as db:
+            table = db.execute(
+                sqlalchemy.text(
+                    "SELECT 1 FROM information_schema.tables "
+                    "WHERE table_schema = :schema AND table_name = :table"
+                ),
+                {"schema": schema, "table": f"data_{name}"},
+            )
+            return table.first() is not None
+
+    def drop(name: str) -> None:
+        with engine.begin() as db:
+            db.execute(
+                sqlalchemy.text(f'DROP TABLE IF EXISTS "{schema}"."data_{name}"')
+            )
+
+    return ShardBackend(
+        base_name=base_name,
+        open=lambda name: PGVectorStore.from_params(
+            **connection, table_name=name, embed_dim=embed_dim
+        ),
+        names=names,
+        exists=exists,
+        drop=drop,
+    )
+
+
+def local_shards(base_dir: Path, shards_dir: Path, **store_kwargs: Any) -> ShardBackend:
+    """Shards in directories of `LocalVectorStore`, with its kwargs.
+
+    The shard of the nodes without tenant is `base_dir`, the shards of the
+    tenants are in `shards_dir`.
+    """
+    from sonar_labs.components.vector_store.local_vector_store import (
+        LocalVectorStore,
+    )
+
+    def path(name: str) -> Path:
+        return base_dir if name == base_dir.name else shards_dir / name
+
+    def names() -> list[str]:
+        shards = [base_dir.name] if (base_dir / "index.sqlite").exists() else []
+        if shards_dir.is_dir():
+            shards.extend(shard.name for shard in shards_dir.iterdir())
+        return shards
+
+    return ShardBackend(
+        base_name=base_dir.name,
+        open=lambda name: LocalVectorStore(persist_dir=str(path(name)), **store_kwargs),
+        names=names,
+        exists=lambda name: (path(name) / "index.sqlite").exists(),
+        drop=lambda name: shutil.rmtree(path(name), ignore_errors=True),
+        stores_text=False,
+    )
+
+
+@dataclass
+class _Shard:
+    store: BasePydanticVectorStore
+    # Operations running on the store, which is not closed meanwhile
+    users: int = 0
+
+
+class ShardedVectorStore(BasePydanticVectorStore):
+    """Vector store of a shard (collection, table...) per tenant.
+
+    The nodes are routed to the shard of their `tenant_field` metadata value
+    (see `shard_name`), the nodes without one to the `base_name` shard. The
+    searches of a tenant only go to its shard: the big tenants do not slow down
+    the searches of the small ones, and dropping the shard of a tenant deletes
+    all its nodes at once. The searches without tenant go to all the shards.
+
+    The shards are opened on demand, and at most `max_open_shards` are kept
+    open: the least recently used ones are closed, once they are not in use.
+    """
+
+    stores_text: bool = True
+    base_name: str = Field(description="Name of the shard of the nodes without tenant.")
+    tenant_field: str = Field(description="Metadata field of the tenant of the nodes.")
+    max_open_shards: int = Field(
+        default=64, description="Number of shards kept open at most."
+    )
+
+    _backend: ShardBackend = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+    _shards: "OrderedDict[str, _Shard]" = PrivateAttr()
+    # Names of the shards known to exist
+    _names: set[str] = PrivateAttr()
+
+    def __init__(self, backend: ShardBackend, **kwargs: Any) -> None:
+        kwargs = {
+            "base_name": backend.base_name,
+            "stores_text": backend.stores_text,
+            **kwargs,
+        }
+        super().__init__(**kwargs)
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._shards = OrderedDict()
+        self._names = set()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ShardedVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return self._backend.client
+
+    # Shards
+
+    def tenant_of(self, metadata: dict[str, Any]) -> str | None:
+        tenant = metadata.get(self.tenant_field)
+        return None if tenant is None else str(tenant)
+
+    def shard_name(self, tenant: str | None) -> str:
+        return shard_name(self.base_name, self.tenant_field, tenant)
+
+    def shard_names(self) -> list[str]:
+        """Names of the existing shards, listed from the database."""
+        prefix = f"{self.base_name}_{self.tenant_field}_"
+        names = {
+            name
+            for name in self._backend.names()
+            if name == self.base_name or name.startswith(prefix)
+        }
+        with self._lock:
+            self._names = names
+        return sorted(names)
+
+    def _exists(self, name: str) -> bool:
+        with self._lock:
+            if name in self._names or name in self._shards:
+                return True
+        # Created by another process, or not at all: probed, not listed
+        if not self._backend.exists(name):
+            return False
+        with self._lock:
+            self._names.add(name)
+        return True
+
+    def _acquire(self, name: str) -> _Shard | None:
+        with self._lock:
+            shard = self._shards.get(name)
+            if shard is not None:
+                self._shards.move_to_end(name)
+                shard.users += 1
+            return shard
+
+    def _release(self, shard: _Shard) -> None:
+        with self._lock:
+            shard.users -= 1
+
+    @contextmanager
+    def _lease(self, name: str) -> Iterator[BasePydanticVectorStore]:
+        """The store of the shard, opened if needed, not closed while in use."""
+        shard = self._acquire(name)
+        if shard is None:
+            store = self._backend.open(name)
+            with self._lock:
+                shard = self._shards.setdefault(name, _Shard(store))
+                self._shards.move_to_end(name)
+                shard.users += 1
+            if shard.store is not store:
+                # Opened by another thread meanwhile
+                close_store(store)
+            self._evict()
+        try:
+            yield shard.store
+        finally:
+            self._release(shard)
+
+    def _evict(self) -> None:
+        evicted = []
+        with self._lock:
+            idle = [name for name, shard in self._shards.items() if shard.users == 0]
+            for name in idle[: max(len(self._shards) - self.max_open_shards, 0)]:
+                evicted.append(self._shards.pop(name))
+        for shard in evicted:
+            close_store(shard.store)
+        if evicted:
+            logger.debug("Closed count=%s least recently used shards", len(evicted))
+
+    def drop_tenant(self, tenant: str) -> None:
+        """Delete all the nodes of the tenant, dropping its shard.
+
+        The operations on the shard running meanwhile may fail.
+        """
+        name = self.shard_name(tenant)
+        with self._lock:
+            shard = self._shards.pop(name, None)
+            self._names.discard(name)
+        if shard is not None:
+            close_store(shard.store)
+        logger.info("Dropping the shard %s of tenant %s", name, tenant)
+        self._backend.drop(name)
+
+    # Vector store
+
+    def add(self, nodes: list[BaseNode], **add_kwargs: Any) -> list[str]:
+        shard_nodes: dict[str, list[BaseNode]] = {}
+        for node in nodes:
+            name = self.shard_name(self.tenant_of(node.metadata))
+            shard_nodes.setdefault(name, []).append(node)
+        ids: dict[str, str] = {}
+        for name, nodes_of_shard in shard_nodes.items():
+            with self._lease(name) as store:
+                added = store.add(nodes_of_shard, **add_kwargs)
+            with self._lock:
+                self._names.add(name)
+            ids.update(
+                zip((node.node_id for node in nodes_of_shard), added, strict=True)
+            )
+        return [ids[node.node_id] for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self.delete_ref_docs([ref_doc_id])
+
+    def delete_ref_docs(
+        self,
+        ref_doc_ids: list[str],
+        ref_doc_metadata: dict[str, dict[str, Any]] | None = None,
+    ) -> None:
+        """Delete the nodes of the ref docs from the shards of their tenants.
+
+        Args:
+            ref_doc_ids: List[str]: ids of the documents to delete
+            ref_doc_metadata: metadata of the documents, giving their tenant. The
+                documents missing from it are deleted from all the shards.
+        """
+        ref_doc_metadata = ref_doc_metadata or {}
+        shard_docs: dict[str, list[str]] = {}
+        unknown = []
+        for doc_id in ref_doc_ids:
+            metadata = ref_doc_metadata.get(doc_id)
+            if metadata is None:
+                unknown.append(doc_id)
+            else:
+                name = self.shard_name(self.tenant_of(metadata))
+                shard_docs.setdefault(name, []).append(doc_id)
+        if unknown:
+            for name in self.shard_names():
+                shard_docs.setdefault(name, []).extend(unknown)
+        for name, doc_ids in shard_docs.items():
+            if not self._exists(name):
+                continue
+            with self._lease(name) as store:
+                delete_ref_docs = getattr(store, "delete_ref_docs", None)
+                if delete_ref_docs is not None:
+                    delete_ref_docs(doc_ids)
+                else:
+                    for doc_id in doc_ids:
+                        store.delete(doc_id)
+
+    def query(
+        self, query: VectorStoreQuery, tenant: str | None = None, **kwargs: Any
+    ) -> VectorStoreQueryResult:
+        """Search the shard of the `tenant`, or all the shards without one."""
+        if tenant is not None:
+            names = [self.shard_name(tenant)]
+        else:
+            names = self.shard_names()
+            logger.debug("Searching all the count=%s shards", len(names))
+        results = []
+        for name in names:
+            if not self._exists(name):
+                continue
+            with self._lease(name) as store:
+                results.append(store.query(query, **kwargs))
+        return _merge_results(results, query.similarity_top_k)
+
+    def persist(self, persist_path: str, fs: Any | None = None) -> None:
+        with self._lock:
+            names = list(self._shards)
+        for name in names:
+            shard = self._acquire(name)
+            if shard is None:
+                continue
+            try:
+                shard.store.persist(persist_path, fs=fs)
+            finally:
+                self._release(shard)
+
+    def close(self) -> None:
+        """Close the open shards, the shared client is left open."""
+        with self._lock:
+            shards = list(self._shards.values())
+            self._shards.clear()
+        for shard in shards:
+            close_store(shard.store)
+
+
+def _merge_results(
+    results: list[VectorStoreQueryResult], top_k: int
+) -> VectorStoreQueryResult:
+    """The `top_k` most similar results of the searches of several shards."""
+    if len(results) == 1:
+        return results[0]
+    stores_nodes = any(result.nodes is not None for result in results)
+    hits: list[tuple[float, str, Any]] = []
+    for result in results:
+        ids = result.ids or []
+        similarities = result.similarities or [0.0] * len(ids)
+        nodes: Sequence[BaseNode | None] = result.nodes or [None] * len(ids)
+        hits.extend(zip(similarities, ids, nodes, strict=True))
+    best = heapq.nlargest(top_k, hits, key=lambda hit: hit[0])
+    return VectorStoreQueryResult(
+        nodes=[node for _, _, node in best] if stores_nodes else None,
+        similarities=[similarity for similarity, _, _ in best],
+        ids=[node_id for _, node_id, _ in best],
+    )
@@ -0,0 +1,114 @@
+import logging
+from typing import Any, Literal
+
+import numpy as np
+import numpy.typing as npt
+from llama_index.core.base.embeddings.base import Embedding
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.schema import (
+    BaseNode,
+    NodeWithScore,
+    QueryBundle,
+    TransformComponent,
+)
+
+from sonar_labs.components.vector_store.docstore_retriever import (
+    DocstoreVectorIndexRetriever,
+)
+
+logger = logging.getLogger(__name__)
+
+VectorPrecision = Literal["float32", "float16", "int8"]
+
+
+def truncate_embeddings(
+    embeddings: npt.NDArray[np.float32], dimensions: int
+) -> npt.NDArray[np.float32]:
+    """First `dimensions` values of the embeddings, normalized again.
+
+    Matryoshka embedding models concentrate the information in the first
+    dimensions: the truncated embeddings are smaller, and still comparable with
+    a cosine similarity.
+    """
+    truncated = embeddings[..., :dimensions]
+    normalized: npt.NDArray[np.float32] = truncated / np.clip(
+        np.linalg.norm(truncated, axis=-1, keepdims=True), 1e-12, None
+    )
+    return normalized
+
+
+class VectorCompaction(TransformComponent):
+    """Transformation shrinking the embeddings of the nodes, after they are embedded.
+
+    The embeddings are truncated to `dimensions`, if set. The precision is not
+    changed here: the vector store stores the vectors in reduced precision (see
+    `vectorstore.vector_precision`), when it supports it.
+
+    The queries must be compacted the same way, see `compact_query`.
+    """
+
+    dimensions: int | None = Field(
+        default=None,
+        description="Number of dimensions the embeddings are truncated to.",
+    )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "VectorCompaction"
+
+    def compact(self, embeddings: list[Embedding]) -> list[Embedding]:
+        if self.dimensions is None or not embeddings:
+            return embeddings
+        if self.dimensions > len(embeddings[0]):
+            raise ValueError(
+                f"Cannot truncate embeddings of {len(embeddings[0])} dimensions "
+                f"to {self.dimensions}"
+            )
+        compacted: list[Embedding] = truncate_embeddings(
+            np.asarray(embeddings, dtype=np.float32), self.dimensions
+        ).tolist()
+        return compacted
+
+    def compact_query(self, embedding: Embedding) -> Embedding:
+        return self.compact([embedding])[0]
+
+    def __call__(self, nodes: list[BaseNode], **kwargs: Any) -> list[BaseNode]:
+        embedded = [node for node in nodes if node.embedding is not None]
+        compacted = self.compact([node.embedding for node in embedded])  # type: ignore[misc]
+        for node, embedding in zip(embedded, compacted, strict=True):
+            node.embedding = embedding
+        return nodes
+
+
+class CompactingVectorIndexRetriever(DocstoreVectorIndexRetriever):
+    """Retriever compacting the query embeddings like the stored embeddings."""
+
+    def __init__(self, compaction: VectorCompaction, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._compaction = compaction
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        if query_bundle.embedding is None and query_bundle.embedding_strs:
+            query_bundle.embedding = self._embed_model.get_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+        if query_bundle.embedding is not None:
+            query_bundle.embedding = self._compaction.compact_query(
+                query_bundle.embedding
+            )
+        nodes: list[NodeWithScore] = super()._retrieve(query_bundle)
+        return nodes
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        if query_bundle.embedding is None and query_bundle.embedding_strs:
+            query_bundle.embedding = (
+                await self._embed_model.aget_agg_embedding_from_queries(
+                    query_bundle.embedding_strs
+                )
+            )
+        if query_bundle.embedding is not None:
+            query_bundle.embedding = self._compaction.compact_query(
+                query_bundle.embedding
+            )
+        nodes: list[NodeWithScore] = await super()._aretrieve(query_bundle)
+        return nodes
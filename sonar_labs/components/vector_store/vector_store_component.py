@@ -3,21 +3,61 @@ import typing
 
 from injector import inject, singleton
 from llama_index.core.indices.vector_store import VectorIndexRetriever, VectorStoreIndex
+from llama_index.core.storage import StorageContext
+from llama_index.core.storage.docstore import BaseDocumentStore
 from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
     FilterCondition,
     MetadataFilter,
     MetadataFilters,
-    VectorStore,
     FilterOperator
 )
 
+from sonar_labs.components.vector_store.docstore_retriever import (
+    DocstoreVectorIndexRetriever,
+)
+from sonar_labs.components.vector_store.sharded_vector_store import (
+    ShardedVectorStore,
+    chroma_shards,
+    close_store,
+    local_shards,
+    postgres_shards,
+    qdrant_shards,
+)
+from sonar_labs.components.vector_store.vector_compaction import (
+    CompactingVectorIndexRetriever,
+    VectorCompaction,
+)
 from sonar_labs.open_ai.extensions.context_filter import ContextFilter
 from sonar_labs.paths import local_data_path
-from sonar_labs.settings.settings import Settings
+from sonar_labs.settings.settings import QdrantSettings, Settings
 
 logger = logging.getLogger(__name__)
 
 
+# `QdrantSettings` fields configuring the vector store, not the client
+QDRANT_STORE_FIELDS = {
+    "upsert_batch_size",
+    "upsert_parallel",
+    "on_disk",
+    "quantization_always_ram",
+    "hnsw_m",
+    "hnsw_ef_construct",
+    "search_hnsw_ef",
+    "search_rescore",
+    "search_oversampling",
+}
+
+
+# Metadata field of the tenant of the nodes, per `vectorstore.tenancy`
+TENANT_FIELDS = {"org": "org_id", "project": "project_id"}
+
+
+def qdrant_client_kwargs(qdrant_settings: QdrantSettings) -> dict[str, typing.Any]:
+    """Keyword arguments of the `QdrantClient` of the `qdrant` settings."""
+    return qdrant_settings.model_dump(exclude_none=True, exclude=QDRANT_STORE_FIELDS)
+
+
 def _doc_id_metadata_filter(
     context_filter: ContextFilter | None,
 ) -> MetadataFilters:
@@ -49,15 +89,32 @@ def _doc_id_metadata_filter(
 @singleton
 class VectorStoreComponent:
     settings: Settings
-    vector_store: VectorStore
+    vector_store: BasePydanticVectorStore
+    # Transformation of the embeddings before they are stored, if any. The
+    # queries are transformed alike by the retrievers.
+    compaction: VectorCompaction | None = None
+    # Keyword arguments of the `vector_store.query` of the retrievers, if any
+    vector_store_kwargs: dict[str, typing.Any] | None = None
 
     @inject
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
+        if settings.vectorstore.truncate_dimensions:
+            self.compaction = VectorCompaction(dimensions=settings.embedding.embed_dim)
+        precision = settings.vectorstore.vector_precision
+        if precision != "float32" and not (
+            (settings.vectorstore.database == "qdrant" and precision == "int8")
+            or (settings.vectorstore.database == "local" and precision == "float16")
+        ):
+            logger.warning(
+                "vector_precision=%s is not supported by database=%s, using float32",
+                settings.vectorstore.vector_precision,
+                settings.vectorstore.database,
+            )
         match settings.vectorstore.database:
             case "postgres":
                 try:
-                    from llama_index.vector_stores.postgres import (  # type: ignore
+                    from llama_index.vector_stores.postgres import (  # type: ignore # noqa: F401
                         PGVectorStore,
                     )
                 except ImportError as e:
@@ -70,13 +127,10 @@ class VectorStoreComponent:
                         "Postgres settings not found. Please provide settings."
                     )
 
-                self.vector_store = typing.cast(
-                    VectorStore,
-                    PGVectorStore.from_params(
-                        **settings.postgres.model_dump(exclude_none=True),
-                        table_name="embeddings",
-                        embed_dim=settings.embedding.embed_dim,
-                    ),
+                backend = postgres_shards(
+                    "embeddings",
+                    settings.postgres.model_dump(exclude_none=True),
+                    embed_dim=settings.embedding.embed_dim,
                 )
 
             case "chroma":
@@ -86,7 +140,7 @@ class VectorStoreComponent:
                         Settings as ChromaSettings,
                     )
 
-                    from sonar_labs.components.vector_store.batched_chroma import (
+                    from sonar_labs.components.vector_store.batched_chroma import (  # noqa: F401
                         BatchedChromaVectorStore,
                     )
                 except ImportError as e:
@@ -99,23 +153,16 @@ class VectorStoreComponent:
                     path=str((local_data_path / "chroma_db").absolute()),
                     settings=chroma_settings,
                 )
-                chroma_collection = chroma_client.get_or_create_collection(
-                    "sonar_labs"
-                )  # TODO
-
-                self.vector_store = typing.cast(
-                    VectorStore,
-                    BatchedChromaVectorStore(
-                        chroma_client=chroma_client, chroma_collection=chroma_collection
-                    ),
-                )
+                backend = chroma_shards("sonar_labs", chroma_client)  # TODO
 
             case "qdrant":
                 try:
-                    from llama_index.vector_stores.qdrant import (  # type: ignore
-                        QdrantVectorStore,
-                    )
                     from qdrant_client import QdrantClient  # type: ignore
+                    from qdrant_client.http import models as rest  # type: ignore
+
+                    from sonar_labs.components.vector_store.batched_qdrant import (  # noqa: F401
+                        BatchedQdrantVectorStore,
+                    )
                 except ImportError as e:
                     raise ImportError(
                         "Qdrant dependencies not found, install with `poetry install --extras vector-stores-qdrant`"
@@ -126,17 +173,53 @@ class VectorStoreComponent:
                         "Qdrant config not found. Using default settings."
                         "Trying to connect to Qdrant at localhost:6333."
                     )
+                    qdrant_settings = QdrantSettings.model_validate({})
                     client = QdrantClient()
                 else:
-                    client = QdrantClient(
-                        **settings.qdrant.model_dump(exclude_none=True)
+                    qdrant_settings = settings.qdrant
+                    client = QdrantClient(**qdrant_client_kwargs(qdrant_settings))
+                is_local = qdrant_settings.path is not None or (
+                    qdrant_settings.location == ":memory:"
+                )
+                hnsw_config = (
+                    rest.HnswConfigDiff(
+                        m=qdrant_settings.hnsw_m,
+                        ef_construct=qdrant_settings.hnsw_ef_construct,
+                    )
+                    if qdrant_settings.hnsw_m is not None
+                    or qdrant_settings.hnsw_ef_construct is not None
+                    else None
+                )
+                backend = qdrant_shards(
+                    "sonar_labs",  # TODO
+                    client,
+                    vector_precision=settings.vectorstore.vector_precision,
+                    on_disk=qdrant_settings.on_disk,
+                    quantization_always_ram=qdrant_settings.quantization_always_ram,
+                    hnsw_config=hnsw_config,
+                    batch_size=qdrant_settings.upsert_batch_size,
+                    parallel=1 if is_local else qdrant_settings.upsert_parallel,
+                )
+                self.vector_store_kwargs = {
+                    "search_params": rest.SearchParams(
+                        hnsw_ef=qdrant_settings.search_hnsw_ef,
+                        quantization=rest.QuantizationSearchParams(
+                            rescore=qdrant_settings.search_rescore,
+                            oversampling=qdrant_settings.search_oversampling,
+                        ),
                     )
-                self.vector_store = typing.cast(
-                    VectorStore,
-                    QdrantVectorStore(
-                        client=client,
-                        collection_name="sonar_labs",
-                    ),  # TODO
+                }
+            case "local":
+                backend = local_shards(
+                    local_data_path / "local_vector_store",
+                    local_data_path / "local_vector_store_shards",
+                    precision="float16" if precision == "float16" else "float32",
+                    compaction_ratio=settings.local_vectorstore.compaction_ratio,
+                    index=settings.local_vectorstore.index,
+                    hnsw_m=settings.local_vectorstore.hnsw_m,
+                    hnsw_ef_construction=settings.local_vectorstore.hnsw_ef_construction,
+                    hnsw_ef_search=settings.local_vectorstore.hnsw_ef_search,
+                    exact_search_max_rows=settings.local_vectorstore.exact_search_max_rows,
                 )
             case _:
                 # Should be unreachable
@@ -145,6 +228,34 @@ class VectorStoreComponent:
                     f"Vectorstore database {settings.vectorstore.database} not supported"
                 )
 
+        if settings.vectorstore.tenancy == "single":
+            self.vector_store = backend.open(backend.base_name)
+        else:
+            self.vector_store = ShardedVectorStore(
+                backend,
+                tenant_field=TENANT_FIELDS[settings.vectorstore.tenancy],
+                max_open_shards=settings.vectorstore.max_open_shards,
+            )
+
+    def get_index(
+        self, docstore: BaseDocumentStore, **kwargs: typing.Any
+    ) -> VectorStoreIndex:
+        """Index of the vector store, to retrieve from (see `get_retriever`).
+
+        The nodes of the vector stores not storing them (`stores_text` is False)
+        are fetched from `docstore`.
+        """
+        if self.vector_store.stores_text:
+            return VectorStoreIndex.from_vector_store(self.vector_store, **kwargs)
+        kwargs.pop("storage_context", None)
+        return VectorStoreIndex(
+            nodes=[],
+            storage_context=StorageContext.from_defaults(
+                vector_store=self.vector_store, docstore=docstore
+            ),
+            **kwargs,
+        )
+
     def get_retriever(
         self,
         index: VectorStoreIndex,
@@ -152,17 +263,29 @@ class VectorStoreComponent:
         similarity_top_k: int = 2,
     ) -> VectorIndexRetriever:
         # This way we support qdrant (using doc_ids) and the rest (using filters)
-        return VectorIndexRetriever(
-            index=index,
-            similarity_top_k=similarity_top_k,
-            doc_ids=context_filter.docs_ids if context_filter else None,
-            filters=(
+        retriever_kwargs: dict[str, typing.Any] = {
+            "index": index,
+            "similarity_top_k": similarity_top_k,
+            "doc_ids": context_filter.docs_ids if context_filter else None,
+            "filters": (
                 _doc_id_metadata_filter(context_filter)
                 if context_filter and not context_filter.docs_ids
                 else None
             ),
-        )
+        }
+        vector_store_kwargs = dict(self.vector_store_kwargs or {})
+        if isinstance(self.vector_store, ShardedVectorStore) and context_filter:
+            # Only the shard of the tenant is searched
+            tenant = getattr(context_filter, self.vector_store.tenant_field)
+            if tenant is not None:
+                vector_store_kwargs["tenant"] = tenant
+        if vector_store_kwargs:
+            retriever_kwargs["vector_store_kwargs"] = vector_store_kwargs
+        if self.compaction is not None:
+            return CompactingVectorIndexRetriever(self.compaction, **retriever_kwargs)
+        return DocstoreVectorIndexRetriever(**retriever_kwargs)
 
     def close(self) -> None:
+        close_store(self.vector_store)
         if hasattr(self.vector_store.client, "close"):
             self.vector_store.client.close()
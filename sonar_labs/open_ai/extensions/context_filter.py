@@ -1,6 +1,12 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
 
+# Metadata fields of the nodes matched by the context filters (see
+# `_doc_id_metadata_filter`), that the vector stores index. `doc_id` is the ref
+# doc id of the node.
+FILTER_FIELDS = ("doc_id", "org_id", "user_id", "project_id", "file_id")
+
+
 class ContextFilter(BaseModel):
     docs_ids: Optional[List[str]] = Field(
         None, examples=[["c202d5e6-7b69-4869-81cc-dd574ee8ee11"]]
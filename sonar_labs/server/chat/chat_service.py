@@ -5,13 +5,9 @@ from llama_index.core.chat_engine import ContextChatEngine, SimpleChatEngine
 from llama_index.core.chat_engine.types import (
     BaseChatEngine,
 )
-from llama_index.core.indices import VectorStoreIndex
 from llama_index.core.indices.postprocessor import MetadataReplacementPostProcessor
 from llama_index.core.llms import ChatMessage, MessageRole
-from llama_index.core.postprocessor import (
-    SentenceTransformerRerank,
-    SimilarityPostprocessor,
-)
+from llama_index.core.postprocessor import SimilarityPostprocessor
 from llama_index.core.storage import StorageContext
 from llama_index.core.types import TokenGen
 from pydantic import BaseModel
@@ -93,11 +89,10 @@ class ChatService:
             docstore=node_store_component.doc_store,
             index_store=node_store_component.index_store,
         )
-        self.index = VectorStoreIndex.from_vector_store(
-            vector_store_component.vector_store,
-            storage_context=self.storage_context,
+        self.index = vector_store_component.get_index(
+            docstore=node_store_component.doc_store,
             llm=llm_component.llm,
-            embed_model=embedding_component.embedding_model,
+            embed_model=embedding_component.query_embedding_model,
             show_progress=True,
         )
 
@@ -122,8 +117,8 @@ class ChatService:
             ]
 
             if settings.rag.rerank.enabled:
-                rerank_postprocessor = SentenceTransformerRerank(
-                    model=settings.rag.rerank.model, top_n=settings.rag.rerank.top_n
+                rerank_postprocessor = self.embedding_component.reranker(
+                    top_n=settings.rag.rerank.top_n
                 )
                 node_postprocessors.append(rerank_postprocessor)
 
@@ -1,7 +1,6 @@
 from typing import TYPE_CHECKING, Literal
 
 from injector import inject, singleton
-from llama_index.core.indices import VectorStoreIndex
 from llama_index.core.schema import NodeWithScore
 from llama_index.core.storage import StorageContext
 from pydantic import BaseModel, Field
@@ -100,11 +99,10 @@ class ChunksService:
         limit: int = 10,
         prev_next_chunks: int = 0,
     ) -> list[Chunk]:
-        index = VectorStoreIndex.from_vector_store(
-            self.vector_store_component.vector_store,
-            storage_context=self.storage_context,
+        index = self.vector_store_component.get_index(
+            docstore=self.storage_context.docstore,
             llm=self.llm_component.llm,
-            embed_model=self.embedding_component.embedding_model,
+            embed_model=self.embedding_component.query_embedding_model,
             show_progress=True,
         )
         vector_index_retriever = self.vector_store_component.get_retriever(
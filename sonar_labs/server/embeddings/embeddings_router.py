@@ -1,11 +1,14 @@
+from collections.abc import Iterator
 from typing import Literal
 
-from fastapi import APIRouter, Depends, Request
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import BaseModel, Field
+from starlette.responses import StreamingResponse
 
 from sonar_labs.server.embeddings.embeddings_service import (
     Embedding,
     EmbeddingsService,
+    EncodingFormat,
 )
 from sonar_labs.server.utils.auth import authenticated
 
@@ -14,6 +17,21 @@ embeddings_router = APIRouter(prefix="/v1", dependencies=[Depends(authenticated)
 
 class EmbeddingsBody(BaseModel):
     input: str | list[str]
+    encoding_format: EncodingFormat = Field(
+        "float",
+        description=(
+            "`float` for lists of floats, `base64` for the base64 encoding of the "
+            "little-endian float32 values, much more compact for big inputs."
+        ),
+    )
+    dimensions: int | None = Field(
+        None,
+        gt=0,
+        description=(
+            "If set, the embeddings are truncated to this number of dimensions, "
+            "and normalized again."
+        ),
+    )
 
 
 class EmbeddingsResponse(BaseModel):
@@ -22,14 +40,51 @@ class EmbeddingsResponse(BaseModel):
     data: list[Embedding]
 
 
-@embeddings_router.post("/embeddings", tags=["Embeddings"])
-def embeddings_generation(request: Request, body: EmbeddingsBody) -> EmbeddingsResponse:
+def _response_chunks(
+    first: Embedding | None, embeddings: Iterator[Embedding]
+) -> Iterator[str]:
+    """The JSON of an `EmbeddingsResponse`, an embedding at a time."""
+    yield '{"object":"list","model":"sonar-labs","data":['
+    if first is not None:
+        yield first.model_dump_json()
+        for embedding in embeddings:
+            yield "," + embedding.model_dump_json()
+    yield "]}"
+
+
+@embeddings_router.post(
+    "/embeddings", tags=["Embeddings"], response_model=EmbeddingsResponse
+)
+def embeddings_generation(request: Request, body: EmbeddingsBody) -> StreamingResponse:
     """Get a vector representation of a given input.
 
     That vector representation can be easily consumed
     by machine learning models and algorithms.
+
+    The response is streamed as the inputs are embedded, a batch at a time.
     """
     service = request.state.injector.get(EmbeddingsService)
     input_texts = body.input if isinstance(body.input, list) else [body.input]
-    embeddings = service.texts_embeddings(input_texts)
-    return EmbeddingsResponse(object="list", model="sonar-labs", data=embeddings)
+    embeddings = service.texts_embeddings(
+        input_texts, body.encoding_format, body.dimensions
+    )
+    try:
+        # Embedded before the response starts, to report the invalid requests
+        first = next(embeddings, None)
+    except ValueError as e:
+        raise HTTPException(400, str(e)) from e
+    return StreamingResponse(
+        _response_chunks(first, embeddings), media_type="application/json"
+    )
+
+
+@embeddings_router.get("/embeddings/cache", tags=["Embeddings"])
+def embeddings_cache_stats(request: Request) -> dict[str, dict[str, float]]:
+    """Hits, misses and hit rate of the embedding caches.
+
+    `embeddings` is the persistent cache of the embeddings by text, `queries`
+    the in-memory cache of the query embeddings used by the retrievals. A cache
+    that is disabled is not listed.
+    """
+    service: EmbeddingsService = request.state.injector.get(EmbeddingsService)
+    return service.cache_stats()
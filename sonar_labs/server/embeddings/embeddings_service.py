@@ -1,30 +1,84 @@
+import base64
+from collections.abc import Iterator
 from typing import Literal
 
+import numpy as np
 from injector import inject, singleton
 from pydantic import BaseModel, Field
 
 from sonar_labs.components.embedding.embedding_component import EmbeddingComponent
 
+EncodingFormat = Literal["float", "base64"]
+
 
 class Embedding(BaseModel):
     index: int
     object: Literal["embedding"]
-    embedding: list[float] = Field(examples=[[0.0023064255, -0.009327292]])
+    embedding: list[float] | str = Field(
+        examples=[[0.0023064255, -0.009327292]],
+        description=(
+            "The embedding, as a list of floats, or as the base64 encoding of its "
+            "little-endian float32 values if `encoding_format` is `base64`."
+        ),
+    )
 
 
 @singleton
 class EmbeddingsService:
     @inject
     def __init__(self, embedding_component: EmbeddingComponent) -> None:
-        self.embedding_model = embedding_component.embedding_model
-
-    def texts_embeddings(self, texts: list[str]) -> list[Embedding]:
-        texts_embeddings = self.embedding_model.get_text_embedding_batch(texts)
-        return [
-            Embedding(
-                index=texts_embeddings.index(embedding),
-                object="embedding",
-                embedding=embedding,
+        self.embedding_component = embedding_component
+        self.embedding_model = embedding_component.query_embedding_model
+
+    def texts_embeddings(
+        self,
+        texts: list[str],
+        encoding_format: EncodingFormat = "float",
+        dimensions: int | None = None,
+    ) -> Iterator[Embedding]:
+        """Embed the texts, in batches sized for the embedding model.
+
+        The embeddings are yielded as their batch is embedded, so that a caller
+        streaming them never holds all of them at once. With `dimensions`, the
+        embeddings are truncated to their first `dimensions` values, and
+        normalized again.
+
+        :raises ValueError: on the first embedding, if `dimensions` is more than
+            the embeddings have
+        """
+        return self._embeddings(texts, encoding_format, dimensions)
+
+    def _embeddings(
+        self, texts: list[str], encoding_format: EncodingFormat, dimensions: int | None
+    ) -> Iterator[Embedding]:
+        batch_size = max(1, self.embedding_model.embed_batch_size)
+        for start in range(0, len(texts), batch_size):
+            batch = np.asarray(
+                self.embedding_model.get_text_embedding_batch(
+                    texts[start : start + batch_size]
+                ),
+                dtype=np.float32,
             )
-            for embedding in texts_embeddings
-        ]
+            if dimensions is not None:
+                if dimensions > batch.shape[1]:
+                    raise ValueError(
+                        f"dimensions={dimensions} is more than the {batch.shape[1]} "
+                        "dimensions of the embedding model"
+                    )
+                batch = batch[:, :dimensions]
+                batch /= np.clip(
+                    np.linalg.norm(batch, axis=1, keepdims=True), 1e-12, None
+                )
+            for index, vector in enumerate(batch, start=start):
+                yield Embedding(
+                    index=index,
+                    object="embedding",
+                    embedding=(
+                        base64.b64encode(vector.astype("<f4").tobytes()).decode()
+                        if encoding_format == "base64"
+                        else vector.tolist()
+                    ),
+                )
+
+    def cache_stats(self) -> dict[str, dict[str, float]]:
+        return self.embedding_component.cache_stats()
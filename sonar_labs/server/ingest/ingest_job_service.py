@@ -0,0 +1,237 @@
+import logging
+import shutil
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Literal, Optional
+
+from injector import inject, singleton
+
+from sonar_labs.components.ingest.ingest_progress import IngestProgress
+from sonar_labs.paths import local_data_path
+from sonar_labs.server.ingest.ingest_job_store import IngestJobStore
+from sonar_labs.server.ingest.ingest_service import IngestService
+from sonar_labs.server.ingest.model import IngestJob
+from sonar_labs.settings.settings import Settings
+
+if TYPE_CHECKING:
+    from sonar_labs.server.ingest.model import IngestedDoc
+
+logger = logging.getLogger(__name__)
+
+JobStatus = Literal["queued", "running", "completed", "failed"]
+
+
+class _Job:
+    def __init__(
+        self, job_id: str, file_names: list[str], on_change: Callable[[], None]
+    ) -> None:
+        self.job_id = job_id
+        self.file_names = file_names
+        self.status: JobStatus = "queued"
+        self.progress = IngestProgress(on_change=on_change)
+        self.data: list[IngestedDoc] | None = None
+        self.error: str | None = None
+        # Serializes the writes of the job to the store
+        self.lock = threading.Lock()
+        self.persisted_at = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_model(self) -> IngestJob:
+        return IngestJob(
+            object="ingest.job",
+            job_id=self.job_id,
+            status=self.status,
+            file_names=self.file_names,
+            pages_parsed=self.progress.pages_parsed,
+            nodes_embedded=self.progress.nodes_embedded,
+            nodes_persisted=self.progress.nodes_persisted,
+            data=self.data,
+            error=self.error,
+        )
+
+
+@singleton
+class IngestJobService:
+    """Run file ingestions in the background, and report their progress.
+
+    Uploaded files are staged on disk, and ingested by a bounded pool of workers
+    (`embedding.ingest_job_workers`) through the `IngestService`, so the ingest
+    concurrency does not depend on the number of API requests.
+
+    A job is run by the worker process that received it, and its state is written
+    to an `IngestJobStore` shared by the workers, so any of them can report it.
+    The progress is written at most every `PROGRESS_PERSIST_INTERVAL` seconds, and
+    followed by polling the store from the other workers. Only the most recent
+    finished jobs are kept.
+
+    Each worker stages its files in its own directory, and writes a heartbeat to
+    the store every `HEARTBEAT_INTERVAL` seconds: the jobs and staged files of the
+    workers without heartbeat are failed and deleted.
+    """
+
+    MAX_FINISHED_JOBS = 1000
+    PROGRESS_PERSIST_INTERVAL = 0.5
+    POLL_INTERVAL = 0.5
+    HEARTBEAT_INTERVAL = 5.0
+
+    @inject
+    def __init__(self, ingest_service: IngestService, settings: Settings) -> None:
+        self._ingest_service = ingest_service
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.embedding.ingest_job_workers,
+            thread_name_prefix="ingest-job",
+        )
+        # The unfinished jobs of this process
+        self._jobs: dict[str, _Job] = {}
+        # Notified on every change of any job, to stream the progress
+        self._changed = threading.Condition()
+        self._store = IngestJobStore(
+            local_data_path / "ingest_jobs.sqlite", self.MAX_FINISHED_JOBS
+        )
+        self._instance_id = uuid.uuid4().hex
+        self._store.heartbeat(self._instance_id)
+        threading.Thread(
+            target=self._heartbeat, name="ingest-job-heartbeat", daemon=True
+        ).start()
+        staging_root = local_data_path / "ingest_staging"
+        self._staging_path = staging_root / self._instance_id
+        # Staged files of a previous run can't be resumed, the ones of the other
+        # running workers are being ingested
+        if staging_root.is_dir():
+            for path in staging_root.iterdir():
+                if not self._store.alive(path.name):
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def _heartbeat(self) -> None:
+        while True:
+            time.sleep(self.HEARTBEAT_INTERVAL)
+            try:
+                self._store.heartbeat(self._instance_id)
+            except Exception:
+                logger.exception("Failed to write the heartbeat of the ingest jobs")
+
+    def submit(
+        self,
+        files: list[tuple[str, BinaryIO, str]],
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+    ) -> IngestJob:
+        """Stage the given (file_name, file_data, file_id) and queue their ingestion."""
+        job_id = str(uuid.uuid4())
+        job_path = self._staging_path / job_id
+        job_path.mkdir(parents=True)
+        staged_files: list[tuple[str, Path, str]] = []
+        try:
+            for index, (file_name, file_data, file_id) in enumerate(files):
+                # The file names are not trusted, nor unique
+                staged_path = job_path / str(index)
+                with staged_path.open("wb") as staged_file:
+                    shutil.copyfileobj(file_data, staged_file)
+                staged_files.append((file_name, staged_path, file_id))
+        except Exception:
+            shutil.rmtree(job_path, ignore_errors=True)
+            raise
+
+        job = _Job(
+            job_id, [f[0] for f in files], on_change=lambda: self._on_progress(job)
+        )
+        self._persist(job)
+        with self._changed:
+            self._jobs[job_id] = job
+        logger.info("Queued ingest job=%s of count=%s files", job_id, len(files))
+        self._executor.submit(
+            self._run, job, job_path, staged_files, project_id, user_id, org_id
+        )
+        return job.to_model()
+
+    def get(self, job_id: str) -> IngestJob | None:
+        job = self._jobs.get(job_id)
+        return job.to_model() if job is not None else self._store.get(job_id)
+
+    def follow(self, job_id: str, timeout: float = 15.0) -> Iterator[IngestJob]:
+        """Yield the state of the job on every change, until it is finished.
+
+        The current state is yielded again every `timeout` seconds without change,
+        to keep the connection of the client alive.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            yield from self._poll(job_id, timeout)
+            return
+        while True:
+            snapshot = job.to_model()
+            yield snapshot
+            if job.finished:
+                return
+            with self._changed:
+                # Called before `snapshot` is rebound, by this thread
+                self._changed.wait_for(
+                    lambda: job.to_model() != snapshot,  # noqa: B023
+                    timeout=timeout,
+                )
+
+    def _poll(self, job_id: str, timeout: float) -> Iterator[IngestJob]:
+        """Follow a job of another worker, in the store."""
+        last: IngestJob | None = None
+        last_yielded_at = 0.0
+        while True:
+            snapshot = self._store.get(job_id)
+            if snapshot is None:
+                return
+            if snapshot != last or time.monotonic() - last_yielded_at >= timeout:
+                yield snapshot
+                last, last_yielded_at = snapshot, time.monotonic()
+            if snapshot.status in ("completed", "failed"):
+                return
+            time.sleep(self.POLL_INTERVAL)
+
+    def _run(
+        self,
+        job: _Job,
+        job_path: Path,
+        staged_files: list[tuple[str, Path, str]],
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+    ) -> None:
+        self._set_status(job, "running")
+        try:
+            job.data = self._ingest_service.bulk_ingest(
+                staged_files, project_id, user_id, org_id, progress=job.progress
+            )
+            self._set_status(job, "completed")
+            logger.info("Completed ingest job=%s", job.job_id)
+        except Exception as e:
+            logger.exception("Failed ingest job=%s", job.job_id)
+            job.error = str(e)
+            self._set_status(job, "failed")
+        finally:
+            shutil.rmtree(job_path, ignore_errors=True)
+            with self._changed:
+                self._jobs.pop(job.job_id, None)
+
+    def _set_status(self, job: _Job, status: JobStatus) -> None:
+        with self._changed:
+            job.status = status
+            self._changed.notify_all()
+        self._persist(job)
+
+    def _on_progress(self, job: _Job) -> None:
+        with self._changed:
+            self._changed.notify_all()
+        if time.monotonic() - job.persisted_at >= self.PROGRESS_PERSIST_INTERVAL:
+            self._persist(job)
+
+    def _persist(self, job: _Job) -> None:
+        with job.lock:
+            # Written under the lock, so an older state can't overwrite a newer one
+            self._store.put(job.to_model(), self._instance_id)
+            job.persisted_at = time.monotonic()
@@ -0,0 +1,116 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from sonar_labs.server.ingest.model import IngestJob
+
+# Seconds without heartbeat after which a worker is considered stopped
+HEARTBEAT_TIMEOUT = 30.0
+
+# Seconds after which the heartbeats of stopped workers are deleted
+_INSTANCE_RETENTION = 24 * 3600.0
+
+
+class IngestJobStore:
+    """The state of the ingest jobs, in a sqlite database shared by the workers.
+
+    A job is written by the worker running it, identified by a random instance id
+    (process ids are reused, e.g. by a restarted container), and can be read by
+    any worker of the host: the API requests of a job may be served by another
+    worker than the one it was submitted to.
+
+    The running workers write a heartbeat every few seconds. The jobs left
+    unfinished by a worker without heartbeat for `heartbeat_timeout` seconds are
+    reported as failed.
+
+    Only the `max_finished_jobs` most recent finished jobs are kept.
+    """
+
+    def __init__(
+        self,
+        persist_path: Path,
+        max_finished_jobs: int,
+        heartbeat_timeout: float = HEARTBEAT_TIMEOUT,
+    ) -> None:
+        persist_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_finished_jobs = max_finished_jobs
+        self.heartbeat_timeout = heartbeat_timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(persist_path), check_same_thread=False, timeout=30
+        )
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # Jobs of the workers identified by their pid
+            self._conn.execute("DROP TABLE IF EXISTS ingest_jobs")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL UNIQUE, "
+                "instance_id TEXT NOT NULL, finished INTEGER NOT NULL, "
+                "job TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS instances ("
+                "instance_id TEXT PRIMARY KEY, heartbeat_at REAL NOT NULL)"
+            )
+
+    def heartbeat(self, instance_id: str) -> None:
+        """Mark the worker `instance_id` as running."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO instances VALUES (?, ?)", (instance_id, now)
+            )
+            self._conn.execute(
+                "DELETE FROM instances WHERE heartbeat_at < ?",
+                (now - _INSTANCE_RETENTION,),
+            )
+
+    def alive(self, instance_id: str) -> bool:
+        """Whether the worker `instance_id` wrote a heartbeat recently."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT heartbeat_at FROM instances WHERE instance_id = ?",
+                (instance_id,),
+            ).fetchone()
+        return row is not None and time.time() - row[0] <= self.heartbeat_timeout
+
+    def put(self, job: IngestJob, instance_id: str) -> None:
+        """Insert or update the job, run by the worker `instance_id`."""
+        finished = job.status in ("completed", "failed")
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, instance_id, finished, job) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (job_id) DO UPDATE SET "
+                "instance_id = excluded.instance_id, finished = excluded.finished, "
+                "job = excluded.job",
+                (job.job_id, instance_id, finished, job.model_dump_json()),
+            )
+            if finished:
+                self._conn.execute(
+                    "DELETE FROM jobs WHERE finished AND seq NOT IN ("
+                    "SELECT seq FROM jobs WHERE finished "
+                    "ORDER BY seq DESC LIMIT ?)",
+                    (self.max_finished_jobs,),
+                )
+
+    def get(self, job_id: str) -> IngestJob | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT instance_id, finished, job FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        instance_id, finished, data = row
+        job = IngestJob.model_validate_json(data)
+        if not finished and not self.alive(instance_id):
+            return job.model_copy(
+                update={"status": "failed", "error": "The ingest worker stopped"}
+            )
+        return job
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,12 +1,15 @@
 from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form, Query
 from pydantic import BaseModel, Field
 from pathlib import Path
+import shutil
 import tempfile
+from starlette.responses import StreamingResponse
 
+from sonar_labs.server.ingest.ingest_job_service import IngestJobService
 from sonar_labs.server.ingest.ingest_service import IngestService
-from sonar_labs.server.ingest.model import IngestedDoc
+from sonar_labs.server.ingest.model import IngestedDoc, IngestJob
 from sonar_labs.server.utils.auth import authenticated
 
 ingest_router = APIRouter(prefix="/v1", dependencies=[Depends(authenticated)])
@@ -45,7 +48,7 @@ def ingest(request: Request, file: UploadFile) -> IngestResponse:
 
 
 @ingest_router.post("/ingest/file", tags=["Ingestion"])
-async def ingest_file(request: Request, file: UploadFile) -> IngestResponse:
+def ingest_file(request: Request, file: UploadFile) -> IngestResponse:
     """Ingests and processes a file, storing its chunks to be used as context.
 
     The context obtained from files is later used in
@@ -73,24 +76,12 @@ async def ingest_file(request: Request, file: UploadFile) -> IngestResponse:
     if file.filename is None:
         raise HTTPException(status_code=400, detail="No file name provided")
 
-    doc_ids_to_delete = [
-        ingested_document.doc_id 
-        for ingested_document in service.list_ingested() 
-        if ingested_document.doc_metadata and ingested_document.doc_metadata.get("file_name") == file.filename
-        and ingested_document.doc_metadata.get("project_id") == project_id 
-        and ingested_document.doc_metadata.get("user_id") == user_id
-        and ingested_document.doc_metadata.get("org_id") == org_id
-    ]
-    
-    for doc_id in doc_ids_to_delete:
-        service.delete(doc_id)
-    
-    
+    # Any previous file with the same name is replaced, unless it is unchanged
     ingested_documents = service.ingest_bin_data(file.filename, file.file, file_id, project_id, user_id, org_id)
     return IngestResponse(object="list", model="sonar-labs", data=ingested_documents)
 
 @ingest_router.post("/ingest/files", tags=["Ingestions"])
-async def ingest_files(request: Request, files: list[UploadFile] = File(...), file_ids: list[str] = Form(...)) -> IngestResponse:
+def ingest_files(request: Request, files: list[UploadFile] = File(...), file_ids: list[str] = Form(...)) -> IngestResponse:
     """Ingests and processes multiple files, storing its chunks to be used as context.
 
     The context obtained from files is later used in
@@ -113,57 +104,102 @@ async def ingest_files(request: Request, files: list[UploadFile] = File(...), fi
 
     if not project_id or not user_id:
         raise HTTPException(status_code=400, detail="projectId, userId and orgId are required")
+    if len(files) != len(file_ids):
+        raise HTTPException(400, "A file_id is required for each file")
     try:
-        # Create temporary files for each uploaded file
-        # for file in files:
-        #     temp_file = tempfile.NamedTemporaryFile(delete=False)
-        #     temp_file.write(await file.read())
-        #     temp_path = Path(temp_file.name)
-        #     temp_paths.append((file.filename, temp_path))
-        #     temp_file.close()
-        
-        for file, file_id in zip(files, file_ids):
-               with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                   temp_file.write(await file.read())
-                   temp_path = Path(temp_file.name)
-                   temp_paths.append((file.filename, temp_path, file_id))
+        # Create temporary files for each uploaded file, streaming the uploads
+        # (spooled by starlette) chunk by chunk instead of reading them in memory
+        for file, file_id in zip(files, file_ids, strict=True):
+            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+                temp_paths.append((file.filename, Path(temp_file.name), file_id))
+                shutil.copyfileobj(file.file, temp_file)
 
         service = request.state.injector.get(IngestService)
 
-        # Remove all existing Documents with name identical to all newly uploaded files:
-        # file_names = [name for name, _ in temp_paths]
+        # Existing Documents with name identical to a newly uploaded file are
+        # replaced by the service, unless the file is unchanged
         file_names = [name for name, _, _ in temp_paths]
 
-        doc_ids_to_delete = [
-            ingested_document.doc_id 
-            for ingested_document in service.list_ingested() 
-            if ingested_document.doc_metadata 
-            and ingested_document.doc_metadata.get("file_name") in file_names 
-            and ingested_document.doc_metadata.get("project_id") == project_id 
-            and ingested_document.doc_metadata.get("user_id") == user_id
-            and ingested_document.doc_metadata.get("org_id") == org_id
-        ]
-
-        for doc_id in doc_ids_to_delete:
-            service.delete(doc_id)
-
         if not file_names:
             raise HTTPException(400, "No file name provided")
 
-        # ingested_documents = service.bulk_ingest([(name, path) for name, path in temp_paths], project_id, user_id)
         ingested_documents = service.bulk_ingest([(name, path, file_id) for name, path, file_id in temp_paths], project_id, user_id, org_id)
         return IngestResponse(object= "list", model= "sonar-labs", data= ingested_documents)
 
     finally:
         # Clean up temporary files
-        # for _, temp_path in temp_paths:
-        #     temp_path.unlink()
         for _, temp_path, _ in temp_paths:
             temp_path.unlink()
 
     
 
 
+@ingest_router.post("/ingest/jobs", tags=["Ingestion"], status_code=202)
+def create_ingest_job(
+    request: Request,
+    files: list[UploadFile] = File(...),
+    file_ids: list[str] = Form(...),
+) -> IngestJob:
+    """Queues the ingestion of multiple files, and returns immediately.
+
+    Works like `/ingest/files`, but the files are ingested in the background: the
+    returned `job_id` can be used to follow the progress of the ingestion with
+    `GET /ingest/jobs/{job_id}`, or `GET /ingest/jobs/{job_id}/events`. Once the
+    job is `completed`, its `data` holds the ingested Documents.
+    """
+    project_id = request.headers.get("X-Project-Id", None)
+    user_id = request.headers.get("X-User-Id", None)
+    org_id = request.headers.get("X-Org-Id", None)
+
+    if not project_id or not user_id:
+        raise HTTPException(status_code=400, detail="projectId, userId and orgId are required")
+    if len(files) != len(file_ids):
+        raise HTTPException(400, "A file_id is required for each file")
+    uploads = []
+    for file, file_id in zip(files, file_ids, strict=True):
+        if file.filename is None:
+            raise HTTPException(400, "No file name provided")
+        uploads.append((file.filename, file.file, file_id))
+
+    service: IngestJobService = request.state.injector.get(IngestJobService)
+    return service.submit(
+        uploads,
+        project_id,
+        user_id,
+        org_id,
+    )
+
+
+@ingest_router.get("/ingest/jobs/{job_id}", tags=["Ingestion"])
+def get_ingest_job(request: Request, job_id: str) -> IngestJob:
+    """Get the status and the progress of an ingestion job.
+
+    Only the most recent finished jobs are kept. Any API worker can report the
+    jobs of the others.
+    """
+    service: IngestJobService = request.state.injector.get(IngestJobService)
+    job = service.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Ingest job {job_id} not found")
+    return job
+
+
+@ingest_router.get("/ingest/jobs/{job_id}/events", tags=["Ingestion"])
+def ingest_job_events(request: Request, job_id: str) -> StreamingResponse:
+    """Stream the progress of an ingestion job, as Server-Sent Events.
+
+    Every event holds the whole job, as returned by `GET /ingest/jobs/{job_id}`.
+    The stream ends once the job is `completed` or `failed`.
+    """
+    service = request.state.injector.get(IngestJobService)
+    if service.get(job_id) is None:
+        raise HTTPException(404, f"Ingest job {job_id} not found")
+    return StreamingResponse(
+        (f"data: {job.model_dump_json()}\n\n" for job in service.follow(job_id)),
+        media_type="text/event-stream",
+    )
+
+
 @ingest_router.post("/ingest/text", tags=["Ingestion"])
 def ingest_text(request: Request, body: IngestTextBody) -> IngestResponse:
     """Ingests and processes a text, storing its chunks to be used as context.
@@ -180,7 +216,14 @@ def ingest_text(request: Request, body: IngestTextBody) -> IngestResponse:
     service = request.state.injector.get(IngestService)
     if len(body.file_name) == 0:
         raise HTTPException(400, "No file name provided")
-    ingested_documents = service.ingest_text(body.file_name, body.text)
+    ingested_documents = service.ingest_text(
+        body.file_name,
+        body.text,
+        file_id=request.headers.get("X-File-Id", None),
+        project_id=request.headers.get("X-Project-Id", None),
+        user_id=request.headers.get("X-User-Id", None),
+        org_id=request.headers.get("X-Org-Id", None),
+    )
     return IngestResponse(object="list", model="sonar-labs", data=ingested_documents)
 
 
@@ -196,6 +239,52 @@ def list_ingested(request: Request) -> IngestResponse:
     return IngestResponse(object="list", model="sonar-labs", data=ingested_documents)
 
 
+@ingest_router.delete("/ingest/files", tags=["Ingestion"])
+def delete_ingested_files(
+    request: Request, file_ids: list[str] = Query(...)
+) -> None:
+    """Delete all the ingested Documents of the specified files.
+
+    The Documents of all the files are deleted at once, which is much faster than
+    deleting them one by one with `DELETE /ingest/{doc_id}`.
+    """
+    project_id = request.headers.get("X-Project-Id", None)
+    user_id = request.headers.get("X-User-Id", None)
+    org_id = request.headers.get("X-Org-Id", None)
+    if not project_id or not user_id or not org_id:
+        raise HTTPException(status_code=400, detail="projectId, userId and orgId are required")
+
+    service = request.state.injector.get(IngestService)
+    doc_ids_to_delete = [
+        doc_id
+        for file_id in file_ids
+        for doc_id in service.find_docs(org_id, project_id, user_id, file_id=file_id)
+    ]
+    service.delete_many(doc_ids_to_delete)
+
+
+@ingest_router.delete("/ingest/orgs/{org_id}", tags=["Ingestion"])
+def delete_ingested_org(request: Request, org_id: str) -> None:
+    """Delete all the ingested Documents of an organization, of all its users.
+
+    With `vectorstore.tenancy: org`, the collection of the organization is
+    dropped at once.
+    """
+    service = request.state.injector.get(IngestService)
+    service.delete_tenant(org_id)
+
+
+@ingest_router.delete("/ingest/orgs/{org_id}/projects/{project_id}", tags=["Ingestion"])
+def delete_ingested_project(request: Request, org_id: str, project_id: str) -> None:
+    """Delete all the ingested Documents of a project, of all its users.
+
+    With `vectorstore.tenancy: project`, the collection of the project is
+    dropped at once.
+    """
+    service = request.state.injector.get(IngestService)
+    service.delete_tenant(org_id, project_id)
+
+
 @ingest_router.delete("/ingest/{doc_id}", tags=["Ingestion"])
 def delete_ingested(request: Request, doc_id: str) -> None:
     """Delete the specified ingested Document.
@@ -222,17 +311,8 @@ def delete_ingested_doc(request: Request, file_id: str) -> None:
     
     service = request.state.injector.get(IngestService)
     
-    doc_ids_to_delete = [
-        ingested_document.doc_id 
-        for ingested_document in service.list_ingested() 
-        if ingested_document.doc_metadata and ingested_document.doc_metadata.get("file_id") == file_id
-        and ingested_document.doc_metadata.get("project_id") == project_id 
-        and ingested_document.doc_metadata.get("user_id") == user_id
-        and ingested_document.doc_metadata.get("org_id") == org_id
-    ]
-    
-    for doc_id in doc_ids_to_delete:
-            service.delete(doc_id)
+    doc_ids_to_delete = service.find_docs(org_id, project_id, user_id, file_id=file_id)
+    service.delete_many(doc_ids_to_delete)
     
 
 @ingest_router.get("/ingest/file/status", tags=["Ingestion"])
@@ -250,19 +330,9 @@ async def ingest_file_status(request: Request) -> IngestCountResponse:
     if not project_id or not user_id or not file_id or not doc_count:
         raise HTTPException(status_code=400, detail="orgId, projectId, userId, fileId and docCount are required")
 
-    doc_ids = [
-    ingested_document.doc_id 
-    for ingested_document in service.list_ingested()
-    if (ingested_document.doc_metadata and 
-        ingested_document.doc_metadata.get("file_id") == file_id and 
-        ingested_document.doc_metadata.get("user_id") == user_id and 
-        ingested_document.doc_metadata.get("project_id") == project_id and
-        ingested_document.doc_metadata.get("org_id") == org_id)
-    ]
-
+    doc_ids = service.find_docs(org_id, project_id, user_id, file_id=file_id)
 
     count_ingested_documents = len(doc_ids)
-    print(count_ingested_documents)
 
     if count_ingested_documents == int(doc_count):
         return IngestCountResponse(
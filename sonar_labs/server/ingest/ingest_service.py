@@ -1,28 +1,64 @@
+import hashlib
+import json
 import logging
 import tempfile
 from pathlib import Path
-from typing import TYPE_CHECKING, AnyStr, BinaryIO, Optional
+from typing import TYPE_CHECKING, BinaryIO, Optional
 
 from injector import inject, singleton
-from llama_index.core.node_parser import SentenceWindowNodeParser
+from llama_index.core.node_parser import NodeParser, SentenceWindowNodeParser
 from llama_index.core.storage import StorageContext
 
 from sonar_labs.components.embedding.embedding_component import EmbeddingComponent
+from sonar_labs.components.ingest.content_registry import (
+    ContentHashRegistry,
+    copy_with_sha256,
+    file_sha256,
+)
 from sonar_labs.components.ingest.ingest_component import get_ingestion_component
+from sonar_labs.components.ingest.ingest_helper import (
+    PARSER_VERSION,
+    IngestionHelper,
+)
+from sonar_labs.components.ingest.ingest_progress import IngestProgress
 from sonar_labs.components.llm.llm_component import LLMComponent
 from sonar_labs.components.node_store.node_store_component import NodeStoreComponent
 from sonar_labs.components.vector_store.vector_store_component import (
     VectorStoreComponent,
 )
+from sonar_labs.paths import local_data_path
 from sonar_labs.server.ingest.model import IngestedDoc
-from sonar_labs.settings.settings import settings
+from sonar_labs.settings.settings import Settings, settings
 
 if TYPE_CHECKING:
+    from llama_index.core.schema import TransformComponent
     from llama_index.core.storage.docstore.types import RefDocInfo
 
 logger = logging.getLogger(__name__)
 
 
+def _content_version(
+    settings: Settings, model_id: str, node_parser: NodeParser
+) -> str:
+    """Version of the settings the documents and vectors of a file depend on."""
+    ocr = [settings.ocr.mode, settings.ocr.min_text_coverage]
+    if settings.ocr.mode == "tesseract":
+        ocr.append(settings.ocr.tesseract_lang)
+    version = {
+        "parser": PARSER_VERSION,
+        # The backend of the model matters, not only its name (see `model_id`)
+        "model": model_id,
+        "ocr": ocr,
+        "dimensions": (
+            settings.embedding.embed_dim
+            if settings.vectorstore.truncate_dimensions
+            else None
+        ),
+        "node_parser": node_parser.to_dict(),
+    }
+    return hashlib.sha256(json.dumps(version, sort_keys=True).encode()).hexdigest()
+
+
 @singleton
 class IngestService:
     @inject
@@ -40,30 +76,25 @@ class IngestService:
             index_store=node_store_component.index_store,
         )
         node_parser = SentenceWindowNodeParser.from_defaults()
+        transformations: list[TransformComponent] = [
+            node_parser,
+            embedding_component.embedding_model,
+        ]
+        if vector_store_component.compaction is not None:
+            transformations.append(vector_store_component.compaction)
 
         self.ingest_component = get_ingestion_component(
             self.storage_context,
             embed_model=embedding_component.embedding_model,
-            transformations=[node_parser, embedding_component.embedding_model],
+            transformations=transformations,
             settings=settings(),
         )
-
-    def _ingest_data(self, file_name: str, file_data: AnyStr, file_id: str, project_id: Optional[str], user_id: Optional[str], org_id: Optional[str]) -> list[IngestedDoc]:
-        logger.debug("Got file data of size=%s to ingest", len(file_data))
-        # llama-index mainly supports reading from files, so
-        # we have to create a tmp file to read for it to work
-        # delete=False to avoid a Windows 11 permission error.
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            try:
-                path_to_tmp = Path(tmp.name)
-                if isinstance(file_data, bytes):
-                    path_to_tmp.write_bytes(file_data)
-                else:
-                    path_to_tmp.write_text(str(file_data))
-                return self.ingest_file(file_name, path_to_tmp, file_id, project_id, user_id, org_id)
-            finally:
-                tmp.close()
-                path_to_tmp.unlink()
+        self._content_registry = ContentHashRegistry(
+            local_data_path / "content_hashes.sqlite"
+        )
+        self._content_version = _content_version(
+            settings(), embedding_component.model_id, node_parser
+        )
 
     def ingest_file(self, file_name: str, file_data: Path, file_id: str, project_id: Optional[str], user_id: Optional[str], org_id: Optional[str]) -> list[IngestedDoc]:
         logger.info("Ingesting file_name=%s", file_name)
@@ -71,23 +102,180 @@ class IngestService:
         logger.info("Finished ingestion file_name=%s", file_name)
         return [IngestedDoc.from_document(document) for document in documents]
 
-    def ingest_text(self, file_name: str, text: str) -> list[IngestedDoc]:
+    def ingest_text(
+        self,
+        file_name: str,
+        text: str,
+        file_id: Optional[str] = None,
+        project_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        org_id: Optional[str] = None,
+    ) -> list[IngestedDoc]:
         logger.debug("Ingesting text data with file_name=%s", file_name)
-        return self._ingest_data(file_name, text, '00001', '234', '234')
+        documents = IngestionHelper.transform_text_into_documents(
+            file_name, text, file_id, project_id, user_id, org_id
+        )
+        documents = self.ingest_component.ingest_documents(documents)
+        return [IngestedDoc.from_document(document) for document in documents]
 
     def ingest_bin_data(
         self, file_name: str, raw_file_data: BinaryIO, file_id: str, 
         project_id: Optional[str], user_id: Optional[str], org_id: Optional[str]
     ) -> list[IngestedDoc]:
+        """Ingest an uploaded file, replacing any previous file with the same name.
+
+        If the same bytes were already ingested for this file, with the same parser
+        and embedding model, the existing documents are returned as they are.
+        """
         logger.debug("Ingesting binary data with file_name=%s", file_name)
-        file_data = raw_file_data.read()
-        return self._ingest_data(file_name, file_data, file_id, project_id, user_id, org_id)
+        # llama-index mainly supports reading from files, so the data is streamed
+        # to a tmp file (hashed on the way), and never held whole in memory.
+        # delete=False to avoid a Windows 11 permission error.
+        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            path_to_tmp = Path(tmp.name)
+            try:
+                content_hash = copy_with_sha256(raw_file_data, tmp)
+            except Exception:
+                tmp.close()
+                path_to_tmp.unlink()
+                raise
+        try:
+            fingerprint = self._fingerprint(content_hash)
+            unchanged_docs = self._unchanged_docs(
+                file_name, file_id, fingerprint, project_id, user_id, org_id
+            )
+            if unchanged_docs is not None:
+                logger.info("Skipping unchanged file_name=%s", file_name)
+                return unchanged_docs
 
-    def bulk_ingest(self, files: list[tuple[str, Path, str]], project_id: Optional[str], user_id: Optional[str], org_id: Optional[str]) -> list[IngestedDoc]:
+            self._delete_files(org_id, project_id, user_id, [file_name])
+            ingested_docs = self.ingest_file(
+                file_name, path_to_tmp, file_id, project_id, user_id, org_id
+            )
+            self._content_registry.record(
+                org_id, project_id, user_id, file_name, file_id, fingerprint,
+                [ingested_doc.doc_id for ingested_doc in ingested_docs],
+            )
+            return ingested_docs
+        finally:
+            path_to_tmp.unlink()
+
+    def bulk_ingest(
+        self,
+        files: list[tuple[str, Path, str]],
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+        progress: Optional[IngestProgress] = None,
+    ) -> list[IngestedDoc]:
+        """Ingest files, replacing any previous file with the same name.
+
+        Files whose content was already ingested are not parsed nor embedded again,
+        their existing documents are returned instead. Of several files with the
+        same name, only the last one is ingested, as it would replace the others.
+
+        The given `progress` is updated as the files are parsed, embedded and saved.
+        """
         logger.info("Ingesting file_names=%s", [f[0] for f in files])
-        documents = self.ingest_component.bulk_ingest(files, project_id, user_id, org_id)
+        # The documents of a file are only told apart by their file name
+        last_files = {
+            file_name: (file_path, file_id) for file_name, file_path, file_id in files
+        }
+        if len(last_files) < len(files):
+            logger.warning(
+                "Skipping count=%s files replaced by a later file of the same name",
+                len(files) - len(last_files),
+            )
+        ingested_docs: list[IngestedDoc] = []
+        changed_files: list[tuple[str, Path, str]] = []
+        # By file name, unique from here on
+        fingerprints: dict[str, tuple[str, str]] = {}
+        for file_name, (file_path, file_id) in last_files.items():
+            fingerprint = self._fingerprint(file_sha256(file_path))
+            unchanged_docs = self._unchanged_docs(
+                file_name, file_id, fingerprint, project_id, user_id, org_id
+            )
+            if unchanged_docs is not None:
+                logger.info("Skipping unchanged file_name=%s", file_name)
+                ingested_docs.extend(unchanged_docs)
+            else:
+                changed_files.append((file_name, file_path, file_id))
+                fingerprints[file_name] = (file_id, fingerprint)
+
+        if changed_files:
+            self._delete_files(
+                org_id, project_id, user_id, [f[0] for f in changed_files]
+            )
+            documents = self.ingest_component.bulk_ingest(
+                changed_files, project_id, user_id, org_id, progress=progress
+            )
+            doc_ids_by_file: dict[str, list[str]] = {}
+            for document in documents:
+                ingested_docs.append(IngestedDoc.from_document(document))
+                doc_ids_by_file.setdefault(
+                    document.metadata["file_name"], []
+                ).append(document.doc_id)
+            for file_name, doc_ids in doc_ids_by_file.items():
+                file_id, fingerprint = fingerprints[file_name]
+                self._content_registry.record(
+                    org_id, project_id, user_id, file_name, file_id, fingerprint, doc_ids
+                )
         logger.info("Finished ingestion file_name=%s", [f[0] for f in files])
-        return [IngestedDoc.from_document(document) for document in documents]
+        return ingested_docs
+
+    def _fingerprint(self, content_hash: str) -> str:
+        return f"{content_hash}:{self._content_version}"
+
+    def _unchanged_docs(
+        self,
+        file_name: str,
+        file_id: str,
+        fingerprint: str,
+        project_id: Optional[str],
+        user_id: Optional[str],
+        org_id: Optional[str],
+    ) -> list[IngestedDoc] | None:
+        """Return the documents of an already ingested file, if it is unchanged."""
+        registered = self._content_registry.get(org_id, project_id, user_id, file_name)
+        if (
+            registered is None
+            or registered.fingerprint != fingerprint
+            or registered.file_id != file_id
+        ):
+            return None
+        # The documents might have been deleted or replaced since registered
+        current_doc_ids = self.find_docs(
+            org_id, project_id, user_id, file_names=[file_name]
+        )
+        if not current_doc_ids or set(current_doc_ids) != set(registered.doc_ids):
+            return None
+        return [self._ingested_doc(doc_id) for doc_id in registered.doc_ids]
+
+    def _ingested_doc(self, doc_id: str) -> IngestedDoc:
+        ref_doc_info = self.storage_context.docstore.get_ref_doc_info(doc_id)
+        doc_metadata = None
+        if ref_doc_info is not None and ref_doc_info.metadata is not None:
+            doc_metadata = IngestedDoc.curate_metadata(dict(ref_doc_info.metadata))
+        return IngestedDoc(
+            object="ingest.document", doc_id=doc_id, doc_metadata=doc_metadata
+        )
+
+    def _delete_files(
+        self,
+        org_id: Optional[str],
+        project_id: Optional[str],
+        user_id: Optional[str],
+        file_names: list[str],
+    ) -> None:
+        doc_ids_to_delete = self.find_docs(
+            org_id, project_id, user_id, file_names=file_names
+        )
+        if doc_ids_to_delete:
+            logger.info(
+                "Replacing already ingested file(s): %s document(s) will be deleted",
+                len(doc_ids_to_delete),
+            )
+            self.delete_many(doc_ids_to_delete)
 
     def list_ingested(self) -> list[IngestedDoc]:
         ingested_docs: list[IngestedDoc] = []
@@ -115,6 +303,23 @@ class IngestService:
         logger.debug("Found count=%s ingested documents", len(ingested_docs))
         return ingested_docs
 
+    def find_docs(
+        self,
+        org_id: Optional[str],
+        project_id: Optional[str],
+        user_id: Optional[str],
+        file_id: Optional[str] = None,
+        file_names: Optional[list[str]] = None,
+    ) -> list[str]:
+        """Find the doc_ids ingested by a tenant, optionally narrowed to some files.
+
+        Unlike `list_ingested`, this does not walk the whole docstore: it is served
+        by the tenant index maintained by the ingest component.
+        """
+        return self.ingest_component.find_docs(
+            org_id, project_id, user_id, file_id=file_id, file_names=file_names
+        )
+
     def delete(self, doc_id: str) -> None:
         """Delete an ingested document.
 
@@ -123,4 +328,52 @@ class IngestService:
         logger.info(
             "Deleting the ingested document=%s in the doc and index store", doc_id
         )
+        registered_files = self._registered_files([doc_id])
         self.ingest_component.delete(doc_id)
+        self._forget(registered_files)
+
+    def delete_many(self, doc_ids: list[str]) -> None:
+        """Delete ingested documents, persisting the stores once for all of them."""
+        logger.info(
+            "Deleting count=%s ingested documents in the doc and index store",
+            len(doc_ids),
+        )
+        registered_files = self._registered_files(doc_ids)
+        self.ingest_component.delete_many(doc_ids)
+        self._forget(registered_files)
+
+    def delete_tenant(self, org_id: str, project_id: Optional[str] = None) -> None:
+        """Delete all the documents of an organization, or of one of its projects.
+
+        Their nodes, vectors (the shard of the tenant, with `vectorstore.tenancy`)
+        and content fingerprints are deleted too.
+        """
+        self.ingest_component.delete_tenant(org_id, project_id)
+        self._content_registry.forget_tenant(org_id, project_id)
+
+    def _registered_files(
+        self, doc_ids: list[str]
+    ) -> set[tuple[str | None, str | None, str | None, str]]:
+        """The (org_id, project_id, user_id, file_name) of the documents' files."""
+        files = set()
+        for doc_id in doc_ids:
+            ref_doc_info = self.storage_context.docstore.get_ref_doc_info(doc_id)
+            metadata = ref_doc_info.metadata if ref_doc_info is not None else None
+            if metadata and metadata.get("file_name") is not None:
+                files.add(
+                    (
+                        metadata.get("org_id"),
+                        metadata.get("project_id"),
+                        metadata.get("user_id"),
+                        metadata["file_name"],
+                    )
+                )
+        return files
+
+    def _forget(
+        self, files: set[tuple[str | None, str | None, str | None, str]]
+    ) -> None:
+        # Their fingerprints would not skip an upload anyway, the documents
+        # being gone, but they would stay in the registry forever
+        for org_id, project_id, user_id, file_name in files:
+            self._content_registry.forget(org_id, project_id, user_id, file_name)
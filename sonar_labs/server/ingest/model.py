@@ -30,3 +30,19 @@ class IngestedDoc(BaseModel):
             doc_id=document.doc_id,
             doc_metadata=IngestedDoc.curate_metadata(document.metadata),
         )
+
+
+class IngestJob(BaseModel):
+    object: Literal["ingest.job"]
+    job_id: str = Field(examples=["3c1a4a0e-5d6f-4b8e-9f4e-2a7d7c1b9e21"])
+    status: Literal["queued", "running", "completed", "failed"]
+    file_names: list[str] = Field(examples=[["Sales Report Q3 2023.pdf"]])
+    pages_parsed: int = Field(
+        description="Documents parsed so far, a PDF generates one Document per page"
+    )
+    nodes_embedded: int
+    nodes_persisted: int
+    data: list[IngestedDoc] | None = Field(
+        None, description="The ingested Documents, once the job is completed"
+    )
+    error: str | None = None
@@ -1,6 +1,6 @@
 from typing import Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 from sonar_labs.settings.settings_loader import load_active_settings
 
@@ -118,11 +118,146 @@ class LLMSettings(BaseModel):
 
 
 class VectorstoreSettings(BaseModel):
-    database: Literal["chroma", "qdrant", "postgres"]
+    database: Literal["chroma", "qdrant", "postgres", "local"]
+    truncate_dimensions: bool = Field(
+        False,
+        description=(
+            "Truncate the embeddings (of the nodes and of the queries) to their first "
+            "`embedding.embed_dim` dimensions, normalized again. Only for the "
+            "Matryoshka embedding models, trained for it. See "
+            "`scripts/benchmark_vector_compaction.py` for the recall lost."
+        ),
+    )
+    vector_precision: Literal["float32", "float16", "int8"] = Field(
+        "float32",
+        description=(
+            "The precision the vectors are stored in. Only supported by `qdrant` "
+            "(`int8` only), on collection creation, and by `local` (`float16` "
+            "only):\n"
+            "If `float16` - half precision vectors, half the memory.\n"
+            "If `int8` - int8 scalar quantized vectors in memory, a quarter of the "
+            "memory, the original vectors being used to rescore the results."
+        ),
+    )
+    tenancy: Literal["single", "org", "project"] = Field(
+        "single",
+        description=(
+            "How the nodes of the tenants are stored:\n"
+            "If `single` - in a single collection (or table), searched with filters.\n"
+            "If `org` - in a collection per `org_id`.\n"
+            "If `project` - in a collection per `project_id`.\n"
+            "The nodes without `org_id` (or `project_id`) stay in the single "
+            "collection. The searches without one search all the collections."
+        ),
+    )
+    max_open_shards: int = Field(
+        64,
+        description=(
+            "Number of tenant collections kept open at most, with `tenancy: org` "
+            "or `project`. The least recently used ones are closed."
+        ),
+    )
+
+    @model_validator(mode="after")
+    def _check_vector_precision(self) -> "VectorstoreSettings":
+        if self.database == "qdrant" and self.vector_precision == "float16":
+            raise ValueError(
+                "vectorstore.vector_precision=float16 is not supported by qdrant, "
+                "use float32 or int8"
+            )
+        return self
+
+
+class LocalVectorStoreSettings(BaseModel):
+    compaction_ratio: float = Field(
+        0.2,
+        description=(
+            "Fraction of deleted vectors above which the files of the store are "
+            "rewritten without them, in the background."
+        ),
+    )
+    index: Literal["flat", "hnsw"] = Field(
+        "flat",
+        description=(
+            "The index of the vectors:\n"
+            "If `flat` - exact (brute-force) searches.\n"
+            "If `hnsw` - approximate searches in an HNSW graph, for the stores of "
+            "tens of millions of vectors. Install with "
+            "`poetry install --extras vector-stores-local-hnsw`."
+        ),
+    )
+    hnsw_m: int = Field(
+        16,
+        description="Links per vector of the HNSW graph: more is more recall, and memory.",
+    )
+    hnsw_ef_construction: int = Field(
+        200,
+        description="Candidates explored to link a new vector: more is more recall, and slower inserts.",
+    )
+    hnsw_ef_search: int = Field(
+        64,
+        description="Candidates explored by a search: more is more recall, and slower searches.",
+    )
+    exact_search_max_rows: int = Field(
+        50000,
+        description=(
+            "Searches over at most this number of vectors (after the filters, e.g. "
+            "of a single project) are exact, even with an `hnsw` index."
+        ),
+    )
 
 
 class NodeStoreSettings(BaseModel):
     database: Literal["simple", "postgres"]
+    journal_compaction_ratio: float = Field(
+        1.0,
+        description=(
+            "Only used with the `simple` database. Changes are appended to a journal "
+            "next to the docstore and index store files, which is folded back into "
+            "them in the background once it grows bigger than this ratio of their size."
+        ),
+    )
+
+
+class OCRSettings(BaseModel):
+    mode: Literal["google", "tesseract", "mock"] = Field(
+        "google",
+        description=(
+            "The OCR engine used for the scanned pages of PDFs:\n"
+            "If `google` - Google Cloud Vision, using the default Google credentials.\n"
+            "If `tesseract` - a local Tesseract, install with `poetry install --extras ocr-tesseract`.\n"
+            "If `mock` - a fake text derived from the page image, for tests."
+        ),
+    )
+    min_text_coverage: float = Field(
+        0.3,
+        description=(
+            "PDF pages whose (searchable) text covers less than this ratio of the "
+            "page are considered scanned, and are OCRed."
+        ),
+    )
+    batch_size: int = Field(
+        8,
+        description="Only used in `google` mode. The number of pages sent in each request (at most 16).",
+    )
+    max_concurrency: int = Field(
+        4,
+        description=(
+            "The number of OCR requests (`google`) or pages (`tesseract`) processed "
+            "at the same time, by each parsing process."
+        ),
+    )
+    tesseract_lang: str = Field(
+        "eng",
+        description="Only used in `tesseract` mode. The languages of the pages, e.g. `eng+fra`.",
+    )
+    cache: bool = Field(
+        True,
+        description=(
+            "Cache the OCR results in `local_data/ocr_cache.sqlite`, by hash of the "
+            "page image: re-ingesting the same scans does not OCR them again."
+        ),
+    )
 
 
 class LlamaCPPSettings(BaseModel):
@@ -154,10 +289,53 @@ class HuggingFaceSettings(BaseModel):
         None,
         description="Huggingface access token, required to download some models",
     )
+    embed_token_budget: int = Field(
+        8192,
+        description=(
+            "Texts to embed are sorted by length, and batched so that each batch holds "
+            "at most this number of (padded) tokens: short texts are embedded in big "
+            "batches, long texts in small ones. Set to 0 to embed the texts in fixed "
+            "size batches, in arrival order."
+        ),
+    )
+    embed_max_batch_size: int = Field(
+        128,
+        description="Maximum number of texts in an embedding batch.",
+    )
+    onnx_quantize: bool = Field(
+        True,
+        description=(
+            "In `onnx` embedding mode, quantize the weights of the model to int8. "
+            "Faster on CPU, with embeddings slightly different from the original "
+            "model (see `scripts/benchmark_embeddings.py`)."
+        ),
+    )
+    onnx_intra_op_threads: int = Field(
+        0,
+        description=(
+            "In `onnx` embedding mode, the number of threads computing each batch. "
+            "0 uses all the physical cores."
+        ),
+    )
+    onnx_pooling: Literal["cls", "mean"] = Field(
+        "cls",
+        description=(
+            "In `onnx` embedding mode, how the token embeddings are pooled: `cls` "
+            "for the BGE models, `mean` for most other sentence-transformers models."
+        ),
+    )
 
 
 class EmbeddingSettings(BaseModel):
-    mode: Literal["huggingface", "openai", "azopenai", "sagemaker", "ollama", "mock"]
+    mode: Literal[
+        "huggingface", "onnx", "openai", "azopenai", "sagemaker", "ollama", "mock"
+    ] = Field(
+        description=(
+            "The embedding model to use.\n"
+            "`onnx` runs the `huggingface.embedding_hf_model_name` model exported "
+            "to ONNX (cached in the models folder) on onnxruntime, faster on CPU."
+        ),
+    )
     ingest_mode: Literal["simple", "batch", "parallel", "pipeline"] = Field(
         "parallel",
         description=(
@@ -184,15 +362,116 @@ class EmbeddingSettings(BaseModel):
             "Do not set it higher than your number of threads of your CPU."
         ),
     )
+    pdf_pages_per_shard: int = Field(
+        25,
+        description=(
+            "PDFs with more pages than this are split in page ranges of this size, "
+            "parsed in parallel by `count_workers` processes.\n"
+            "Not used by the `batch` and `parallel` modes, that already parse "
+            "the files in parallel."
+        ),
+    )
+    ingest_job_workers: int = Field(
+        1,
+        description=(
+            "The number of ingestion jobs (`/v1/ingest/jobs`) run at the same time.\n"
+            "Each job goes through the ingest mode above, which has its own workers: "
+            "keep it low to not compete with the embeddings of the running jobs.\n"
+            "Jobs above this number are queued."
+        ),
+    )
     embed_dim: int = Field(
         384,
         description="The dimension of the embeddings stored in the Postgres database",
     )
+    cache: bool = Field(
+        True,
+        description=(
+            "Keep the computed embeddings on disk, by model and text, so re-ingested "
+            "texts and repeated queries are not embedded again."
+        ),
+    )
+    cache_max_size_mb: int = Field(
+        1024,
+        description=(
+            "The maximum size of the embedding cache on disk, in megabytes.\n"
+            "Above it, the least recently used embeddings are evicted."
+        ),
+    )
+    cache_memory_items: int = Field(
+        10000,
+        description="The number of most recently used embeddings also kept in memory.",
+    )
+    query_cache_size: int = Field(
+        1024,
+        description=(
+            "The number of query embeddings kept in memory for the retrievals "
+            "(chunks, chat with context). 0 disables this cache."
+        ),
+    )
+    query_cache_ttl: float = Field(
+        600,
+        description="The number of seconds a query embedding is kept in memory.",
+    )
+    sidecar: bool = Field(
+        False,
+        description=(
+            "Load the embedding and rerank models in a single sidecar process, "
+            "called by the API workers over a Unix domain socket, instead of in "
+            "every worker. The sidecar is started by `python -m sonar_labs`, or "
+            "with `make inference-sidecar` before starting the API workers."
+        ),
+    )
+    sidecar_socket: str = Field(
+        "inference.sock",
+        description=(
+            "Path of the Unix domain socket of the inference sidecar. Relative to "
+            "the local data folder, unless absolute."
+        ),
+    )
+    micro_batch_max_size: int = Field(
+        32,
+        description=(
+            "Queries and small batches of texts of concurrent API requests are "
+            "embedded together, in batches of up to this number of texts. Not "
+            "with the remote APIs (`openai`, `azopenai` and `sagemaker` modes), "
+            "that embed the concurrent requests in parallel."
+        ),
+    )
+    micro_batch_max_wait_ms: float = Field(
+        5,
+        description=(
+            "The number of milliseconds a query waits for other requests to fill its "
+            "batch (embeddings and reranking). 0 only batches the queued requests."
+        ),
+    )
 
 
 class SagemakerSettings(BaseModel):
     llm_endpoint_name: str
     embedding_endpoint_name: str
+    embedding_endpoint_url: str | None = Field(
+        None,
+        description=(
+            "URL of the Sagemaker runtime API serving the embedding endpoint, if not "
+            "the AWS one. Example: a local stand-in of the endpoint for tests."
+        ),
+    )
+    embedding_max_batch_size: int = Field(
+        32,
+        description="The maximum number of texts embedded in an endpoint invocation.",
+    )
+    embedding_max_payload_bytes: int = Field(
+        5 * 1024 * 1024,
+        description=(
+            "The maximum size of the body of an embedding invocation, in bytes. "
+            "Sagemaker endpoints reject payloads over 6MB."
+        ),
+    )
+    embedding_max_concurrency: int = Field(
+        4,
+        description="The maximum number of embedding invocations run at the same time.",
+    )
 
 
 class OpenAISettings(BaseModel):
@@ -260,6 +539,17 @@ class OllamaSettings(BaseModel):
         120.0,
         description="Time elapsed until ollama times out the request. Default is 120s. Format is float. ",
     )
+    embedding_batch_size: int = Field(
+        64,
+        description="The number of texts embedded in a request to the Ollama `/api/embed` endpoint.",
+    )
+    embedding_concurrency: int = Field(
+        4,
+        description=(
+            "The number of embedding requests sent to Ollama at the same time, so "
+            "that the next batch is always queued. See `OLLAMA_NUM_PARALLEL`."
+        ),
+    )
 
 
 class AzureOpenAISettings(BaseModel):
@@ -312,6 +602,13 @@ class RerankSettings(BaseModel):
         2,
         description="This value controls the number of documents returned by the RAG pipeline.",
     )
+    max_batch_size: int = Field(
+        64,
+        description=(
+            "The (query, document) pairs of concurrent requests are scored by the "
+            "rerank model in batches of up to this number of pairs."
+        ),
+    )
 
 
 class RagSettings(BaseModel):
@@ -405,6 +702,69 @@ class QdrantSettings(BaseModel):
             "Only use this if you can guarantee that you can resolve the thread safety outside QdrantClient."
         ),
     )
+    upsert_batch_size: int = Field(
+        256,
+        description="Number of points upserted per request.",
+    )
+    upsert_parallel: int = Field(
+        4,
+        description=(
+            "Number of upsert requests in flight at a time. Always 1 for the local "
+            "mode (`path` or `:memory:`)."
+        ),
+    )
+    on_disk: bool = Field(
+        False,
+        description=(
+            "If `true` - the original vectors are stored on disk (memory-mapped) "
+            "instead of in RAM. Best with `vectorstore.vector_precision: int8`, the "
+            "quantized vectors being searched in RAM. Only on collection creation."
+        ),
+    )
+    quantization_always_ram: bool = Field(
+        True,
+        description=(
+            "If `true` - the quantized vectors (`vectorstore.vector_precision: int8`) "
+            "are kept in RAM. Only on collection creation."
+        ),
+    )
+    hnsw_m: int | None = Field(
+        None,
+        description=(
+            "Number of edges per node of the HNSW graph of the collection. More edges "
+            "is a better recall, for more memory. Qdrant's default (16) if unset. Only "
+            "on collection creation."
+        ),
+    )
+    hnsw_ef_construct: int | None = Field(
+        None,
+        description=(
+            "Number of neighbours considered while building the HNSW graph. Qdrant's "
+            "default (100) if unset. Only on collection creation."
+        ),
+    )
+    search_hnsw_ef: int | None = Field(
+        None,
+        description=(
+            "Number of neighbours considered by the searches in the HNSW graph. Higher "
+            "is a better recall, for slower searches. Qdrant's default if unset."
+        ),
+    )
+    search_rescore: bool = Field(
+        True,
+        description=(
+            "If `true` - the results found with the quantized vectors are rescored "
+            "with the original vectors."
+        ),
+    )
+    search_oversampling: float | None = Field(
+        None,
+        description=(
+            "Factor of the number of results fetched with the quantized vectors, "
+            "before the rescoring keeps the best ones. E.g. `2.0` fetches twice as "
+            "many results."
+        ),
+    )
 
 
 class Settings(BaseModel):
@@ -413,6 +773,7 @@ class Settings(BaseModel):
     ui: UISettings
     llm: LLMSettings
     embedding: EmbeddingSettings
+    ocr: OCRSettings
     llamacpp: LlamaCPPSettings
     huggingface: HuggingFaceSettings
     sagemaker: SagemakerSettings
@@ -423,6 +784,9 @@ class Settings(BaseModel):
     nodestore: NodeStoreSettings
     rag: RagSettings
     qdrant: QdrantSettings | None = None
+    local_vectorstore: LocalVectorStoreSettings = Field(
+        default_factory=lambda: LocalVectorStoreSettings.model_validate({})
+    )
     postgres: PostgresSettings | None = None
 
 
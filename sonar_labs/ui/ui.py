@@ -248,16 +248,16 @@ class SonarLabsUI:
                 "Uploading file(s) which were already ingested: %s document(s) will be replaced.",
                 len(doc_ids_to_delete),
             )
-            for doc_id in doc_ids_to_delete:
-                self._ingest_service.delete(doc_id)
+            self._ingest_service.delete_many(doc_ids_to_delete)
 
         self._ingest_service.bulk_ingest([(str(path.name), path) for path in paths], random.randint(0,200), random.randint(0,100))
 
     def _delete_all_files(self) -> Any:
         ingested_files = self._ingest_service.list_ingested()
         logger.debug("Deleting count=%s files", len(ingested_files))
-        for ingested_document in ingested_files:
-            self._ingest_service.delete(ingested_document.doc_id)
+        self._ingest_service.delete_many(
+            [ingested_document.doc_id for ingested_document in ingested_files]
+        )
         return [
             gr.List(self._list_ingested_files()),
             gr.components.Button(interactive=False),
@@ -267,14 +267,16 @@ class SonarLabsUI:
 
     def _delete_selected_file(self) -> Any:
         logger.debug("Deleting selected %s", self._selected_filename)
-        # Note: keep looping for pdf's (each page became a Document)
-        for ingested_document in self._ingest_service.list_ingested():
-            if (
-                ingested_document.doc_metadata
+        # Note: pdf's have many Documents (each page became a Document)
+        self._ingest_service.delete_many(
+            [
+                ingested_document.doc_id
+                for ingested_document in self._ingest_service.list_ingested()
+                if ingested_document.doc_metadata
                 and ingested_document.doc_metadata["file_name"]
                 == self._selected_filename
-            ):
-                self._ingest_service.delete(ingested_document.doc_id)
+            ]
+        )
         return [
             gr.List(self._list_ingested_files()),
             gr.components.Button(interactive=False),
@@ -0,0 +1,72 @@
+from pathlib import Path
+
+from llama_index.core.embeddings import MockEmbedding
+
+from sonar_labs.components.embedding.custom.cached import (
+    CachedEmbedding,
+    EmbeddingCache,
+)
+
+BATCHES: list[list[str]] = []
+
+
+class RecordingEmbedding(MockEmbedding):
+    """Embeds a text as its length, and records the batches it gets."""
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        BATCHES.append(texts)
+        return [[float(len(text))] for text in texts]
+
+
+def _cache(tmp_path: Path, **kwargs: int) -> EmbeddingCache:
+    kwargs.setdefault("max_size_bytes", 1024 * 1024)
+    kwargs.setdefault("memory_items", 100)
+    return EmbeddingCache(tmp_path / "embedding_cache.sqlite", **kwargs)
+
+
+def test_cached_embedding_only_embeds_missing_texts(tmp_path: Path) -> None:
+    cached = CachedEmbedding(RecordingEmbedding(embed_dim=1), _cache(tmp_path))
+    BATCHES.clear()
+
+    assert cached.get_text_embedding_batch(["a", "bb"]) == [[1.0], [2.0]]
+    # Same text once normalized
+    assert cached.get_text_embedding_batch(["a ", "ccc", "bb"]) == [
+        [1.0],
+        [3.0],
+        [2.0],
+    ]
+
+    assert BATCHES == [["a", "bb"], ["ccc"]]
+    assert cached.cache.stats()["hits"] == 2
+    assert cached.cache.stats()["misses"] == 3
+
+
+def test_cache_is_persisted_and_bounded(tmp_path: Path) -> None:
+    cached = CachedEmbedding(RecordingEmbedding(embed_dim=1), _cache(tmp_path))
+    cached.get_text_embedding_batch(["a", "bb"])
+
+    BATCHES.clear()
+    reopened = CachedEmbedding(
+        RecordingEmbedding(embed_dim=1), _cache(tmp_path, memory_items=1)
+    )
+    assert reopened.get_text_embedding_batch(["a", "bb"]) == [[1.0], [2.0]]
+    assert BATCHES == []
+
+    small = _cache(tmp_path, max_size_bytes=1000, memory_items=1)
+    small.put_many({str(i): [float(i)] for i in range(20)})
+    assert small.stats()["size_bytes"] <= 1000
+
+
+def test_cache_is_not_shared_by_the_backends_of_a_model(tmp_path: Path) -> None:
+    cache = _cache(tmp_path)
+    fp32 = CachedEmbedding(
+        RecordingEmbedding(embed_dim=1), cache, model_id="onnx:fp32:cls:bge"
+    )
+    int8 = CachedEmbedding(
+        RecordingEmbedding(embed_dim=1), cache, model_id="onnx:int8:cls:bge"
+    )
+    fp32.get_text_embedding_batch(["a"])
+
+    BATCHES.clear()
+    int8.get_text_embedding_batch(["a"])
+    assert BATCHES == [["a"]]
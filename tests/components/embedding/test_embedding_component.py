@@ -0,0 +1,43 @@
+import pytest
+
+from sonar_labs.components.embedding.custom.micro_batched import (
+    MicroBatchedEmbedding,
+)
+from sonar_labs.components.embedding.embedding_component import (
+    EmbeddingComponent,
+    embedding_model_id,
+)
+from tests.fixtures.mock_injector import MockInjector
+
+
+def test_remote_query_embeddings_are_not_micro_batched(
+    injector: MockInjector, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    settings = injector.bind_settings(
+        {
+            "embedding": {"mode": "sagemaker", "cache": False, "query_cache_size": 0},
+            "sagemaker": {
+                "llm_endpoint_name": "llm",
+                "embedding_endpoint_name": "embedding",
+            },
+        }
+    )
+    component = EmbeddingComponent(settings)
+    assert component.query_embedding_model is component.embedding_model
+
+    settings = injector.bind_settings(
+        {"embedding": {"mode": "mock", "cache": False, "query_cache_size": 0}}
+    )
+    component = EmbeddingComponent(settings)
+    assert isinstance(component.query_embedding_model, MicroBatchedEmbedding)
+
+
+def test_embedding_model_id_tells_the_backends_apart(injector: MockInjector) -> None:
+    model_ids = set()
+    for mode, quantize in [("huggingface", False), ("onnx", False), ("onnx", True)]:
+        settings = injector.bind_settings(
+            {"embedding": {"mode": mode}, "huggingface": {"onnx_quantize": quantize}}
+        )
+        model_ids.add(embedding_model_id(settings, "BAAI/bge-small-en-v1.5"))
+    assert len(model_ids) == 3
@@ -0,0 +1,42 @@
+from llama_index.core.embeddings import MockEmbedding
+
+from sonar_labs.components.embedding.custom.length_bucketed import (
+    LengthBucketedEmbedding,
+    length_buckets,
+)
+
+BATCHES: list[list[str]] = []
+
+
+class RecordingEmbedding(MockEmbedding):
+    """Embeds a text as its length, and records the batches it gets."""
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        BATCHES.append(texts)
+        return [[float(len(text))] for text in texts]
+
+
+def test_length_buckets_respect_the_token_budget() -> None:
+    lengths = [100, 2, 3, 50, 1, 400]
+    buckets = length_buckets(lengths, token_budget=200, max_batch_size=3)
+    assert buckets == [[4, 1, 2], [3, 0], [5]]
+    # Every text is in a single bucket
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(6))
+
+
+def test_length_bucketed_embedding_keeps_the_order() -> None:
+    wrapped = RecordingEmbedding(embed_dim=1)
+    BATCHES.clear()
+    embedding = LengthBucketedEmbedding(
+        wrapped,
+        token_budget=12,
+        max_batch_size=4,
+        length_function=lambda texts: [len(text) for text in texts],
+    )
+    texts = ["aaaaaa", "a", "aaa", "aa", "aaaaaaaaaa"]
+
+    embeddings = embedding.get_text_embedding_batch(texts)
+
+    assert embeddings == [[float(len(text))] for text in texts]
+    assert BATCHES == [["a", "aa", "aaa"], ["aaaaaa"], ["aaaaaaaaaa"]]
+    assert embedding.model_name == wrapped.model_name
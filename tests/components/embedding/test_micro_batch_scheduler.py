@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sonar_labs.components.embedding.micro_batch_scheduler import (
+    MicroBatchScheduler,
+)
+
+BATCHES: list[list[int]] = []
+
+
+def _square(items: list[int]) -> list[int]:
+    BATCHES.append(items)
+    return [item * item for item in items]
+
+
+def test_concurrent_items_are_processed_in_shared_batches() -> None:
+    BATCHES.clear()
+    scheduler = MicroBatchScheduler(_square, max_batch_size=4, max_wait=0.05)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(scheduler.run, range(8)))
+
+    assert results == [item * item for item in range(8)]
+    assert all(len(batch) <= 4 for batch in BATCHES)
+    assert len(BATCHES) < 8
+
+
+def test_failed_batch_fails_its_callers() -> None:
+    def fail(items: list[int]) -> list[int]:
+        raise RuntimeError("model crashed")
+
+    scheduler = MicroBatchScheduler(fail, max_batch_size=4, max_wait=0.0)
+
+    with pytest.raises(RuntimeError, match="model crashed"):
+        scheduler.run(1)
+    # The scheduler is still running
+    with pytest.raises(RuntimeError, match="model crashed"):
+        scheduler.run_many([1, 2])
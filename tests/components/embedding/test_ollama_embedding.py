@@ -0,0 +1,37 @@
+import asyncio
+
+from sonar_labs.components.embedding.custom.ollama import OllamaBatchEmbedding
+from tests.fixtures.fake_ollama_server import FakeOllamaServer
+
+
+def _embedding(server: FakeOllamaServer) -> OllamaBatchEmbedding:
+    return OllamaBatchEmbedding(
+        model_name="nomic-embed-text",
+        base_url=server.url,
+        batch_size=4,
+        max_concurrency=2,
+        embed_batch_size=8,
+    )
+
+
+def test_ollama_embeds_in_concurrent_batches(
+    fake_ollama_server: FakeOllamaServer,
+) -> None:
+    texts = [f"text {'x' * i}" for i in range(20)]
+    embeddings = _embedding(fake_ollama_server).get_text_embedding_batch(texts)
+
+    assert embeddings == [[float(len(text)), 1.0] for text in texts]
+    assert sorted(len(batch) for batch in fake_ollama_server.batches) == [4] * 5
+    assert fake_ollama_server.max_concurrent == 2
+    # The connections are kept alive, and reused
+    assert fake_ollama_server.connections <= 2
+
+
+def test_ollama_async_embeddings(fake_ollama_server: FakeOllamaServer) -> None:
+    embedding = _embedding(fake_ollama_server)
+
+    assert asyncio.run(embedding.aget_query_embedding("query")) == [5.0, 1.0]
+    assert asyncio.run(embedding.aget_text_embedding_batch(["a", "bb"])) == [
+        [1.0, 1.0],
+        [2.0, 1.0],
+    ]
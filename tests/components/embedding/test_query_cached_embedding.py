@@ -0,0 +1,24 @@
+import time
+
+from llama_index.core.embeddings import MockEmbedding
+
+from sonar_labs.components.embedding.custom.query_cached import (
+    QueryCachedEmbedding,
+)
+
+
+def test_query_cache_hits_until_expired() -> None:
+    cached = QueryCachedEmbedding(MockEmbedding(embed_dim=4), max_size=1, ttl=0.2)
+
+    cached.get_query_embedding("What are the sales?")
+    cached.get_query_embedding("What are  the sales? ")
+    assert cached.stats()["hits"] == 1
+
+    # Evicted by a more recent query
+    cached.get_query_embedding("Who won?")
+    cached.get_query_embedding("What are the sales?")
+    assert cached.stats()["misses"] == 3
+
+    time.sleep(0.3)
+    cached.get_query_embedding("What are the sales?")
+    assert cached.stats() == {"hits": 1, "misses": 4, "hit_rate": 0.2, "size": 1}
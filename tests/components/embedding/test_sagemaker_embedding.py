@@ -0,0 +1,40 @@
+import asyncio
+
+from sonar_labs.components.embedding.custom.sagemaker import SagemakerEmbedding
+from tests.fixtures.fake_sagemaker_endpoint import FakeSagemakerEndpoint
+
+
+def _embedding(endpoint: FakeSagemakerEndpoint, **kwargs: int) -> SagemakerEmbedding:
+    return SagemakerEmbedding(
+        endpoint_name="embedding",
+        endpoint_url=endpoint.url,
+        max_batch_size=3,
+        max_concurrency=4,
+        embed_batch_size=100,
+        **kwargs,
+    )
+
+
+def test_sagemaker_embeds_in_concurrent_batches(
+    fake_sagemaker_endpoint: FakeSagemakerEndpoint,
+) -> None:
+    texts = [f"text {'x' * i}" for i in range(10)]
+    embeddings = _embedding(fake_sagemaker_endpoint).get_text_embedding_batch(texts)
+
+    assert embeddings == [[float(len(text)), 1.0] for text in texts]
+    assert sorted(len(batch) for batch in fake_sagemaker_endpoint.batches) == [1, 3, 3, 3]
+    assert fake_sagemaker_endpoint.max_concurrent > 1
+
+
+def test_sagemaker_batches_are_bounded_by_payload_size(
+    fake_sagemaker_endpoint: FakeSagemakerEndpoint,
+) -> None:
+    texts = ["x" * 100] * 4
+    embeddings = asyncio.run(
+        _embedding(
+            fake_sagemaker_endpoint, max_payload_bytes=250
+        ).aget_text_embedding_batch(texts)
+    )
+
+    assert embeddings == [[100.0, 1.0]] * 4
+    assert [len(batch) for batch in fake_sagemaker_endpoint.batches] == [2, 2]
@@ -0,0 +1,48 @@
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from sonar_labs.components.inference.inference_client import (
+    InferenceClient,
+    SidecarEmbedding,
+)
+from sonar_labs.components.inference.inference_sidecar import InferenceSidecar
+from sonar_labs.components.inference.protocol import (
+    decode_matrix,
+    decode_strings,
+    encode_matrix,
+    encode_strings,
+)
+from sonar_labs.settings.settings import settings
+
+
+def test_protocol_round_trips() -> None:
+    strings = ["", "ascii", "日本語 ✓"]
+    assert decode_strings(encode_strings(strings)) == strings
+
+    matrix = np.arange(6, dtype=np.float32).reshape(2, 3)
+    assert np.array_equal(decode_matrix(encode_matrix(matrix)), matrix)
+    assert decode_matrix(encode_matrix(np.asarray([]))).shape == (0, 0)
+
+
+def test_sidecar_serves_the_embeddings(tmp_path: Path) -> None:
+    socket_path = tmp_path / "inference.sock"
+    sidecar = InferenceSidecar(settings())
+    server = sidecar.server(socket_path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = InferenceClient(socket_path)
+        embedding = SidecarEmbedding(client)
+        expected = sidecar.embedding_component.embedding_model.get_text_embedding("a")
+
+        assert embedding.get_text_embedding_batch(["a", "b"]) == [expected] * 2
+        assert embedding.get_query_embedding("query") == expected
+        assert embedding.get_text_embedding_batch([]) == []
+        # Errors of the sidecar are raised by the client
+        with pytest.raises(RuntimeError, match="Reranking is not enabled"):
+            client.rerank([("query", "text")])
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,44 @@
+import io
+from pathlib import Path
+
+from sonar_labs.components.ingest.content_registry import (
+    ContentHashRegistry,
+    copy_with_sha256,
+    file_sha256,
+)
+
+
+def test_registry_round_trip(tmp_path: Path) -> None:
+    registry = ContentHashRegistry(tmp_path / "content_hashes.sqlite")
+    assert registry.get("o1", "p1", "u1", "a.pdf") is None
+
+    registry.record("o1", "p1", "u1", "a.pdf", "f1", "hash:1", ["d1", "d2"])
+    registered = registry.get("o1", "p1", "u1", "a.pdf")
+    assert registered is not None
+    assert registered.file_id == "f1"
+    assert registered.fingerprint == "hash:1"
+    assert registered.doc_ids == ["d1", "d2"]
+    # Tenants are isolated, even when some ids are missing
+    assert registry.get(None, "p1", "u1", "a.pdf") is None
+
+    registry.forget("o1", "p1", "u1", "a.pdf")
+    assert registry.get("o1", "p1", "u1", "a.pdf") is None
+
+
+def test_file_sha256_matches_content(tmp_path: Path) -> None:
+    first = tmp_path / "first.txt"
+    second = tmp_path / "second.txt"
+    first.write_bytes(b"hello")
+    second.write_bytes(b"hello")
+    assert file_sha256(first) == file_sha256(second)
+    second.write_bytes(b"hello!")
+    assert file_sha256(first) != file_sha256(second)
+
+
+def test_copy_with_sha256_hashes_what_it_copies(tmp_path: Path) -> None:
+    content = b"x" * (3 * 1024 * 1024 + 7)  # Spans several chunks
+    target = tmp_path / "copy.bin"
+    with target.open("wb") as f:
+        content_hash = copy_with_sha256(io.BytesIO(content), f)
+    assert target.read_bytes() == content
+    assert content_hash == file_sha256(target)
@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import Document
+from llama_index.core.storage import StorageContext
+
+from sonar_labs.components.ingest.ingest_component import PipelineIngestComponent
+from sonar_labs.components.ingest.ingest_progress import IngestProgress
+
+
+def test_pipeline_resolves_concurrent_ingestions() -> None:
+    embed_model = MockEmbedding(embed_dim=8)
+    component = PipelineIngestComponent(
+        StorageContext.from_defaults(),
+        embed_model=embed_model,
+        transformations=[SentenceSplitter(), embed_model],
+        count_workers=2,
+    )
+    progress = IngestProgress()
+
+    def ingest(index: int) -> list[Document]:
+        document = Document(text=f"text {index}", metadata={"file_name": f"{index}"})
+        return component.ingest_documents([document], progress)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(ingest, range(8)))
+
+    assert all(len(documents) == 1 for documents in results)
+    docstore = component.storage_context.docstore
+    for documents in results:
+        assert docstore.get_ref_doc_info(documents[0].doc_id) is not None
+    assert progress.pages_parsed == 8
+    assert progress.nodes_persisted == progress.nodes_embedded == 8
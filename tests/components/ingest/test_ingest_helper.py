@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import fitz
+
+from sonar_labs.components.ingest.ingest_helper import (
+    IngestionHelper,
+    PDFParseOptions,
+    _page_shards,
+)
+from sonar_labs.settings.settings import OCRSettings
+
+
+def test_page_shards_cover_all_pages_in_order() -> None:
+    shards = _page_shards(7, pages_per_shard=3)
+    assert shards == [(0, 3), (3, 6), (6, 7)]
+
+
+def test_page_shards_of_small_documents() -> None:
+    assert _page_shards(2, pages_per_shard=25) == [(0, 2)]
+    assert _page_shards(0, pages_per_shard=25) == []
+
+
+def test_analyze_page_extracts_title_coverage_and_text() -> None:
+    with fitz.open() as doc:
+        page = doc.new_page()
+        page.insert_text((72, 72), "Quarterly report")
+        page.insert_text((72, 100), "Sales grew by 12%")
+        analysis = IngestionHelper._analyze_page(page)
+        expected_text = page.get_text()
+
+    assert analysis.title == "Quarterly report"
+    assert analysis.text == expected_text
+    assert 0.0 < analysis.text_coverage < 0.3
+
+
+def test_analyze_blank_page() -> None:
+    with fitz.open() as doc:
+        analysis = IngestionHelper._analyze_page(doc.new_page())
+    assert analysis.title is None
+    assert analysis.text == ""
+    assert analysis.text_coverage == 0.0
+
+
+def test_pdf_is_parsed_by_shards_of_the_given_options(tmp_path: Path) -> None:
+    path = tmp_path / "report.pdf"
+    with fitz.open() as doc:
+        for page_num in range(5):
+            doc.new_page().insert_text((72, 72), f"Page {page_num + 1}")
+        doc.save(path)
+
+    documents = IngestionHelper.transform_file_into_documents(
+        "report.pdf",
+        path,
+        "file-1",
+        "project",
+        "user",
+        "org",
+        PDFParseOptions(
+            pages_per_shard=2, workers=1, ocr=OCRSettings(min_text_coverage=0.0)
+        ),
+    )
+    page_labels = [document.metadata["page_label"] for document in documents]
+    assert page_labels == [1, 2, 3, 4, 5]
+    assert [document.text.strip() for document in documents] == [
+        f"Page {page_label}" for page_label in page_labels
+    ]
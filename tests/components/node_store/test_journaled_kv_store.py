@@ -0,0 +1,158 @@
+import json
+from pathlib import Path
+
+import pytest
+from fsspec.implementations.memory import MemoryFileSystem
+from llama_index.core.data_structs.data_structs import IndexDict
+from llama_index.core.schema import TextNode
+from llama_index.core.storage.index_store import SimpleIndexStore
+
+from sonar_labs.components.node_store.journaled_kv_store import JournaledKVStore
+
+
+def _journal_entries(persist_path: str) -> list[str]:
+    # The first line is the header, with the generation of the snapshot
+    return Path(persist_path + ".journal").read_text().splitlines()[1:]
+
+
+def test_persist_appends_changes_to_the_journal(tmp_path: Path) -> None:
+    persist_path = str(tmp_path / "docstore.json")
+    store = JournaledKVStore()
+    store.put("a", {"v": 1})
+    # First persist writes a full snapshot
+    store.persist(persist_path)
+    assert json.loads(Path(persist_path).read_text()) == {"data": {"a": {"v": 1}}}
+
+    store.put("b", {"v": 2})
+    store.put("a", {"v": 3})
+    store.delete("b")
+    store.persist(persist_path)
+    # The snapshot is untouched, only the changed keys are journaled
+    assert json.loads(Path(persist_path).read_text()) == {"data": {"a": {"v": 1}}}
+    assert len(_journal_entries(persist_path)) == 2
+
+    loaded = JournaledKVStore.from_persist_path(persist_path)
+    assert loaded.get_all() == {"a": {"v": 3}}
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(tmp_path: Path) -> None:
+    persist_path = str(tmp_path / "docstore.json")
+    store = JournaledKVStore()
+    store.persist(persist_path)
+    for i in range(10):
+        store.put(str(i), {"v": i})
+    store.persist(persist_path)
+
+    store._compact(persist_path)
+
+    assert _journal_entries(persist_path) == []
+    loaded = JournaledKVStore.from_persist_path(persist_path)
+    assert len(loaded.get_all()) == 10
+
+
+def test_partially_written_entry_is_skipped(tmp_path: Path) -> None:
+    persist_path = str(tmp_path / "docstore.json")
+    store = JournaledKVStore()
+    store.persist(persist_path)
+    store.put("a", {"v": 1})
+    store.persist(persist_path)
+    with open(persist_path + ".journal", "a") as f:
+        f.write('{"c": "data", "k": "b", "v": {')
+
+    loaded = JournaledKVStore.from_persist_path(persist_path)
+    assert loaded.get_all() == {"a": {"v": 1}}
+
+
+def test_index_structs_are_journaled_as_patches(tmp_path: Path) -> None:
+    persist_path = str(tmp_path / "index_store.json")
+    kvstore = JournaledKVStore()
+    index_store = SimpleIndexStore(simple_kvstore=kvstore)
+    index_struct = IndexDict()
+    for i in range(100):
+        index_struct.add_node(TextNode(id_=f"node-{i}", text=""))
+    index_store.add_index_struct(index_struct)
+    kvstore.persist(persist_path)
+    # Journaled in full once, then as patches of the node ids
+    for i in range(3):
+        index_struct.add_node(TextNode(id_=f"new-{i}", text=""))
+        index_struct.delete(f"node-{i}")
+        index_store.add_index_struct(index_struct)
+        kvstore.persist(persist_path)
+
+    journal = _journal_entries(persist_path)
+    assert len(journal) == 3
+    assert all(len(line) < 500 for line in journal)
+
+    loaded = SimpleIndexStore(
+        simple_kvstore=JournaledKVStore.from_persist_path(persist_path)
+    )
+    assert loaded.get_index_struct(index_struct.index_id) == index_struct
+
+    kvstore._compact(persist_path)
+    loaded = SimpleIndexStore(
+        simple_kvstore=JournaledKVStore.from_persist_path(persist_path)
+    )
+    assert loaded.get_index_struct(index_struct.index_id) == index_struct
+
+
+def test_several_processes_persist_to_the_same_snapshot(tmp_path: Path) -> None:
+    persist_path = str(tmp_path / "index_store.json")
+    kvstore_a = JournaledKVStore()
+    index_store_a = SimpleIndexStore(simple_kvstore=kvstore_a)
+    index_struct = IndexDict()
+    index_struct.add_node(TextNode(id_="node-0", text=""))
+    index_store_a.add_index_struct(index_struct)
+    kvstore_a.persist(persist_path)
+    index_struct.add_node(TextNode(id_="node-1", text=""))
+    index_store_a.add_index_struct(index_struct)
+    kvstore_a.persist(persist_path)
+
+    # A store created before the snapshot existed appends to it
+    kvstore_b = JournaledKVStore()
+    kvstore_b.put("b", {"v": 1})
+    kvstore_b.persist(persist_path)
+    index_struct.add_node(TextNode(id_="node-2", text=""))
+    index_store_a.add_index_struct(index_struct)
+    kvstore_a.persist(persist_path)
+
+    loaded = JournaledKVStore.from_persist_path(persist_path)
+    assert loaded.get("b") == {"v": 1}
+    assert (
+        SimpleIndexStore(simple_kvstore=loaded).get_index_struct(index_struct.index_id)
+        == index_struct
+    )
+
+    # A new snapshot, without the index struct: the patches of A would be orphans
+    Path(persist_path).unlink()
+    kvstore_b.put("b", {"v": 2})
+    kvstore_b.persist(persist_path)
+    index_struct.add_node(TextNode(id_="node-3", text=""))
+    index_store_a.add_index_struct(index_struct)
+    kvstore_a.persist(persist_path)
+
+    loaded = JournaledKVStore.from_persist_path(persist_path)
+    assert loaded.get("b") == {"v": 2}
+    assert (
+        SimpleIndexStore(simple_kvstore=loaded).get_index_struct(index_struct.index_id)
+        == index_struct
+    )
+
+
+def test_orphan_patch_is_skipped(tmp_path: Path) -> None:
+    persist_path = str(tmp_path / "index_store.json")
+    store = JournaledKVStore()
+    store.put("a", {"v": 1})
+    store.persist(persist_path)
+    generation = json.loads(Path(persist_path + ".journal").read_text())["g"]
+    with open(persist_path + ".journal", "a") as f:
+        patch = {"c": "data", "k": "missing", "g": generation, "p": {}, "r": {}}
+        f.write(json.dumps(patch) + "\n")
+
+    loaded = JournaledKVStore.from_persist_path(persist_path)
+    assert loaded.get_all() == {"a": {"v": 1}}
+
+
+def test_only_the_local_filesystem_is_supported(tmp_path: Path) -> None:
+    store = JournaledKVStore()
+    with pytest.raises(NotImplementedError):
+        store.persist(str(tmp_path / "docstore.json"), fs=MemoryFileSystem())
@@ -0,0 +1,104 @@
+from pathlib import Path
+
+import pytest
+from llama_index.core.schema import (
+    Document,
+    NodeRelationship,
+    RelatedNodeInfo,
+    TextNode,
+)
+from llama_index.core.storage.docstore import SimpleDocumentStore
+
+from sonar_labs.components.node_store.tenant_index import TenantDocIndex
+
+
+def _document(
+    doc_id: str, file_id: str, file_name: str, user_id: str = "u1"
+) -> Document:
+    return Document(
+        id_=doc_id,
+        text="text",
+        metadata={
+            "org_id": "o1",
+            "project_id": "p1",
+            "user_id": user_id,
+            "file_id": file_id,
+            "file_name": file_name,
+        },
+    )
+
+
+def test_find_by_file_id_and_file_name() -> None:
+    index = TenantDocIndex()
+    index.add_documents(
+        [
+            _document("d1", "f1", "a.pdf"),
+            _document("d2", "f1", "a.pdf"),
+            _document("d3", "f2", "b.pdf"),
+            _document("d4", "f3", "a.pdf", user_id="u2"),
+        ]
+    )
+
+    assert sorted(index.find("o1", "p1", "u1", file_id="f1")) == ["d1", "d2"]
+    assert sorted(index.find("o1", "p1", "u1", file_names=["a.pdf", "b.pdf"])) == [
+        "d1",
+        "d2",
+        "d3",
+    ]
+    assert index.find("o1", "p1", "u1", file_id="f2", file_names=["a.pdf"]) == []
+    assert sorted(index.find("o1", "p1", "u1")) == ["d1", "d2", "d3"]
+    assert index.find("o1", "p1", "u2", file_names=["a.pdf"]) == ["d4"]
+    assert index.find("o2", "p1", "u1") == []
+
+
+def test_remove_prunes_empty_tenants() -> None:
+    index = TenantDocIndex()
+    index.add_documents([_document("d1", "f1", "a.pdf")])
+    index.remove("d1")
+    index.remove("unknown")
+
+    assert len(index) == 0
+    assert index.find("o1", "p1", "u1") == []
+    assert index._tenants == {}
+
+
+def test_changes_of_another_process_are_applied(tmp_path: Path) -> None:
+    # Two workers, each with its own copy of the docstore
+    log_path = tmp_path / "tenant_index.sqlite"
+    index = TenantDocIndex.from_docstore(SimpleDocumentStore(), log_path)
+    other = TenantDocIndex.from_docstore(SimpleDocumentStore(), log_path)
+
+    other.add_documents(
+        [_document("d1", "f1", "a.pdf"), _document("d2", "f2", "b.pdf")]
+    )
+    assert index.find("o1", "p1", "u1", file_id="f1") == ["d1"]
+
+    other.remove("d1")
+    document = _document("d3", "f1", "a.pdf")
+    index.add(document.doc_id, document.metadata)
+    assert index.find("o1", "p1", "u1", file_id="f1") == ["d3"]
+    assert sorted(other.find("o1", "p1", "u1")) == ["d2", "d3"]
+
+
+def test_index_is_rebuilt_when_changes_were_pruned(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(
+        "sonar_labs.components.node_store.tenant_index.MAX_LOG_ENTRIES", 1
+    )
+    log_path = tmp_path / "tenant_index.sqlite"
+    docstore = SimpleDocumentStore()
+    index = TenantDocIndex.from_docstore(docstore, log_path)
+    other = TenantDocIndex.from_docstore(docstore, log_path)
+
+    document = _document("d1", "f1", "a.pdf")
+    node = TextNode(
+        text="text",
+        metadata=document.metadata,
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id="d1")},
+    )
+    docstore.add_documents([node])
+    other.add_documents([document, _document("d2", "f2", "b.pdf")])
+    other.remove("d2")
+    # Rebuilt from the docstore, that has d1 only
+    assert index.find("o1", "p1", "u1") == ["d1"]
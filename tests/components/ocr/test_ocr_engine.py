@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from sonar_labs.components.ocr.ocr_engine import CachedOCREngine, MockOCREngine
+
+
+class CountingOCREngine(MockOCREngine):
+    def __init__(self) -> None:
+        self.recognized: list[bytes] = []
+
+    def recognize(self, images: list[bytes]) -> list[str]:
+        self.recognized.extend(images)
+        return super().recognize(images)
+
+
+def test_mock_ocr_is_deterministic() -> None:
+    engine = MockOCREngine()
+    first, second, again = engine.recognize([b"page-1", b"page-2", b"page-1"])
+    assert first == again
+    assert first != second
+
+
+def test_cached_ocr_only_recognizes_new_images(tmp_path: Path) -> None:
+    counting = CountingOCREngine()
+    engine = CachedOCREngine(counting, tmp_path / "ocr_cache.sqlite")
+
+    texts = engine.recognize([b"page-1", b"page-2"])
+    assert texts == MockOCREngine().recognize([b"page-1", b"page-2"])
+
+    # Survives a restart, and keeps the order of the images
+    engine = CachedOCREngine(counting, tmp_path / "ocr_cache.sqlite")
+    assert engine.recognize([b"page-3", b"page-1"]) == [
+        *MockOCREngine().recognize([b"page-3"]),
+        texts[0],
+    ]
+    assert counting.recognized == [b"page-1", b"page-2", b"page-3"]
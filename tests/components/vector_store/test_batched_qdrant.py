@@ -0,0 +1,130 @@
+import threading
+from typing import Any
+
+import pytest
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from sonar_labs.components.vector_store.batched_qdrant import BatchedQdrantVectorStore
+from sonar_labs.settings.settings import VectorstoreSettings
+
+
+def _node(i: int) -> TextNode:
+    return TextNode(
+        id_=f"00000000-0000-0000-0000-{i:012d}",
+        text=f"node {i}",
+        embedding=[1.0, float(i)],
+        relationships={
+            NodeRelationship.SOURCE: RelatedNodeInfo(node_id=f"doc-{i % 2}")
+        },
+    )
+
+
+def test_qdrant_upserts_in_parallel_batches_and_deletes_docs() -> None:
+    client = QdrantClient(location=":memory:")
+    # The local mode is not thread safe, unlike the remote clients
+    lock = threading.Lock()
+    upload_points = client.upload_points
+    uploads: list[tuple[int, str]] = []
+
+    def serialized_upload_points(*args: Any, points: list[Any], **kwargs: Any) -> None:
+        with lock:
+            uploads.append((len(points), threading.current_thread().name))
+            upload_points(*args, points=points, **kwargs)
+
+    client.upload_points = serialized_upload_points  # type: ignore[method-assign]
+    store = BatchedQdrantVectorStore(
+        client=client, collection_name="test", batch_size=2, parallel=3
+    )
+
+    ids = store.add([_node(i) for i in range(7)])
+
+    assert ids == [_node(i).node_id for i in range(7)]
+    assert client.count("test").count == 7
+    assert sorted(size for size, _ in uploads) == [1, 2, 2, 2]
+    assert all(name.startswith("qdrant-upsert") for _, name in uploads)
+    store.delete_ref_docs(["doc-0", "doc-1"])
+    assert store.query(VectorStoreQuery(query_embedding=[1.0, 0.0])).ids == []
+
+
+def test_qdrant_collection_and_searches_are_tuned() -> None:
+    client = QdrantClient(location=":memory:")
+    # The local mode ignores the collection configuration, and the search params
+    create_collection, search = client.create_collection, client.search
+    creations: list[dict[str, Any]] = []
+    searches: list[Any] = []
+
+    def recording_create_collection(*args: Any, **kwargs: Any) -> Any:
+        creations.append(kwargs)
+        return create_collection(*args, **kwargs)
+
+    def recording_search(*args: Any, **kwargs: Any) -> Any:
+        searches.append(kwargs.get("search_params"))
+        return search(*args, **kwargs)
+
+    client.create_collection = recording_create_collection  # type: ignore[method-assign]
+    client.search = recording_search  # type: ignore[method-assign]
+    store = BatchedQdrantVectorStore(
+        client=client,
+        collection_name="test",
+        vector_precision="int8",
+        on_disk=True,
+        quantization_always_ram=False,
+        hnsw_config=rest.HnswConfigDiff(m=32, ef_construct=256),
+    )
+    store.add([_node(i) for i in range(3)])
+
+    [creation] = creations
+    assert creation["vectors_config"].on_disk
+    assert creation["hnsw_config"] == rest.HnswConfigDiff(m=32, ef_construct=256)
+    assert not creation["quantization_config"].scalar.always_ram
+
+    search_params = rest.SearchParams(
+        hnsw_ef=128, quantization=rest.QuantizationSearchParams(oversampling=2.0)
+    )
+    result = store.query(
+        VectorStoreQuery(query_embedding=[1.0, 2.0], similarity_top_k=1),
+        search_params=search_params,
+    )
+    assert result.ids == [_node(2).node_id]
+    assert searches == [search_params]
+
+
+@pytest.mark.parametrize(
+    ("vector_precision", "quantized"), [("float32", False), ("int8", True)]
+)
+def test_qdrant_store_is_built_with_each_precision(
+    vector_precision: str, quantized: bool
+) -> None:
+    VectorstoreSettings(database="qdrant", vector_precision=vector_precision)
+    client = QdrantClient(location=":memory:")
+    create_collection = client.create_collection
+    creations: list[dict[str, Any]] = []
+
+    def recording_create_collection(*args: Any, **kwargs: Any) -> Any:
+        creations.append(kwargs)
+        return create_collection(*args, **kwargs)
+
+    client.create_collection = recording_create_collection  # type: ignore[method-assign]
+    store = BatchedQdrantVectorStore(
+        client=client, collection_name="test", vector_precision=vector_precision
+    )
+    store.add([_node(i) for i in range(3)])
+
+    [creation] = creations
+    assert ("quantization_config" in creation) is quantized
+    assert client.count("test").count == 3
+
+
+def test_qdrant_rejects_float16_vectors() -> None:
+    with pytest.raises(ValueError, match="float16"):
+        VectorstoreSettings(database="qdrant", vector_precision="float16")
+    VectorstoreSettings(database="local", vector_precision="float16")
+    with pytest.raises(ValueError, match="float16"):
+        BatchedQdrantVectorStore(
+            client=QdrantClient(location=":memory:"),
+            collection_name="test",
+            vector_precision="float16",
+        )
@@ -0,0 +1,93 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import (
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+)
+
+from sonar_labs.components.vector_store.local_vector_store import LocalVectorStore
+
+pytest.importorskip("hnswlib")
+
+
+def _nodes(vectors: np.ndarray, start: int = 0) -> list[TextNode]:
+    return [
+        TextNode(
+            id_=f"node-{i}",
+            text=f"node-{i}",
+            embedding=vector.tolist(),
+            metadata={"project_id": f"project-{i % 10}"},
+            relationships={
+                NodeRelationship.SOURCE: RelatedNodeInfo(node_id=f"doc-{i}")
+            },
+        )
+        for i, vector in enumerate(vectors, start=start)
+    ]
+
+
+def _store(path: Path) -> LocalVectorStore:
+    # Without exact searches, even over a few vectors
+    return LocalVectorStore(
+        persist_dir=str(path), index="hnsw", exact_search_max_rows=0
+    )
+
+
+def test_hnsw_search_filters_deletes_and_reloads(tmp_path: Path) -> None:
+    vectors = np.random.default_rng(0).normal(size=(500, 16)).astype(np.float32)
+    store = _store(tmp_path)
+    store.add(_nodes(vectors))
+
+    result = store.query(VectorStoreQuery(query_embedding=vectors[42].tolist()))
+    assert result.ids == ["node-42"]
+    project = MetadataFilters(
+        filters=[MetadataFilter(key="project_id", value="project-3")]
+    )
+    result = store.query(
+        VectorStoreQuery(
+            query_embedding=vectors[42].tolist(), similarity_top_k=5, filters=project
+        )
+    )
+    assert len(result.ids or []) == 5
+    assert all(int(node_id.split("-")[1]) % 10 == 3 for node_id in result.ids or [])
+
+    store.delete("doc-42")
+    result = store.query(VectorStoreQuery(query_embedding=vectors[42].tolist()))
+    assert result.ids != ["node-42"]
+    store.persist(persist_path=str(tmp_path / "ignored.json"))
+
+    # Changes made after the graph was saved are caught up on load
+    extra = np.random.default_rng(1).normal(size=(1, 16)).astype(np.float32)
+    store.add(_nodes(extra, start=500))
+    store.delete("doc-7")
+    reopened = _store(tmp_path)
+    assert reopened.query(VectorStoreQuery(query_embedding=extra[0].tolist())).ids == [
+        "node-500"
+    ]
+    result = reopened.query(VectorStoreQuery(query_embedding=vectors[7].tolist()))
+    assert result.ids != ["node-7"]
+
+
+def test_hnsw_graph_has_the_rows_of_another_instance(tmp_path: Path) -> None:
+    vectors = np.random.default_rng(0).normal(size=(200, 16)).astype(np.float32)
+    a = _store(tmp_path)
+    b = _store(tmp_path)
+    a.add(_nodes(vectors[:100]))
+    b.add(_nodes(vectors[100:], start=100))
+    b.delete("doc-3")
+
+    result = a.query(VectorStoreQuery(query_embedding=vectors[150].tolist()))
+    assert result.ids == ["node-150"]
+    result = a.query(VectorStoreQuery(query_embedding=vectors[3].tolist()))
+    assert result.ids != ["node-3"]
+
+    # The graph saved by either has the rows of both
+    a.persist(persist_path=str(tmp_path / "ignored.json"))
+    reopened = _store(tmp_path)
+    result = reopened.query(VectorStoreQuery(query_embedding=vectors[50].tolist()))
+    assert result.ids == ["node-50"]
+    result = reopened.query(VectorStoreQuery(query_embedding=vectors[150].tolist()))
+    assert result.ids == ["node-150"]
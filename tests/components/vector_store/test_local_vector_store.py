@@ -0,0 +1,121 @@
+from pathlib import Path
+
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.indices.vector_store import VectorStoreIndex
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import (
+    NodeRelationship,
+    QueryBundle,
+    RelatedNodeInfo,
+    TextNode,
+)
+from llama_index.core.storage import StorageContext
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.vector_stores.types import (
+    FilterCondition,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+)
+
+from sonar_labs.components.vector_store.docstore_retriever import (
+    DocstoreVectorIndexRetriever,
+)
+from sonar_labs.components.vector_store.local_vector_store import LocalVectorStore
+
+
+def _node(node_id: str, doc_id: str, org_id: str, embedding: list[float]) -> TextNode:
+    return TextNode(
+        id_=node_id,
+        text=node_id,
+        embedding=embedding,
+        metadata={"org_id": org_id},
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=doc_id)},
+    )
+
+
+def _ids(store: LocalVectorStore, embedding: list[float], **kwargs) -> list[str]:
+    query = VectorStoreQuery(query_embedding=embedding, similarity_top_k=2, **kwargs)
+    return store.query(query).ids or []
+
+
+def test_local_vector_store_search_filters_and_deletes(tmp_path: Path) -> None:
+    store = LocalVectorStore(persist_dir=str(tmp_path))
+    store.add(
+        [
+            _node("a", "doc-1", "org-1", [1.0, 0.0]),
+            _node("b", "doc-1", "org-2", [0.8, 0.6]),
+            _node("c", "doc-2", "org-1", [0.0, 2.0]),
+        ]
+    )
+
+    assert _ids(store, [1.0, 0.1]) == ["a", "b"]
+    org_filter = MetadataFilters(
+        filters=[MetadataFilter(key="org_id", value="org-1")],
+        condition=FilterCondition.AND,
+    )
+    assert _ids(store, [1.0, 0.1], filters=org_filter) == ["a", "c"]
+    assert _ids(store, [0.0, 1.0], doc_ids=["doc-1"]) == ["b", "a"]
+
+    # Replaced by id, then deleted with its document
+    store.add([_node("a", "doc-1", "org-1", [0.0, -1.0])])
+    assert _ids(store, [1.0, 0.1]) == ["b", "c"]
+    store.delete_ref_docs(["doc-1"])
+    assert _ids(store, [1.0, 0.1]) == ["c"]
+
+    store.compact()
+    reopened = LocalVectorStore(persist_dir=str(tmp_path))
+    assert _ids(reopened, [1.0, 0.1]) == ["c"]
+    reopened.add([_node("d", "doc-3", "org-1", [1.0, 0.0])])
+    assert _ids(reopened, [1.0, 0.1], filters=org_filter) == ["d", "c"]
+
+
+def test_local_vector_store_nodes_are_retrieved_from_the_docstore(
+    tmp_path: Path,
+) -> None:
+    store = LocalVectorStore(persist_dir=str(tmp_path))
+    docstore = SimpleDocumentStore()
+    # Ingested like the index of the ingestion, with the nodes in the docstore
+    nodes = [
+        _node("a", "doc-1", "org-1", [1.0, 0.0]),
+        _node("b", "doc-2", "org-1", [0.0, 1.0]),
+    ]
+    store.add(nodes)
+    docstore.add_documents(nodes)
+    index = VectorStoreIndex(
+        nodes=[],
+        storage_context=StorageContext.from_defaults(
+            vector_store=store, docstore=docstore
+        ),
+        embed_model=MockEmbedding(embed_dim=2),
+        # Not the default splitter, downloading its tokenizer
+        transformations=[SentenceSplitter(tokenizer=str.split)],
+    )
+    retriever = DocstoreVectorIndexRetriever(index=index, similarity_top_k=2)
+
+    found = retriever.retrieve(QueryBundle("query", embedding=[0.1, 1.0]))
+    assert [node.node.get_content() for node in found] == ["b", "a"]
+    # A node missing from the docstore is skipped
+    docstore.delete_document("b")
+    found = retriever.retrieve(QueryBundle("query", embedding=[0.1, 1.0]))
+    assert [node.node.get_content() for node in found] == ["a"]
+
+
+def test_local_vector_store_shared_by_two_instances(tmp_path: Path) -> None:
+    # Like two API workers on the same directory
+    a = LocalVectorStore(persist_dir=str(tmp_path))
+    b = LocalVectorStore(persist_dir=str(tmp_path))
+    a.add([_node("a", "doc-1", "org-1", [1.0, 0.0])])
+    b.add([_node("b", "doc-2", "org-1", [0.8, 0.6])])
+    a.add([_node("c", "doc-3", "org-1", [0.0, 1.0])])
+
+    assert _ids(a, [1.0, 0.1]) == ["a", "b"]
+    assert _ids(b, [0.0, 1.0]) == ["c", "b"]
+
+    b.delete_ref_docs(["doc-1"])
+    assert _ids(a, [1.0, 0.1]) == ["b", "c"]
+
+    a.compact()
+    b.add([_node("d", "doc-4", "org-1", [1.0, 0.0])])
+    assert _ids(a, [1.0, 0.1]) == ["d", "b"]
+    assert _ids(LocalVectorStore(persist_dir=str(tmp_path)), [0.0, 1.0]) == ["c", "b"]
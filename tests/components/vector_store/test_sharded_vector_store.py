@@ -0,0 +1,96 @@
+from pathlib import Path
+
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from sonar_labs.components.vector_store.sharded_vector_store import (
+    ShardedVectorStore,
+    local_shards,
+    shard_name,
+)
+
+
+def _node(
+    node_id: str, doc_id: str, org_id: str | None, embedding: list[float]
+) -> TextNode:
+    return TextNode(
+        id_=node_id,
+        text=node_id,
+        embedding=embedding,
+        metadata={"org_id": org_id} if org_id is not None else {},
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=doc_id)},
+    )
+
+
+def _ids(store: ShardedVectorStore, **kwargs) -> list[str]:
+    query = VectorStoreQuery(query_embedding=[1.0, 0.1], similarity_top_k=3)
+    return store.query(query, **kwargs).ids or []
+
+
+def test_shard_names_are_valid_collection_names() -> None:
+    assert shard_name("sonar_labs", "org_id", None) == "sonar_labs"
+    assert shard_name("sonar_labs", "org_id", "34") == "sonar_labs_org_id_34"
+    hashed = shard_name("sonar_labs", "org_id", "Org 34/EU")
+    assert hashed.startswith("sonar_labs_org_id_h_")
+    assert hashed.replace("_", "").isalnum()
+    assert hashed != shard_name("sonar_labs", "org_id", "org 34/eu")
+
+
+def test_sharded_vector_store_routes_the_tenants_to_their_shards(
+    tmp_path: Path,
+) -> None:
+    store = ShardedVectorStore(
+        local_shards(tmp_path / "local_vector_store", tmp_path / "shards"),
+        tenant_field="org_id",
+        max_open_shards=1,
+    )
+    ids = store.add(
+        [
+            _node("a", "doc-1", "1", [1.0, 0.0]),
+            _node("b", "doc-2", "2", [0.8, 0.6]),
+            _node("c", "doc-3", None, [0.0, 1.0]),
+        ]
+    )
+
+    assert ids == ["a", "b", "c"]
+    assert store.shard_names() == [
+        "local_vector_store",
+        "local_vector_store_org_id_1",
+        "local_vector_store_org_id_2",
+    ]
+    # The least recently used shards were closed
+    assert len(store._shards) == 1
+    assert _ids(store, tenant="1") == ["a"]
+    assert _ids(store, tenant="2") == ["b"]
+    assert _ids(store, tenant="3") == []
+    assert not (tmp_path / "shards" / "local_vector_store_org_id_3").exists()
+    # Without tenant, all the shards are searched
+    assert _ids(store) == ["a", "b", "c"]
+
+    # Deleted from the shard of its tenant, or from all without metadata
+    store.delete_ref_docs(["doc-1"], ref_doc_metadata={"doc-1": {"org_id": "1"}})
+    store.delete_ref_docs(["doc-3"])
+    assert _ids(store) == ["b"]
+
+    store.drop_tenant("2")
+    assert _ids(store, tenant="2") == []
+    assert store.shard_names() == [
+        "local_vector_store",
+        "local_vector_store_org_id_1",
+    ]
+    store.close()
+
+
+def test_shards_created_by_another_process_are_found(tmp_path: Path) -> None:
+    def open_store() -> ShardedVectorStore:
+        return ShardedVectorStore(
+            local_shards(tmp_path / "local_vector_store", tmp_path / "shards"),
+            tenant_field="org_id",
+        )
+
+    store, other = open_store(), open_store()
+    assert _ids(store, tenant="1") == []
+    other.add([_node("a", "doc-1", "1", [1.0, 0.0])])
+    assert _ids(store, tenant="1") == ["a"]
+    store.close()
+    other.close()
@@ -0,0 +1,24 @@
+import pytest
+from llama_index.core.schema import TextNode
+
+from sonar_labs.components.vector_store.vector_compaction import VectorCompaction
+
+
+def test_compaction_truncates_and_normalizes_node_embeddings() -> None:
+    compaction = VectorCompaction(dimensions=2)
+    nodes = [
+        TextNode(text="a", embedding=[3.0, 4.0, 1.0, 1.0]),
+        TextNode(text="b"),
+    ]
+
+    nodes = compaction(nodes)
+
+    assert nodes[0].embedding == pytest.approx([0.6, 0.8])
+    assert nodes[1].embedding is None
+    query = compaction.compact_query([1.0, 1.0, 5.0])
+    assert sum(v * v for v in query) == pytest.approx(1, rel=1e-6)
+
+
+def test_compaction_rejects_larger_dimensions() -> None:
+    with pytest.raises(ValueError, match="Cannot truncate"):
+        VectorCompaction(dimensions=8).compact_query([1.0, 0.0])
@@ -0,0 +1,80 @@
+import json
+import threading
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class FakeOllamaServer:
+    """Local HTTP stand-in of the Ollama `/api/embed` endpoint.
+
+    Embeds each input as `[len(input), 1.0]`, and records the batches it gets,
+    and the number of connections opened.
+    """
+
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+        self.connections = 0
+        self.max_concurrent = 0
+        self._concurrent = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive connections
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_POST(self) -> None:
+                if self.path != "/api/embed":
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with server._lock:
+                    server.batches.append(body["input"])
+                    server._concurrent += 1
+                    server.max_concurrent = max(
+                        server.max_concurrent, server._concurrent
+                    )
+                # Leave the time for other requests to run concurrently
+                threading.Event().wait(0.05)
+                with server._lock:
+                    server._concurrent -= 1
+                response = json.dumps(
+                    {
+                        "model": body["model"],
+                        "embeddings": [
+                            [float(len(text)), 1.0] for text in body["input"]
+                        ],
+                    }
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture()
+def fake_ollama_server() -> Iterator[FakeOllamaServer]:
+    server = FakeOllamaServer()
+    yield server
+    server.close()
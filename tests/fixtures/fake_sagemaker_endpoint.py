@@ -0,0 +1,72 @@
+import json
+import re
+import threading
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class FakeSagemakerEndpoint:
+    """Local HTTP stand-in of the Sagemaker runtime API, for embedding endpoints.
+
+    Embeds each input as `[len(input), 1.0]`, and records the batches it gets.
+    """
+
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+        self.max_concurrent = 0
+        self._concurrent = 0
+        self._lock = threading.Lock()
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                if not re.fullmatch(r"/endpoints/[^/]+/invocations", self.path):
+                    self.send_error(404)
+                    return
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                inputs = json.loads(body)["inputs"]
+                with endpoint._lock:
+                    endpoint.batches.append(inputs)
+                    endpoint._concurrent += 1
+                    endpoint.max_concurrent = max(
+                        endpoint.max_concurrent, endpoint._concurrent
+                    )
+                # Leave the time for other invocations to run concurrently
+                threading.Event().wait(0.05)
+                with endpoint._lock:
+                    endpoint._concurrent -= 1
+                response = json.dumps(
+                    {"vectors": [[float(len(text)), 1.0] for text in inputs]}
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture()
+def fake_sagemaker_endpoint(
+    monkeypatch: pytest.MonkeyPatch,
+) -> Iterator[FakeSagemakerEndpoint]:
+    # Requests are signed, with whatever credentials
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    endpoint = FakeSagemakerEndpoint()
+    yield endpoint
+    endpoint.close()
@@ -1,3 +1,6 @@
+import base64
+
+import numpy as np
 from fastapi.testclient import TestClient
 
 from sonar_labs.server.embeddings.embeddings_router import (
@@ -14,3 +17,36 @@ def test_embeddings_generation(test_client: TestClient) -> None:
     embedding_response = EmbeddingsResponse.model_validate(response.json())
     assert len(embedding_response.data) > 0
     assert len(embedding_response.data[0].embedding) > 0
+
+
+def test_embeddings_cache_stats(test_client: TestClient) -> None:
+    response = test_client.get("/v1/embeddings/cache")
+
+    assert response.status_code == 200
+    # Only the query cache is enabled in the tests
+    assert set(response.json()) == {"queries"}
+
+
+def test_embeddings_keep_the_index_of_duplicates(test_client: TestClient) -> None:
+    body = EmbeddingsBody(input=["same", "other", "same"])
+    response = test_client.post("/v1/embeddings", json=body.model_dump())
+
+    assert response.status_code == 200
+    data = EmbeddingsResponse.model_validate(response.json()).data
+    assert [embedding.index for embedding in data] == [0, 1, 2]
+
+
+def test_embeddings_in_base64_with_dimensions(test_client: TestClient) -> None:
+    body = EmbeddingsBody(input=["Embed me"], encoding_format="base64", dimensions=8)
+    response = test_client.post("/v1/embeddings", json=body.model_dump())
+
+    assert response.status_code == 200
+    encoded = EmbeddingsResponse.model_validate(response.json()).data[0].embedding
+    assert isinstance(encoded, str)
+    embedding = np.frombuffer(base64.b64decode(encoded), dtype="<f4")
+    assert embedding.shape == (8,)
+    assert np.isclose(np.linalg.norm(embedding), 1.0)
+
+    too_many = EmbeddingsBody(input=["Embed me"], dimensions=100_000)
+    response = test_client.post("/v1/embeddings", json=too_many.model_dump())
+    assert response.status_code == 400
@@ -0,0 +1,60 @@
+import time
+from pathlib import Path
+
+from sonar_labs.server.ingest.ingest_job_store import IngestJobStore
+from sonar_labs.server.ingest.model import IngestJob
+
+
+def _job(job_id: str, status: str) -> IngestJob:
+    return IngestJob(
+        object="ingest.job",
+        job_id=job_id,
+        status=status,  # type: ignore[arg-type]
+        file_names=["test.txt"],
+        pages_parsed=1,
+        nodes_embedded=2,
+        nodes_persisted=0,
+    )
+
+
+def test_ingest_jobs_are_shared_through_the_store(tmp_path: Path) -> None:
+    path = tmp_path / "ingest_jobs.sqlite"
+    store = IngestJobStore(path, max_finished_jobs=1)
+    store.heartbeat("worker")
+    store.put(_job("running", "running"), "worker")
+
+    # Another worker reads the jobs of this one
+    other = IngestJobStore(path, max_finished_jobs=1)
+    assert other.get("running") == _job("running", "running")
+    assert other.get("unknown") is None
+
+    # Only the most recent finished jobs are kept
+    store.put(_job("first", "completed"), "worker")
+    store.put(_job("second", "failed"), "worker")
+    assert other.get("first") is None
+    assert other.get("second") == _job("second", "failed")
+    assert other.get("running") is not None
+    store.close()
+    other.close()
+
+
+def test_jobs_of_a_stopped_worker_are_failed(tmp_path: Path) -> None:
+    store = IngestJobStore(
+        tmp_path / "ingest_jobs.sqlite", max_finished_jobs=10, heartbeat_timeout=0.1
+    )
+    store.heartbeat("stopped")
+    store.put(_job("orphan", "running"), "stopped")
+    store.heartbeat("running")
+    store.put(_job("alive", "running"), "running")
+    assert store.get("orphan") == _job("orphan", "running")
+
+    time.sleep(0.2)
+    store.heartbeat("running")
+    job = store.get("orphan")
+    assert job is not None
+    assert job.status == "failed"
+    assert store.get("alive") == _job("alive", "running")
+    # Never seen, e.g. of a previous run
+    store.put(_job("unknown", "queued"), "unknown")
+    assert store.get("unknown").status == "failed"  # type: ignore[union-attr]
+    store.close()
@@ -0,0 +1,146 @@
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from sonar_labs.server.ingest.ingest_service import IngestService
+from sonar_labs.server.ingest.model import IngestJob
+from tests.fixtures.mock_injector import MockInjector
+
+HEADERS = {"X-Org-Id": "org", "X-Project-Id": "project", "X-User-Id": "user"}
+
+
+def _wait_for_job(test_client: TestClient, job_id: str) -> IngestJob:
+    for _ in range(100):
+        response = test_client.get(f"/v1/ingest/jobs/{job_id}")
+        assert response.status_code == 200
+        job = IngestJob.model_validate(response.json())
+        if job.status in ("completed", "failed"):
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"Ingest job {job_id} did not finish")
+
+
+def test_ingest_job_reports_progress(test_client: TestClient) -> None:
+    path = Path(__file__).parents[0] / "test.txt"
+    response = test_client.post(
+        "/v1/ingest/jobs",
+        files=[("files", (path.name, path.open("rb")))],
+        data={"file_ids": ["file-1"]},
+        headers=HEADERS,
+    )
+    assert response.status_code == 202
+    job = IngestJob.model_validate(response.json())
+    assert job.file_names == [path.name]
+
+    job = _wait_for_job(test_client, job.job_id)
+    assert job.status == "completed", job.error
+    assert job.data is not None and len(job.data) == 1
+    assert job.pages_parsed == 1
+    assert job.nodes_persisted == job.nodes_embedded > 0
+
+
+def test_ingest_job_events_end_with_finished_job(test_client: TestClient) -> None:
+    path = Path(__file__).parents[0] / "test.txt"
+    response = test_client.post(
+        "/v1/ingest/jobs",
+        files=[("files", (path.name, path.open("rb")))],
+        data={"file_ids": ["file-2"]},
+        headers=HEADERS,
+    )
+    job_id = response.json()["job_id"]
+
+    with test_client.stream("GET", f"/v1/ingest/jobs/{job_id}/events") as events:
+        lines = [line for line in events.iter_lines() if line.startswith("data: ")]
+    last_job = IngestJob.model_validate_json(lines[-1].removeprefix("data: "))
+    assert last_job.status == "completed"
+
+
+def test_unknown_ingest_job_is_not_found(test_client: TestClient) -> None:
+    assert test_client.get("/v1/ingest/jobs/unknown").status_code == 404
+
+
+def test_ingest_job_keeps_the_last_file_of_a_name(
+    test_client: TestClient, tmp_path: Path
+) -> None:
+    first, last = tmp_path / "first.txt", tmp_path / "last.txt"
+    first.write_text("The first version of the report.")
+    last.write_text("The last version of the report.")
+
+    def ingest() -> IngestJob:
+        response = test_client.post(
+            "/v1/ingest/jobs",
+            files=[
+                ("files", ("report.txt", first.open("rb"))),
+                ("files", ("report.txt", last.open("rb"))),
+            ],
+            data={"file_ids": ["file-3", "file-4"]},
+            headers=HEADERS,
+        )
+        return _wait_for_job(test_client, response.json()["job_id"])
+
+    job = ingest()
+    assert job.status == "completed", job.error
+    assert job.data is not None
+    assert [doc.doc_metadata["file_id"] for doc in job.data] == ["file-4"]  # type: ignore[index]
+
+    # Registered with the fingerprint of the last file, so unchanged
+    again = ingest()
+    assert again.data is not None
+    assert [doc.doc_id for doc in again.data] == [doc.doc_id for doc in job.data]
+    assert again.nodes_embedded == 0
+
+
+def test_deleted_files_are_forgotten_by_the_content_registry(
+    test_client: TestClient, injector: MockInjector, tmp_path: Path
+) -> None:
+    path = tmp_path / "notes.txt"
+    path.write_text("Some notes.")
+    response = test_client.post(
+        "/v1/ingest/jobs",
+        files=[("files", ("notes.txt", path.open("rb")))],
+        data={"file_ids": ["file-5"]},
+        headers=HEADERS,
+    )
+    assert _wait_for_job(test_client, response.json()["job_id"]).status == "completed"
+    registry = injector.get(IngestService)._content_registry
+    assert registry.get("org", "project", "user", "notes.txt") is not None
+
+    response = test_client.delete(
+        "/v1/ingest/files", params={"file_ids": ["file-5"]}, headers=HEADERS
+    )
+    assert response.status_code == 200
+    assert registry.get("org", "project", "user", "notes.txt") is None
+
+
+@pytest.mark.parametrize(
+    "test_client",
+    [{}, {"vectorstore": {"database": "local", "tenancy": "org"}}],
+    indirect=True,
+)
+def test_deleted_org_is_purged(
+    test_client: TestClient, injector: MockInjector, tmp_path: Path
+) -> None:
+    path = tmp_path / "plan.txt"
+    path.write_text("The plan of the organization.")
+    headers = {**HEADERS, "X-Org-Id": "org-to-delete"}
+    response = test_client.post(
+        "/v1/ingest/jobs",
+        files=[("files", ("plan.txt", path.open("rb")))],
+        data={"file_ids": ["file-6"]},
+        headers=headers,
+    )
+    assert _wait_for_job(test_client, response.json()["job_id"]).status == "completed"
+    service = injector.get(IngestService)
+    assert service.find_docs("org-to-delete", "project", "user") != []
+
+    response = test_client.delete("/v1/ingest/orgs/org-to-delete")
+    assert response.status_code == 200
+    assert service.find_docs("org-to-delete", "project", "user") == []
+    registry = service._content_registry
+    assert registry.get("org-to-delete", "project", "user", "plan.txt") is None
+    listed = test_client.get("/v1/ingest/list").json()["data"]
+    assert all(
+        (doc["doc_metadata"] or {}).get("org_id") != "org-to-delete" for doc in listed
+    )
@@ -44,3 +44,42 @@ def test_ingest_plain_text(test_client: TestClient) -> None:
     assert response.status_code == 200
     ingest_result = IngestResponse.model_validate(response.json())
     assert len(ingest_result.data) == 1
+
+
+def test_delete_ingested_files_deletes_all_their_documents(
+    test_client: TestClient,
+) -> None:
+    headers = {"X-Org-Id": "org", "X-Project-Id": "project", "X-User-Id": "user"}
+    path = Path(__file__).parents[0] / "test.pdf"
+    response = test_client.post(
+        "/v1/ingest/files",
+        files=[("files", (path.name, path.open("rb")))],
+        data={"file_ids": ["pdf-1"]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    doc_ids = {doc["doc_id"] for doc in response.json()["data"]}
+
+    response = test_client.delete(
+        "/v1/ingest/files", params={"file_ids": ["pdf-1"]}, headers=headers
+    )
+    assert response.status_code == 200
+    listed_doc_ids = {
+        doc["doc_id"] for doc in test_client.get("/v1/ingest/list").json()["data"]
+    }
+    assert not doc_ids & listed_doc_ids
+
+
+def test_ingest_files_requires_a_file_id_per_file(test_client: TestClient) -> None:
+    headers = {"X-Org-Id": "org", "X-Project-Id": "project", "X-User-Id": "user"}
+    path = Path(__file__).parents[0] / "test.txt"
+    response = test_client.post(
+        "/v1/ingest/files",
+        files=[
+            ("files", ("a.txt", path.open("rb"))),
+            ("files", ("b.txt", path.open("rb"))),
+        ],
+        data={"file_ids": ["txt-1"]},
+        headers=headers,
+    )
+    assert response.status_code == 400